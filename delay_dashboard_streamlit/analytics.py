@@ -0,0 +1,169 @@
+"""
+Couche d'analyse du dashboard : figures Plotly construites une seule fois par version des
+données (et par périmètre pour la simulation), puis réutilisées à chaque rerun Streamlit.
+
+Le curseur du seuil ne fait qu'ajouter la ligne verticale à une copie de la figure déjà
+construite : les courbes ne sont ni recalculées ni retracées.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Seuils des courbes de simulation : minute par minute jusqu'à 5 heures
+SIM_THRESHOLDS = np.arange(0, 301)
+
+
+# --- PAGE 1 : APERÇU & PROBLÈMES ---
+
+def _donut_layout(fig, title, title_x):
+    # Légende visible en bas
+    fig.update_layout(
+        title_text=title, title_x=title_x,
+        showlegend=True,
+        legend=dict(orientation="h", y=-0.1),
+        margin=dict(t=40, b=20, l=0, r=0)
+    )
+    return fig
+
+
+def overview_figures(kpis):
+    """
+    Les quatre donuts de la page d'aperçu, à partir des KPIs d'un périmètre (`aggregates['all']`).
+    """
+    # Donut 1 : Proportion des retards
+    late = px.pie(
+        names=['En retard', "À l'heure"],
+        values=[kpis['late_count'], kpis['on_time_count']],
+        color_discrete_sequence=['#ef553b', '#00CC96'],
+        hole=0.5
+    )
+    _donut_layout(late, "Proportion des retards", 0.3)
+
+    # Donut 2 : Check-in Type
+    checkin_counts = pd.DataFrame(list(kpis['checkin_counts'].items()), columns=['Type', 'Count'])
+    checkin = px.pie(
+        checkin_counts, values='Count', names='Type',
+        color='Type',
+        color_discrete_map={'mobile': '#636EFA', 'connect': '#AB63FA'},
+        hole=0.5
+    )
+    _donut_layout(checkin, "Type de check-in", 0.35)
+
+    # Donut 3 : État des locations
+    state_counts = pd.DataFrame(list(kpis['state_counts'].items()), columns=['State', 'Count'])
+    state = px.pie(
+        state_counts, values='Count', names='State',
+        color='State',
+        color_discrete_map={'ended': '#00CC96', 'canceled': '#ef553b'},
+        hole=0.5
+    )
+    _donut_layout(state, "État des locations", 0.35)
+
+    # Donut Friction
+    # IMPORTANT : On passe les valeurs dans l'ordre [Friction, Sans impact]
+    # Et on met sort=False pour que Plotly respecte notre ordre et donc nos couleurs
+    prob_count = kpis['prob_count']
+    prob_total = kpis['consecutive_rentals']
+    friction = px.pie(
+        names=['Friction', 'Sans impact'],
+        values=[prob_count, prob_total - prob_count],
+        title="Proportion des frictions",
+        color_discrete_sequence=['#ef553b', '#d3d3d3'],  # Rouge pour Friction, Gris clair pour le reste
+        hole=0.6
+    )
+    # Annotation au centre
+    friction.add_annotation(text=f"{prob_count/prob_total if prob_total else 0:.1%}", showarrow=False, font_size=25, font_color="#ef553b", font_weight="bold")
+    # sort=False empêche Plotly de mettre la plus grosse part (gris) en premier (rouge)
+    friction.update_traces(sort=False)
+    friction.update_layout(showlegend=True, legend=dict(orientation="h", y=0), margin=dict(t=40, b=20, l=0, r=0))
+
+    return {"late": late, "checkin": checkin, "state": state, "friction": friction}
+
+
+# --- PAGE 2 : SIMULATION ---
+
+def simulation_figures(simulator, thresholds=SIM_THRESHOLDS):
+    """
+    Courbes de simulation d'un périmètre, sans la ligne du seuil choisi (voir `with_threshold`).
+    """
+    df_sim = simulator.simulate(thresholds)
+
+    # Graphique 1 : Coût vs Bénéfice
+    tradeoff = go.Figure()
+    tradeoff.add_trace(go.Scatter(x=df_sim['threshold'], y=df_sim['lost'], mode='lines', name='Locations perdues (Coût)', line=dict(color='#ef553b', width=3)))
+    tradeoff.add_trace(go.Scatter(x=df_sim['threshold'], y=df_sim['solved'], mode='lines', name='Problèmes résolus (Bénéfice)', line=dict(color='#00cc96', width=3)))
+    tradeoff.update_layout(
+        title="Compromis Coût / Bénéfice",
+        xaxis_title="Seuil (min)",
+        yaxis_title="Nombre de locations",
+        legend=dict(x=0.01, y=0.99),
+        height=400
+    )
+
+    # Graphique 2 : Volume préservé
+    preserved = go.Figure()
+    preserved.add_trace(go.Scatter(x=df_sim['threshold'], y=df_sim['preserved_percent'], mode='lines', name='% Volume préservé', line=dict(color='#636EFA', width=3)))
+    preserved.update_layout(
+        title="Impact sur le chiffre d'affaires global",
+        xaxis_title="Seuil (min)",
+        yaxis_title="% Volume Préservé",
+        yaxis_range=[80, 101],
+        height=400
+    )
+
+    return {"tradeoff": tradeoff, "preserved": preserved}
+
+
+def with_threshold(figure, threshold, optimum=None, thresholds=SIM_THRESHOLDS):
+    """
+    Copie de la figure avec la ligne verticale du seuil choisi (et celle du seuil optimal).
+    La figure en cache est partagée entre les sessions : elle n'est jamais modifiée.
+
+    Un optimum hors des seuils tracés est placé au bord de l'axe, avec sa valeur en annotation.
+    """
+    fig = go.Figure(figure)
+    fig.add_vline(x=threshold, line_width=2, line_dash="dash", line_color="grey")
+    if optimum is not None:
+        low, high = float(thresholds[0]), float(thresholds[-1])
+        if optimum > high:
+            x, text, position = high, f"Optimum : {optimum:.0f} min →", "top left"
+        elif optimum < low:
+            x, text, position = low, f"← Optimum : {optimum:.0f} min", "top right"
+        else:
+            x, text, position = optimum, "Optimum", "top right"
+        fig.add_vline(x=x, line_width=2, line_dash="dot", line_color="#00cc96",
+                      annotation_text=text, annotation_position=position)
+    return fig
+
+
+# --- TEMPS DE RENDU ---
+
+class RenderTimer:
+    """
+    Derniers temps de rendu de chaque page (en secondes), partagés entre les sessions.
+    """
+
+    def __init__(self, max_samples=200):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, page, seconds):
+        with self._lock:
+            self._samples.setdefault(page, deque(maxlen=self.max_samples)).append(seconds)
+
+    def stats(self, page):
+        with self._lock:
+            samples = list(self._samples.get(page, ()))
+        if not samples:
+            return None
+        return {
+            "renders": len(samples),
+            "last_ms": samples[-1] * 1000,
+            "median_ms": float(np.median(samples)) * 1000,
+            "p95_ms": float(np.percentile(samples, 95)) * 1000,
+        }
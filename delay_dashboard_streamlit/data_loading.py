@@ -0,0 +1,153 @@
+import os
+import hashlib
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Fichier Excel livré avec le dashboard (fonctionne hors ligne) et copie distante d'origine
+DATA_DIR = Path(__file__).resolve().parent
+BUNDLED_SOURCE = DATA_DIR / "get_around_delay_analysis.xlsx"
+REMOTE_SOURCE = "https://full-stack-assets.s3.eu-west-3.amazonaws.com/Deployment/get_around_delay_analysis.xlsx"
+
+# Dossier du cache colonnaire (Feather / Arrow IPC non compressé, relu sans décodage)
+CACHE_DIR = Path(os.getenv("GETAROUND_DATA_CACHE_DIR", DATA_DIR / ".data_cache"))
+
+# Types compacts : entiers 32 bits, catégories, float32 pour les colonnes avec valeurs manquantes
+DTYPES = {
+    "rental_id": "int32",
+    "car_id": "int32",
+    "checkin_type": "category",
+    "state": "category",
+    "delay_at_checkout": "float32",
+    "previous_ended_rental_id": "float32",
+    "time_delta_with_previous_rental": "float32",
+}
+
+CHECKSUM_KEY = b"source_sha256"
+
+
+def resolve_source(source=None):
+    """
+    Source des données : argument, variable GETAROUND_DELAY_SOURCE, fichier livré ou, à défaut, l'URL S3.
+    """
+    source = source or os.getenv("GETAROUND_DELAY_SOURCE")
+    if source:
+        return source
+    return str(BUNDLED_SOURCE) if BUNDLED_SOURCE.exists() else REMOTE_SOURCE
+
+
+def file_checksum(path, block_size=1 << 20):
+    """
+    Empreinte SHA-256 d'un fichier local, lue par blocs.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_version(source):
+    """
+    Version des données : empreinte SHA-256 d'une source locale ou, pour une URL, celle
+    enregistrée dans le cache ("remote" si rien n'a encore été téléchargé).
+    """
+    if os.path.exists(source):
+        return file_checksum(source)
+    return cached_checksum(cache_path_for(source)) or "remote"
+
+
+def clean_delay_data(df):
+    """
+    Nettoyage basique : suppression du suffixe '_in_minutes' et types compacts.
+    """
+    df = df.rename(columns=lambda col: col.replace('_in_minutes', '') if col.endswith('_in_minutes') else col)
+    return df.astype({col: dtype for col, dtype in DTYPES.items() if col in df.columns})
+
+
+def read_source(source):
+    """
+    Lecture de la source brute (Excel, CSV ou Parquet) puis nettoyage.
+    """
+    suffix = Path(str(source).split("?")[0]).suffix.lower()
+    if suffix == ".csv":
+        df = pd.read_csv(source)
+    elif suffix == ".parquet":
+        df = pd.read_parquet(source)
+    else:
+        df = pd.read_excel(source)
+    return clean_delay_data(df)
+
+
+def cache_path_for(source):
+    """
+    Chemin du fichier Feather associé à une source.
+    """
+    return CACHE_DIR / (Path(str(source).split("?")[0]).stem + ".feather")
+
+
+def cached_checksum(path):
+    """
+    Empreinte de la source enregistrée dans les métadonnées du fichier Feather (None si absent).
+    """
+    try:
+        with pa.memory_map(str(path)) as f:
+            metadata = pa.ipc.open_file(f).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    checksum = metadata.get(CHECKSUM_KEY)
+    return checksum.decode() if checksum else None
+
+
+def read_feather_frame(path):
+    """
+    Relit un fichier Feather en DataFrame, avec une seule copie des données en mémoire.
+
+    La conversion en pandas copie les colonnes : la table Arrow est donc lue normalement
+    (un memory-map serait recopié en entier) et libérée colonne par colonne pendant la
+    conversion (`self_destruct`).
+    """
+    table = feather.read_table(str(path), memory_map=False)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def write_cache(df, path, checksum):
+    """
+    Écrit le DataFrame en Feather non compressé, de façon atomique.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), CHECKSUM_KEY: checksum.encode()})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    feather.write_feather(table, str(tmp_path), compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def load_delay_data(source=None, version=None):
+    """
+    Charge les données de retards.
+
+    La source Excel n'est convertie qu'une seule fois en fichier colonnaire typé ; les
+    chargements suivants relisent ce fichier, sans analyse de l'Excel. Il n'est reconstruit
+    que si l'empreinte SHA-256 de la source locale change. Une source distante (URL) n'est
+    téléchargée que si aucun cache n'existe encore pour elle.
+
+    `version` : empreinte déjà calculée par l'appelant (`source_version`), pour ne pas relire
+    la source une seconde fois.
+    """
+    source = resolve_source(source)
+    path = cache_path_for(source)
+    checksum = version or source_version(source)
+
+    if cached_checksum(path) == checksum:
+        return read_feather_frame(path)
+
+    df = read_source(source)
+    try:
+        write_cache(df, path, checksum)
+    except OSError as e:
+        # Système de fichiers en lecture seule : on continue sans cache
+        print(f"⚠️ Impossible d'écrire le cache des données ({path}) : {e}")
+    return df
@@ -0,0 +1,201 @@
+"""
+Recherche du seuil optimal (temps de battement minimum entre deux locations), par périmètre.
+
+Usage :
+    python optimizer.py
+    python optimizer.py --friction-value 40 --revenue-per-rental 120 --max-lost-percent 5
+    python optimizer.py --revenue revenus.csv --revenue-column price --output seuils.json
+
+L'objectif maximisé est `friction_value x problèmes résolus - revenu perdu` : une friction
+évitée vaut `friction_value`, une location enchaînée perdue coûte son revenu (colonne ou
+fichier par `rental_id`, ou un revenu moyen par location). Les locations perdues et les
+problèmes résolus ne changent qu'au passage d'un délai observé : les délais distincts sont
+triés une fois, les cumuls calculés en une passe, et le maximum est exact sur tous ces points
+de rupture (pas de grille de seuils). Le résultat est écrit en JSON.
+"""
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+def _best_threshold(deltas, lost_counts, solved_counts, lost_revenue, total_rentals, total_problematic,
+                    friction_value=1.0, resolution=1.0, max_threshold=None, max_lost_percent=None):
+    """
+    Seuil qui maximise l'objectif, à partir des délais distincts triés et des effectifs par délai.
+
+    Un seuil t fait perdre les locations dont le délai est < t : le seuil candidat qui englobe
+    les k premiers délais est le plus petit au-delà du k-ième (délai + `resolution`, sans
+    dépasser le délai suivant). Le seuil 0 (aucune restriction) est toujours admissible ; à
+    objectif égal, le plus petit seuil est retenu.
+    """
+    deltas = np.asarray(deltas, dtype=np.float64)
+    cum_lost = np.concatenate(([0], np.cumsum(lost_counts, dtype=np.int64)))
+    cum_solved = np.concatenate(([0], np.cumsum(solved_counts, dtype=np.int64)))
+    cum_revenue = np.concatenate(([0.0], np.cumsum(lost_revenue, dtype=np.float64)))
+
+    next_deltas = np.append(deltas[1:], np.inf)
+    start = min(0.0, deltas[0]) if len(deltas) else 0.0
+    thresholds = np.concatenate(([start], np.minimum(deltas + resolution, next_deltas)))
+    objective = friction_value * cum_solved - cum_revenue
+
+    feasible = np.ones(len(thresholds), dtype=bool)
+    if max_threshold is not None:
+        feasible &= thresholds <= max_threshold
+    if max_lost_percent is not None and total_rentals > 0:
+        feasible &= cum_lost * 100.0 / total_rentals <= max_lost_percent
+    feasible[0] = True
+
+    best = int(np.argmax(np.where(feasible, objective, -np.inf)))
+    lost = int(cum_lost[best])
+    solved = int(cum_solved[best])
+    return {
+        "threshold": float(thresholds[best]),
+        "objective": float(objective[best]),
+        "solved": solved,
+        "lost": lost,
+        "revenue_lost": float(cum_revenue[best]),
+        "friction_value_avoided": float(friction_value * solved),
+        "lost_percent": lost / total_rentals * 100 if total_rentals > 0 else 0.0,
+        "solved_percent": solved / total_problematic * 100 if total_problematic > 0 else 0.0,
+        "total_rentals": int(total_rentals),
+        "total_problematic": int(total_problematic),
+        "candidates": len(thresholds),
+    }
+
+
+def optimize_threshold(time_deltas, is_problematic, total_rentals, revenue=None, **objective):
+    """
+    Seuil optimal d'un périmètre, à partir des locations enchaînées ligne par ligne.
+
+    * `revenue` : revenu de chaque location enchaînée (None = 1 par location, les pertes sont
+      alors comptées en nombre de locations).
+    * `objective` : `friction_value`, `resolution`, `max_threshold`, `max_lost_percent`.
+    """
+    deltas = np.asarray(time_deltas, dtype=np.float64)
+    problematic = np.asarray(is_problematic, dtype=bool)
+    revenue = np.ones(len(deltas)) if revenue is None else np.asarray(revenue, dtype=np.float64)
+
+    # Les délais manquants ne sont jamais inférieurs au seuil : on les écarte
+    valid = ~np.isnan(deltas)
+    values, inverse = np.unique(deltas[valid], return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(values))
+    solved_counts = np.bincount(inverse, weights=problematic[valid], minlength=len(values)).astype(np.int64)
+    lost_revenue = np.bincount(inverse, weights=revenue[valid], minlength=len(values))
+    return _best_threshold(values, counts, solved_counts, lost_revenue, total_rentals, int(problematic.sum()), **objective)
+
+
+def optimize_simulator(simulator, revenue_per_rental=1.0, **objective):
+    """
+    Seuil optimal à partir d'un `ThresholdSimulator` (données figées ou flux live), avec un
+    revenu moyen par location.
+    """
+    lost_counts = np.diff(simulator.cum_lost)
+    return _best_threshold(
+        simulator.deltas, lost_counts, np.diff(simulator.cum_problematic), lost_counts * float(revenue_per_rental),
+        simulator.total_rentals, simulator.total_problematic, **objective
+    )
+
+
+def rental_revenue(df_join, revenue=None, revenue_per_rental=1.0):
+    """
+    Revenu de chaque location enchaînée.
+
+    `revenue` : None (revenu moyen `revenue_per_rental`), nom d'une colonne de df_join, Series
+    indexée par `rental_id`, ou tableau aligné sur df_join. Un revenu manquant est remplacé
+    par la moyenne des revenus connus.
+    """
+    if revenue is None:
+        return np.full(len(df_join), float(revenue_per_rental))
+    if isinstance(revenue, str):
+        values = df_join[revenue]
+    elif isinstance(revenue, pd.Series):
+        values = df_join["rental_id"].map(revenue)
+    else:
+        values = revenue
+    # Copie : les revenus manquants sont complétés sur place
+    values = np.array(values, dtype=np.float64)
+    if len(values) != len(df_join):
+        raise ValueError(f"Revenus : {len(values)} valeurs pour {len(df_join)} locations enchaînées")
+    missing = np.isnan(values)
+    if missing.all():
+        raise ValueError("Aucun revenu connu pour les locations enchaînées")
+    values[missing] = values[~missing].mean()
+    return values
+
+
+def optimize_scopes(df, df_join, checkin_types=None, revenue=None, revenue_per_rental=1.0, **objective):
+    """
+    Seuil optimal pour tous les véhicules ('all') puis pour chaque type de check-in.
+    """
+    if checkin_types is None:
+        checkin_types = [str(c) for c in df["checkin_type"].dropna().unique()]
+    deltas = np.asarray(df_join["time_delta_with_previous_rental"], dtype=np.float64)
+    problematic = np.asarray(df_join["is_problematic"], dtype=bool)
+    revenue = rental_revenue(df_join, revenue, revenue_per_rental)
+
+    results = {"all": optimize_threshold(deltas, problematic, len(df), revenue, **objective)}
+    for checkin_type in checkin_types:
+        # Un masque par périmètre : pas de copie de df_join
+        mask = (df_join["checkin_type"] == checkin_type).to_numpy()
+        results[checkin_type] = optimize_threshold(
+            deltas[mask], problematic[mask], int((df["checkin_type"] == checkin_type).sum()), revenue[mask], **objective
+        )
+    return results
+
+
+def read_revenue(path, column):
+    """
+    Revenus par location depuis un fichier CSV ou Parquet (colonnes `rental_id` et `column`).
+    `path` peut aussi être un fichier ouvert avec un attribut `name` (ex : fichier déposé dans Streamlit).
+    """
+    if str(getattr(path, "name", path)).endswith(".parquet"):
+        table = pd.read_parquet(path, columns=["rental_id", column])
+    else:
+        table = pd.read_csv(path, usecols=["rental_id", column])
+    return table.set_index("rental_id")[column]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seuil optimal entre deux locations, par type de check-in (JSON)")
+    parser.add_argument("--source", help="Données de retards (par défaut : GETAROUND_DELAY_SOURCE ou le fichier livré)")
+    parser.add_argument("--friction-value", type=float, default=1.0, help="Valeur d'une friction évitée")
+    parser.add_argument("--revenue-per-rental", type=float, default=1.0, help="Revenu moyen d'une location (sans --revenue)")
+    parser.add_argument("--revenue", help="Fichier CSV ou Parquet des revenus par rental_id")
+    parser.add_argument("--revenue-column", default="revenue", help="Colonne des revenus dans --revenue")
+    parser.add_argument("--max-threshold", type=float, help="Seuil maximal autorisé (min)")
+    parser.add_argument("--max-lost-percent", type=float, help="Part maximale de locations perdues (%%)")
+    parser.add_argument("--resolution", type=float, default=1.0, help="Pas des seuils proposés au-delà d'un délai observé (min)")
+    parser.add_argument("--output", help="Fichier JSON de sortie (par défaut : sortie standard)")
+    args = parser.parse_args()
+
+    from rental_store import load_rental_store
+
+    store = load_rental_store(args.source)
+    revenue = read_revenue(args.revenue, args.revenue_column) if args.revenue else None
+    objective = {
+        "friction_value": args.friction_value,
+        "resolution": args.resolution,
+        "max_threshold": args.max_threshold,
+        "max_lost_percent": args.max_lost_percent,
+    }
+    scopes = optimize_scopes(store.rentals, store.joined, revenue=revenue,
+                             revenue_per_rental=args.revenue_per_rental, **objective)
+    result = {
+        "data_version": store.version,
+        "objective": {**objective, "revenue_file": args.revenue, "revenue_per_rental": args.revenue_per_rental},
+        "scopes": scopes,
+    }
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
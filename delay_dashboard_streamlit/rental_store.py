@@ -0,0 +1,281 @@
+import json
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from data_loading import cache_path_for, load_delay_data, read_feather_frame, resolve_source, source_version
+
+VERSION_KEY = b"data_version"
+
+
+class RentalStore:
+    """
+    Locations indexées par `rental_id`, avec la jointure des locations enchaînées (df_join).
+
+    La location précédente est retrouvée par position entière : les `rental_id` sont triés
+    une fois et chaque `previous_ended_rental_id` est résolu par recherche dichotomique,
+    sans merge par hachage. La table jointe (avec `is_problematic`) et les agrégats par
+    périmètre peuvent être enregistrés à côté des données, et l'ajout de nouvelles
+    locations ne traite que les nouvelles lignes.
+
+    `version` identifie les données sources (empreinte du fichier) : elle sert de clé aux
+    caches du dashboard.
+    """
+
+    def __init__(self, rentals, joined=None, aggregates=None, version=None):
+        self.version = version
+        self.rentals = rentals.reset_index(drop=True)
+        self._build_index()
+        all_rows = np.arange(len(self.rentals))
+        if joined is None:
+            joined = self._join(all_rows)
+        self.joined = joined.reset_index(drop=True)
+        self._pending = self._unresolved(all_rows)
+        # Compteurs des KPIs, mis à jour par `append` avec les seules nouvelles lignes. Avec des
+        # agrégats enregistrés (`load`), ils ne sont recalculés qu'au premier ajout.
+        self._counters = None
+        if aggregates is None:
+            self._counters = count_aggregates(self.rentals, self.joined)
+            aggregates = _counters_to_kpis(self._counters)
+        self.aggregates = aggregates
+
+    def _build_index(self):
+        ids = self.rentals["rental_id"].to_numpy()
+        self._order = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._order]
+        if len(ids) > 1 and (self._sorted_ids[1:] == self._sorted_ids[:-1]).any():
+            raise ValueError("Les rental_id doivent être uniques")
+
+    def positions(self, rental_ids):
+        """
+        Position (ligne) de chaque `rental_id` dans `rentals`, -1 si la location est inconnue.
+        """
+        ids = np.asarray(rental_ids, dtype=np.float64)
+        known = ~np.isnan(ids)
+        result = np.full(len(ids), -1, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return result
+        idx = np.searchsorted(self._sorted_ids, ids[known])
+        idx_clipped = np.minimum(idx, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[idx_clipped] == ids[known]
+        result[np.flatnonzero(known)[found]] = self._order[idx_clipped[found]]
+        return result
+
+    def _join(self, rows):
+        """
+        Jointure des lignes `rows` (positions) avec leur location précédente, si elle est connue.
+        """
+        previous = self.positions(self.rentals["previous_ended_rental_id"].to_numpy()[rows])
+        linked = previous >= 0
+        joined = self.rentals.iloc[rows[linked]].copy()
+        joined["rental_id_prev"] = self.rentals["rental_id"].to_numpy()[previous[linked]]
+        joined["previous_delay_at_checkout"] = self.rentals["delay_at_checkout"].to_numpy()[previous[linked]]
+        # Logique : Un cas est problématique si le retard précédent est supérieur au temps de battement prévu
+        joined["is_problematic"] = joined["previous_delay_at_checkout"] > joined["time_delta_with_previous_rental"]
+        return joined
+
+    def _unresolved(self, rows):
+        """
+        Parmi `rows`, lignes qui référencent une location précédente encore inconnue (elle peut arriver plus tard).
+        """
+        previous = self.rentals["previous_ended_rental_id"].to_numpy(dtype=np.float64)[rows]
+        return rows[(self.positions(previous) < 0) & ~np.isnan(previous)]
+
+    def append(self, new_rentals):
+        """
+        Ajoute de nouvelles locations et met à jour la jointure de façon incrémentale :
+        seules les nouvelles lignes et les lignes en attente de leur location précédente
+        sont résolues.
+        """
+        if self._counters is None:
+            self._counters = count_aggregates(self.rentals, self.joined)
+        start = len(self.rentals)
+        dtypes = self.rentals.dtypes.to_dict()
+        categorical = [col for col, dtype in dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+        new_rentals = new_rentals[list(self.rentals.columns)].astype(
+            {col: dtype for col, dtype in dtypes.items() if col not in categorical}
+        )
+        self.rentals = pd.concat([self.rentals, new_rentals], ignore_index=True)
+        # De nouvelles catégories peuvent apparaître : on reconstruit les colonnes catégorielles
+        self.rentals = self.rentals.astype({col: "category" for col in categorical})
+        self._build_index()
+
+        rows = np.concatenate([self._pending, np.arange(start, len(self.rentals))])
+        new_joined = self._join(rows)
+        self.joined = pd.concat([self.joined, new_joined], ignore_index=True)
+        self.joined = self.joined.astype({col: "category" for col in categorical if col in self.joined.columns})
+        self._pending = self._unresolved(rows)
+        # KPIs : seules les nouvelles locations et les nouvelles lignes de la jointure sont comptées
+        _count_rentals(self._counters, self.rentals.iloc[start:])
+        _count_joined(self._counters, new_joined)
+        self.aggregates = _counters_to_kpis(self._counters)
+        return new_joined
+
+    def save(self, path, version):
+        """
+        Enregistre la table jointe (Feather) et les agrégats (JSON), marqués avec la version des données.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(self.joined, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), VERSION_KEY: version.encode()})
+        tmp_path = path.with_suffix(".tmp")
+        feather.write_feather(table, str(tmp_path), compression="uncompressed")
+        tmp_path.replace(path)
+        with open(aggregates_path(path), "w", encoding="utf-8") as f:
+            json.dump({"version": version, "aggregates": self.aggregates}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, rentals, path, version):
+        """
+        Recharge la table jointe enregistrée si elle correspond à `version`, sinon renvoie None.
+        """
+        try:
+            # Seul le schéma est lu pour vérifier la version, avant de charger les données
+            with pa.memory_map(str(path)) as f:
+                metadata = pa.ipc.open_file(f).schema.metadata or {}
+            with open(aggregates_path(path), encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError, pa.ArrowInvalid):
+            return None
+        if metadata.get(VERSION_KEY, b"").decode() != version or saved.get("version") != version:
+            return None
+
+        try:
+            joined = read_feather_frame(path)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        return cls(rentals, joined=joined, aggregates=saved["aggregates"], version=version)
+
+
+def aggregates_path(path):
+    return path.with_name(path.stem + ".aggregates.json")
+
+
+def histogram_median(histogram):
+    """
+    Médiane exacte à partir d'un histogramme {valeur: effectif}.
+    """
+    total = sum(histogram.values())
+    if total == 0:
+        return float("nan")
+    values = sorted(histogram)
+    cumulative = np.cumsum([histogram[v] for v in values])
+    lower = values[int(np.searchsorted(cumulative, (total + 1) // 2))]
+    upper = values[int(np.searchsorted(cumulative, total // 2 + 1))]
+    return (lower + upper) / 2
+
+
+def _new_counters():
+    return {
+        "total_rentals": 0,
+        "consecutive_rentals": 0,
+        "late_count": 0,
+        "on_time_count": 0,
+        "checkin_counts": Counter(),
+        "state_counts": Counter(),
+        "prob_count": 0,
+        "cancel_prob": 0,
+        # Retards des cas problématiques {retard: effectif}, pour une médiane exacte
+        "problem_delays": Counter(),
+    }
+
+
+def _scope_masks(frame):
+    """
+    Périmètres présents dans `frame` : 'all' (None = toutes les lignes) puis un masque par type de check-in.
+    """
+    checkin = frame["checkin_type"]
+    return [("all", None)] + [(str(t), (checkin == t).to_numpy()) for t in checkin.dropna().unique()]
+
+
+def _column(frame, name, mask):
+    # Seule la colonne utile est filtrée : les tables ne sont pas recopiées par périmètre
+    return frame[name] if mask is None else frame[name][mask]
+
+
+def _count_rentals(counters, rentals):
+    """
+    Ajoute aux compteurs des périmètres les locations de `rentals`.
+    """
+    for scope, mask in _scope_masks(rentals):
+        agg = counters.setdefault(scope, _new_counters())
+        delays = _column(rentals, "delay_at_checkout", mask).dropna()
+        late = int((delays > 0).sum())
+        agg["total_rentals"] += len(rentals) if mask is None else int(mask.sum())
+        agg["late_count"] += late
+        agg["on_time_count"] += len(delays) - late
+        agg["checkin_counts"].update({str(k): int(v) for k, v in _column(rentals, "checkin_type", mask).value_counts().items() if v})
+        agg["state_counts"].update({str(k): int(v) for k, v in _column(rentals, "state", mask).value_counts().items() if v})
+
+
+def _count_joined(counters, joined):
+    """
+    Ajoute aux compteurs des périmètres les locations enchaînées de `joined`.
+    """
+    for scope, mask in _scope_masks(joined):
+        agg = counters.setdefault(scope, _new_counters())
+        problematic = _column(joined, "is_problematic", mask).to_numpy(dtype=bool)
+        canceled = (_column(joined, "state", mask) == "canceled").to_numpy()
+        delays = _column(joined, "delay_at_checkout", mask).to_numpy(dtype=np.float64)[problematic]
+        agg["consecutive_rentals"] += len(problematic)
+        agg["prob_count"] += int(problematic.sum())
+        agg["cancel_prob"] += int((problematic & canceled).sum())
+        agg["problem_delays"].update(delays[~np.isnan(delays)].tolist())
+
+
+def _counters_to_kpis(counters):
+    return {
+        scope: {
+            "total_rentals": agg["total_rentals"],
+            "consecutive_rentals": agg["consecutive_rentals"],
+            "late_count": agg["late_count"],
+            "on_time_count": agg["on_time_count"],
+            "checkin_counts": dict(agg["checkin_counts"].most_common()),
+            "state_counts": dict(agg["state_counts"].most_common()),
+            "prob_count": agg["prob_count"],
+            "median_delay_prob": histogram_median(agg["problem_delays"]),
+            "cancel_prob": agg["cancel_prob"],
+        }
+        for scope, agg in counters.items()
+    }
+
+
+def count_aggregates(rentals, joined):
+    """
+    Compteurs de friction par périmètre, à partir des tables complètes.
+    """
+    counters = {}
+    _count_rentals(counters, rentals)
+    _count_joined(counters, joined)
+    return counters
+
+
+def compute_aggregates(rentals, joined):
+    """
+    KPIs de friction par périmètre : 'all' puis un périmètre par type de check-in.
+    """
+    return _counters_to_kpis(count_aggregates(rentals, joined))
+
+
+def load_rental_store(source=None):
+    """
+    Charge les locations (cache colonnaire) et la jointure enregistrée, ou la reconstruit
+    si la source a changé depuis le dernier calcul.
+    """
+    source = resolve_source(source)
+    # Empreinte de la source calculée une seule fois, pour le cache des données et la jointure
+    version = source_version(source)
+    rentals = load_delay_data(source, version=version)
+    path = cache_path_for(source).with_suffix(".join.feather")
+
+    store = RentalStore.load(rentals, path, version)
+    if store is None:
+        store = RentalStore(rentals, version=version)
+        try:
+            store.save(path, version)
+        except OSError as e:
+            print(f"⚠️ Impossible d'enregistrer la jointure ({path}) : {e}")
+    return store
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+
+class ThresholdSimulator:
+    """
+    Moteur de simulation du seuil (temps de battement minimum entre deux locations).
+
+    Les délais `time_delta_with_previous_rental` d'un périmètre sont triés une seule fois,
+    avec le cumul des locations et des cas problématiques. Pour un seuil t :
+    * locations perdues = nombre de délais < t (recherche dichotomique, O(log n)) ;
+    * problèmes résolus = cumul des cas problématiques parmi ces délais.
+    Un seuil ou une courbe complète (ex : minute par minute sur 24h) se calcule donc
+    sans refiltrer le DataFrame.
+
+    Le simulateur se construit à partir de délais distincts et de leurs effectifs, ce qui
+    permet aussi de l'alimenter avec des histogrammes tenus à jour au fil de l'eau.
+    """
+
+    def __init__(self, deltas, counts, problematic_counts, total_rentals):
+        deltas = np.asarray(deltas, dtype=np.float64)
+        order = np.argsort(deltas, kind="stable")
+        self.deltas = deltas[order]
+        self.cum_lost = np.concatenate(([0], np.cumsum(np.asarray(counts, dtype=np.int64)[order])))
+        self.cum_problematic = np.concatenate(([0], np.cumsum(np.asarray(problematic_counts, dtype=np.int64)[order])))
+
+        self.total_rentals = int(total_rentals)
+        self.total_problematic = int(self.cum_problematic[-1])
+
+    @classmethod
+    def from_arrays(cls, time_deltas, is_problematic, total_rentals):
+        """
+        Construit le simulateur à partir des délais et des indicateurs de friction, ligne par ligne.
+        """
+        deltas = np.asarray(time_deltas, dtype=np.float64)
+        problematic = np.asarray(is_problematic, dtype=bool)
+
+        # Les délais manquants ne sont jamais inférieurs au seuil : on les écarte
+        valid = ~np.isnan(deltas)
+        values, inverse = np.unique(deltas[valid], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(values))
+        problematic_counts = np.bincount(inverse, weights=problematic[valid], minlength=len(values))
+        return cls(values, counts, problematic_counts, total_rentals)
+
+    @classmethod
+    def from_frame(cls, df_join, total_rentals):
+        """
+        Construit le simulateur à partir des locations enchaînées (df_join) d'un périmètre.
+        """
+        return cls.from_arrays(df_join["time_delta_with_previous_rental"], df_join["is_problematic"], total_rentals)
+
+    def lost(self, thresholds):
+        """
+        Locations (enchaînées) perdues : délai avec la location précédente < seuil.
+        """
+        return self.cum_lost[np.searchsorted(self.deltas, thresholds, side="left")]
+
+    def solved(self, thresholds):
+        """
+        Problèmes résolus : cas problématiques dont le délai est < seuil.
+        """
+        return self.cum_problematic[np.searchsorted(self.deltas, thresholds, side="left")]
+
+    def simulate(self, thresholds):
+        """
+        Courbe complète pour une série de seuils (DataFrame threshold / solved / lost / preserved_percent).
+        """
+        thresholds = np.asarray(thresholds)
+        lost = self.lost(thresholds)
+        return pd.DataFrame({
+            "threshold": thresholds,
+            "solved": self.solved(thresholds),
+            "lost": lost,
+            "preserved_percent": (self.total_rentals - lost) / self.total_rentals * 100,
+        })
+
+    def at(self, threshold):
+        """
+        Chiffres clés pour un seuil donné.
+        """
+        lost = int(self.lost(threshold))
+        solved = int(self.solved(threshold))
+        return {
+            "threshold": threshold,
+            "solved": solved,
+            "lost": lost,
+            "lost_percent": lost / self.total_rentals * 100,
+            "preserved_percent": (self.total_rentals - lost) / self.total_rentals * 100,
+            "solved_percent": solved / self.total_problematic * 100 if self.total_problematic > 0 else 0,
+        }
+
+
+def build_scope_simulators(df, df_join, scopes):
+    """
+    Construit un simulateur par périmètre.
+    `scopes` associe un libellé à un type de check-in ('mobile', 'connect') ou à None (tous les véhicules).
+    """
+    # Colonnes lues une fois, chaque périmètre n'est qu'un masque : pas de copie de df_join
+    deltas = np.asarray(df_join["time_delta_with_previous_rental"], dtype=np.float64)
+    problematic = np.asarray(df_join["is_problematic"], dtype=bool)
+    simulators = {}
+    for label, checkin_type in scopes.items():
+        if checkin_type is None:
+            simulators[label] = ThresholdSimulator.from_arrays(deltas, problematic, len(df))
+        else:
+            mask = (df_join["checkin_type"] == checkin_type).to_numpy()
+            simulators[label] = ThresholdSimulator.from_arrays(
+                deltas[mask], problematic[mask],
+                (df["checkin_type"] == checkin_type).sum()
+            )
+    return simulators
+
+
+class SweepResult:
+    """
+    Résultat d'un balayage vectorisé : tableaux NumPy de forme (périmètres, tranches de retard, seuils).
+    """
+
+    def __init__(self, thresholds, scopes, delay_bands, lost, solved, total_rentals, total_problematic):
+        self.thresholds = thresholds
+        self.scopes = scopes
+        self.delay_bands = delay_bands
+        self.lost = lost
+        self.solved = solved
+        self.total_rentals = total_rentals
+        self.total_problematic = total_problematic
+
+    @property
+    def preserved_percent(self):
+        total = self.total_rentals[:, None, None]
+        return np.divide((total - self.lost) * 100.0, total, out=np.full(self.lost.shape, np.nan), where=total > 0)
+
+    @property
+    def solved_percent(self):
+        total = self.total_problematic[:, :, None]
+        return np.divide(self.solved * 100.0, total, out=np.zeros(self.solved.shape), where=total > 0)
+
+    def to_frame(self):
+        """
+        Résultat au format long (une ligne par périmètre, tranche de retard et seuil).
+        """
+        shape = self.lost.shape
+        scope_idx, band_idx, threshold_idx = np.indices(shape).reshape(3, -1)
+        return pd.DataFrame({
+            "scope": np.asarray(self.scopes, dtype=object)[scope_idx],
+            "delay_band": np.asarray(self.delay_bands, dtype=object)[band_idx],
+            "threshold": self.thresholds[threshold_idx],
+            "solved": self.solved.ravel(),
+            "lost": self.lost.ravel(),
+            "preserved_percent": self.preserved_percent.ravel(),
+            "solved_percent": self.solved_percent.ravel(),
+        })
+
+
+def _scope_masks(df, df_join, checkin_types, segments):
+    """
+    Masques des périmètres : tous les véhicules, chaque type de check-in, puis les segments personnalisés.
+    Renvoie les noms, les masques sur df_join (n, S) et le nombre total de locations de chaque périmètre.
+    """
+    if checkin_types is None:
+        checkin_types = [str(c) for c in df["checkin_type"].dropna().unique()]
+    names = ["all"]
+    join_masks = [np.ones(len(df_join), dtype=bool)]
+    totals = [len(df)]
+    for checkin_type in checkin_types:
+        names.append(checkin_type)
+        join_masks.append((df_join["checkin_type"] == checkin_type).to_numpy())
+        totals.append(int((df["checkin_type"] == checkin_type).sum()))
+    for name, segment in (segments or {}).items():
+        names.append(name)
+        join_masks.append(np.asarray(segment(df_join), dtype=bool))
+        totals.append(int(np.asarray(segment(df), dtype=bool).sum()))
+    return names, np.column_stack(join_masks), np.asarray(totals, dtype=np.int64)
+
+
+def _delay_band_masks(df_join, delay_quantiles):
+    """
+    Tranches du retard de la location précédente, délimitées par des quantiles.
+    La première tranche ('all') regroupe toutes les locations enchaînées.
+    """
+    names = ["all"]
+    masks = [np.ones(len(df_join), dtype=bool)]
+    if delay_quantiles:
+        previous_delay = df_join["previous_delay_at_checkout"].to_numpy(dtype=np.float64)
+        edges = np.nanquantile(previous_delay, delay_quantiles)
+        bounds = np.concatenate(([-np.inf], edges, [np.inf]))
+        labels = ["min"] + [f"P{q * 100:g}" for q in delay_quantiles] + ["max"]
+        for i in range(len(bounds) - 1):
+            names.append(f"{labels[i]}-{labels[i + 1]}")
+            masks.append((previous_delay > bounds[i]) & (previous_delay <= bounds[i + 1]))
+    return names, np.column_stack(masks)
+
+
+def sweep(df, df_join, thresholds, checkin_types=None, segments=None, delay_quantiles=None):
+    """
+    Balayage vectorisé de la simulation sur une grille seuils × périmètres × tranches de retard.
+
+    * `thresholds` : seuils à évaluer (en minutes).
+    * `checkin_types` : types de check-in à ajouter comme périmètres (par défaut, tous ceux des données).
+    * `segments` : périmètres personnalisés {nom: fonction(DataFrame) -> masque booléen}, appliqués
+      à df (pour le total de locations) et à df_join (pour les locations enchaînées).
+    * `delay_quantiles` : quantiles du retard de la location précédente (ex : [0.5, 0.9]) qui
+      découpent les locations enchaînées en tranches ; le total de référence reste celui du périmètre.
+
+    Les délais sont triés une seule fois (valeurs distinctes), les effectifs de chaque couple
+    (périmètre, tranche) sont comptés en un seul `bincount`, puis cumulés : chaque seuil est
+    ensuite une simple lecture d'index. Le coût est O(n log n + n·K + U·K + T·K), avec K le
+    nombre de couples et U le nombre de délais distincts.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    scopes, scope_masks, total_rentals = _scope_masks(df, df_join, checkin_types, segments)
+    bands, band_masks = _delay_band_masks(df_join, delay_quantiles)
+    n_scopes, n_bands = len(scopes), len(bands)
+    n_groups = n_scopes * n_bands
+
+    # Appartenance de chaque location enchaînée à chaque couple (périmètre, tranche) : (n, S*B)
+    membership = (scope_masks[:, :, None] & band_masks[:, None, :]).reshape(len(df_join), n_groups)
+    problematic = df_join["is_problematic"].to_numpy(dtype=bool)
+    total_problematic = membership[problematic].sum(axis=0).reshape(n_scopes, n_bands)
+
+    # Les délais manquants ne sont jamais inférieurs au seuil : on les écarte
+    deltas = df_join["time_delta_with_previous_rental"].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(deltas)
+    values, inverse = np.unique(deltas[valid], return_inverse=True)
+    rows, groups = np.nonzero(membership[valid])
+    keys = inverse[rows] * n_groups + groups
+    size = len(values) * n_groups
+    counts = np.bincount(keys, minlength=size).reshape(len(values), n_groups)
+    problem_counts = np.bincount(keys, weights=problematic[valid][rows], minlength=size).reshape(len(values), n_groups)
+
+    cum_lost = np.vstack((np.zeros(n_groups, dtype=np.int64), np.cumsum(counts, axis=0)))
+    cum_solved = np.vstack((np.zeros(n_groups, dtype=np.int64), np.cumsum(problem_counts, axis=0).astype(np.int64)))
+    idx = np.searchsorted(values, thresholds, side="left")
+
+    lost = cum_lost[idx].T.reshape(n_scopes, n_bands, len(thresholds))
+    solved = cum_solved[idx].T.reshape(n_scopes, n_bands, len(thresholds))
+    return SweepResult(thresholds, scopes, bands, lost, solved, total_rentals, total_problematic)
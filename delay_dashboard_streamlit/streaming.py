@@ -0,0 +1,320 @@
+import io
+import os
+import json
+import time
+import select
+import socket
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from data_loading import clean_delay_data
+from rental_store import histogram_median
+from simulation import ThresholdSimulator
+
+
+class DelayAggregator:
+    """
+    Agrégats de retards tenus à jour au fil de l'eau, avec une mémoire bornée.
+
+    Seuls les `max_recent` derniers retards au check-out sont gardés pour retrouver la
+    location précédente (df_join), et au plus `max_pending` locations (lignes, toutes clés
+    confondues) attendent une
+    location précédente pas encore reçue. Tout le reste est résumé en compteurs et en
+    histogrammes (retards des cas problématiques pour la médiane, délais entre locations
+    pour la simulation), dont la taille dépend du nombre de valeurs distinctes et non du
+    nombre de locations reçues.
+    """
+
+    def __init__(self, max_recent=200_000, max_pending=50_000):
+        self.max_recent = max_recent
+        self.max_pending = max_pending
+
+        self._recent = OrderedDict()
+        self._pending = OrderedDict()
+        # Nombre de lignes en attente, toutes clés confondues (borné par max_pending)
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+
+        self.rows_ingested = 0
+        self.dropped_pending = 0
+        self._scopes = defaultdict(self._new_scope)
+
+    @staticmethod
+    def _new_scope():
+        return {
+            "total_rentals": 0,
+            "consecutive_rentals": 0,
+            "late_count": 0,
+            "on_time_count": 0,
+            "checkin_counts": Counter(),
+            "state_counts": Counter(),
+            "prob_count": 0,
+            "cancel_prob": 0,
+            "problem_delays": Counter(),
+            "deltas": Counter(),
+            "problem_deltas": Counter(),
+        }
+
+    def add(self, chunk):
+        """
+        Ajoute un paquet de locations (DataFrame brut ou nettoyé).
+        """
+        chunk = clean_delay_data(chunk)
+        with self._lock:
+            self._count_rentals(chunk)
+            for row in chunk.itertuples(index=False):
+                self._link(row)
+            self.rows_ingested += len(chunk)
+
+    def _count_rentals(self, chunk):
+        for scope, rows in [("all", chunk), *chunk.groupby("checkin_type", observed=True)]:
+            agg = self._scopes[str(scope)]
+            delays = rows["delay_at_checkout"].dropna()
+            late = int((delays > 0).sum())
+            agg["total_rentals"] += len(rows)
+            agg["late_count"] += late
+            agg["on_time_count"] += len(delays) - late
+            agg["checkin_counts"].update(rows["checkin_type"].astype(str).value_counts().to_dict())
+            agg["state_counts"].update(rows["state"].astype(str).value_counts().to_dict())
+
+    def _link(self, row):
+        rental_id = int(row.rental_id)
+
+        # Retard connu de cette location, pour ses successeurs à venir
+        self._recent[rental_id] = row.delay_at_checkout
+        if len(self._recent) > self.max_recent:
+            self._recent.popitem(last=False)
+
+        # Successeurs arrivés avant cette location
+        successors = self._pending.pop(rental_id, [])
+        self._pending_rows -= len(successors)
+        for successor in successors:
+            self._add_pair(successor, row.delay_at_checkout)
+
+        previous_id = row.previous_ended_rental_id
+        if pd.isna(previous_id):
+            return
+        previous_id = int(previous_id)
+        if previous_id in self._recent:
+            self._add_pair(row, self._recent[previous_id])
+        else:
+            self._pending.setdefault(previous_id, []).append(row)
+            self._pending_rows += 1
+            self._evict_pending()
+
+    def _evict_pending(self):
+        """
+        Abandonne les plus anciennes lignes en attente au-delà de `max_pending` lignes.
+        """
+        while self._pending_rows > self.max_pending:
+            previous_id, rows = next(iter(self._pending.items()))
+            excess = self._pending_rows - self.max_pending
+            if len(rows) <= excess:
+                del self._pending[previous_id]
+                dropped = len(rows)
+            else:
+                del rows[:excess]
+                dropped = excess
+            self._pending_rows -= dropped
+            self.dropped_pending += dropped
+
+    def _add_pair(self, row, previous_delay):
+        """
+        Met à jour les compteurs pour une location enchaînée (équivalent d'une ligne de df_join).
+        """
+        delta = row.time_delta_with_previous_rental
+        # Logique : Un cas est problématique si le retard précédent est supérieur au temps de battement prévu
+        problematic = bool(previous_delay > delta)
+        for scope in ("all", str(row.checkin_type)):
+            agg = self._scopes[scope]
+            agg["consecutive_rentals"] += 1
+            if not np.isnan(delta):
+                agg["deltas"][float(delta)] += 1
+                agg["problem_deltas"][float(delta)] += problematic
+            if problematic:
+                agg["prob_count"] += 1
+                agg["cancel_prob"] += row.state == "canceled"
+                if not np.isnan(row.delay_at_checkout):
+                    agg["problem_delays"][float(row.delay_at_checkout)] += 1
+
+    def kpis(self):
+        """
+        KPIs par périmètre, au même format que `RentalStore.aggregates`.
+        """
+        with self._lock:
+            return {
+                scope: {
+                    "total_rentals": agg["total_rentals"],
+                    "consecutive_rentals": agg["consecutive_rentals"],
+                    "late_count": agg["late_count"],
+                    "on_time_count": agg["on_time_count"],
+                    "checkin_counts": dict(agg["checkin_counts"].most_common()),
+                    "state_counts": dict(agg["state_counts"].most_common()),
+                    "prob_count": agg["prob_count"],
+                    "median_delay_prob": histogram_median(agg["problem_delays"]),
+                    "cancel_prob": int(agg["cancel_prob"]),
+                }
+                for scope, agg in self._scopes.items()
+            }
+
+    def simulators(self, scopes):
+        """
+        Un simulateur de seuil par périmètre, construit depuis les histogrammes de délais.
+        `scopes` associe un libellé à un type de check-in ou à None (tous les véhicules).
+        """
+        with self._lock:
+            simulators = {}
+            for label, checkin_type in scopes.items():
+                agg = self._scopes[checkin_type or "all"]
+                deltas = list(agg["deltas"])
+                simulators[label] = ThresholdSimulator(
+                    deltas,
+                    [agg["deltas"][d] for d in deltas],
+                    [agg["problem_deltas"][d] for d in deltas],
+                    max(agg["total_rentals"], 1)
+                )
+            return simulators
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rows_ingested": self.rows_ingested,
+                "recent_rentals": len(self._recent),
+                "pending_rentals": self._pending_rows,
+                "dropped_pending": self.dropped_pending,
+            }
+
+
+def _lines_to_frame(lines, header=None):
+    """
+    Convertit des lignes CSV (avec l'en-tête) ou NDJSON en DataFrame.
+    """
+    if header is not None:
+        return pd.read_csv(io.StringIO(header + "".join(lines)))
+    return pd.DataFrame.from_records([json.loads(line) for line in lines])
+
+
+def tail_file(path, chunk_rows=10_000, follow=True, poll_interval=1.0, stop_event=None):
+    """
+    Lit un fichier CSV ou NDJSON en ajout seul (append-only), par paquets de `chunk_rows` lignes.
+    Avec `follow=True`, attend les nouvelles lignes comme `tail -f`. Seule une ligne incomplète
+    (en cours d'écriture) est gardée en mémoire entre deux lectures.
+    """
+    is_csv = str(path).endswith(".csv")
+    header = None
+    partial = ""
+    with open(path, encoding="utf-8") as f:
+        while stop_event is None or not stop_event.is_set():
+            lines = []
+            for line in f:
+                line = partial + line
+                partial = ""
+                if not line.endswith("\n"):
+                    partial = line
+                    break
+                if not line.strip():
+                    continue
+                if is_csv and header is None:
+                    header = line
+                    continue
+                lines.append(line)
+                if len(lines) >= chunk_rows:
+                    yield _lines_to_frame(lines, header)
+                    lines = []
+            if lines:
+                yield _lines_to_frame(lines, header)
+            if not follow:
+                return
+            time.sleep(poll_interval)
+
+
+def read_socket(host="127.0.0.1", port=9999, chunk_rows=1_000, flush_interval=1.0, stop_event=None):
+    """
+    Serveur TCP local : chaque connexion envoie des locations en NDJSON (une par ligne).
+    Les locations sont renvoyées par paquets de `chunk_rows` lignes ou toutes les `flush_interval` secondes.
+
+    La connexion est lue avec `select` et `recv` (pas de fichier avec délai d'attente : après
+    un premier délai dépassé, un tel fichier refuse toute nouvelle lecture). Une période sans
+    données ne fait donc qu'envoyer les lignes déjà reçues.
+    """
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    with socket.create_server((host, port)) as server:
+        server.settimeout(flush_interval)
+        while not stopped():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                buffer = b""
+                lines = []
+                last_flush = time.monotonic()
+                while not stopped():
+                    ready, _, _ = select.select([conn], [], [], flush_interval)
+                    if ready:
+                        data = conn.recv(65536)
+                        if not data:
+                            break
+                        # Seules les lignes complètes sont décodées, la fin incomplète attend la suite
+                        *complete, buffer = (buffer + data).split(b"\n")
+                        lines.extend(line.decode("utf-8") + "\n" for line in complete if line.strip())
+                    while len(lines) >= chunk_rows:
+                        yield _lines_to_frame(lines[:chunk_rows])
+                        lines = lines[chunk_rows:]
+                        last_flush = time.monotonic()
+                    if lines and time.monotonic() - last_flush >= flush_interval:
+                        yield _lines_to_frame(lines)
+                        lines = []
+                        last_flush = time.monotonic()
+                if buffer.strip():
+                    lines.append(buffer.decode("utf-8") + "\n")
+                if lines:
+                    yield _lines_to_frame(lines)
+
+
+class RentalStreamIngestor:
+    """
+    Alimente un `DelayAggregator` en tâche de fond depuis une source de flux :
+    un fichier CSV/NDJSON en ajout seul, ou `tcp://hôte:port` pour un socket local.
+    """
+
+    def __init__(self, source, aggregator=None, chunk_rows=10_000):
+        self.source = source
+        self.aggregator = aggregator or DelayAggregator()
+        self.chunk_rows = chunk_rows
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _chunks(self):
+        if self.source.startswith("tcp://"):
+            host, port = self.source[len("tcp://"):].rsplit(":", 1)
+            return read_socket(host, int(port), chunk_rows=self.chunk_rows, stop_event=self._stop)
+        return tail_file(self.source, chunk_rows=self.chunk_rows, stop_event=self._stop)
+
+    def _run(self):
+        try:
+            for chunk in self._chunks():
+                self.aggregator.add(chunk)
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="rental-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def stream_source():
+    """
+    Source du flux live configurée (variable GETAROUND_STREAM_SOURCE), ou None.
+    """
+    return os.getenv("GETAROUND_STREAM_SOURCE")
@@ -1,8 +1,16 @@
+import io
+import time
+import hashlib
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import numpy as np
+from analytics import RenderTimer, overview_figures, simulation_figures, with_threshold
+from optimizer import optimize_scopes, optimize_simulator, read_revenue
+from simulation import build_scope_simulators
+from rental_store import load_rental_store
+from streaming import RentalStreamIngestor, stream_source
+
+# Début du rendu (temps affiché en bas de la barre latérale)
+render_start = time.perf_counter()
 
 # Configuration de la page
 st.set_page_config(
@@ -12,38 +20,101 @@ st.set_page_config(
 )
 
 # --- CHARGEMENT ET PRÉPARATION DES DONNÉES ---
-@st.cache_data
+@st.cache_resource
 def load_and_process_data():
-    # Chargement depuis l'URL
-    url = "https://full-stack-assets.s3.eu-west-3.amazonaws.com/Deployment/get_around_delay_analysis.xlsx"
-    df = pd.read_excel(url)
-    
-    # Nettoyage basique
-    df = df.rename(columns=lambda col: col.replace('_in_minutes', '') if col.endswith('_in_minutes') else col)
-    df['checkin_type'] = df['checkin_type'].astype('category')
-    df['state'] = df['state'].astype('category')
-    
-    # Création des données pour les locations enchainées (Merge)
-    df_previous = df[['rental_id', 'delay_at_checkout']].copy()
-    df_previous.columns = ['rental_id_prev', 'previous_delay_at_checkout']
-    
-    df_join = df.merge(df_previous, left_on='previous_ended_rental_id', right_on='rental_id_prev', how='inner')
-    
-    # Logique : Un cas est problématique si le retard précédent est supérieur au temps de battement prévu
-    df_join['is_problematic'] = (df_join['previous_delay_at_checkout'] > df_join['time_delta_with_previous_rental'])
-    
-    return df, df_join
+    # Chargement depuis le cache colonnaire (reconstruit depuis le fichier Excel livré si celui-ci change)
+    # Le nettoyage basique (noms de colonnes, catégories, types compacts) est fait au chargement.
+    # Les locations enchaînées (df_join, avec is_problematic) et les KPIs de friction par périmètre
+    # sont calculés une fois puis enregistrés à côté des données.
+    # cache_resource : l'objet est partagé entre les reruns au lieu d'être copié à chaque fois
+    store = load_rental_store()
+    return store.rentals, store.joined, store.aggregates, store.version
+
+# Périmètres de la simulation : libellé affiché -> type de check-in (None = tous les véhicules)
+SCOPES = {'Tous les véhicules': None, 'Mobile': 'mobile', 'Connect': 'connect'}
+
+@st.cache_resource
+def get_simulators(_df, _df_join):
+    # Tri des délais et cumuls calculés une seule fois par périmètre (les arguments "_" ne sont pas hachés)
+    return build_scope_simulators(_df, _df_join, SCOPES)
+
+@st.cache_resource
+def get_stream_ingestor(source):
+    # Un seul thread d'ingestion par source, partagé par toutes les sessions
+    return RentalStreamIngestor(source).start()
 
-try:
-    df, df_join = load_and_process_data()
-except Exception as e:
-    st.error(f"Erreur lors du chargement des données : {e}")
-    st.stop()
+@st.cache_resource(max_entries=2)
+def get_stream_snapshot(source, data_version):
+    # KPIs et simulateurs du flux recalculés seulement quand de nouvelles locations sont arrivées
+    aggregator = get_stream_ingestor(source).aggregator
+    return aggregator.kpis(), aggregator.simulators(SCOPES)
+
+# Figures construites une fois par version des données (et par périmètre), partagées entre
+# les reruns et les sessions : un rerun ne fait que les afficher
+@st.cache_resource(max_entries=4)
+def get_overview_figures(data_version, _kpis):
+    return overview_figures(_kpis)
+
+@st.cache_resource(max_entries=4 * len(SCOPES))
+def get_simulation_figures(data_version, scope, _simulator):
+    return simulation_figures(_simulator)
+
+@st.cache_resource(max_entries=64)
+def get_optimum(data_version, scope, friction_value, revenue_per_rental, max_lost_percent, _simulator):
+    # Seuil optimal exact (tous les délais observés), recalculé seulement si les paramètres changent
+    return optimize_simulator(_simulator, revenue_per_rental, friction_value=friction_value,
+                              max_lost_percent=max_lost_percent)
+
+@st.cache_resource(max_entries=8)
+def get_revenue(file_name, content, column):
+    # Revenus par rental_id lus une fois par fichier déposé et par colonne
+    buffer = io.BytesIO(content)
+    buffer.name = file_name
+    return read_revenue(buffer, column)
+
+@st.cache_resource(max_entries=64)
+def get_revenue_optimum(data_version, scope, revenue_key, friction_value, max_lost_percent, _df, _df_join, _revenue):
+    # Seuil optimal avec le revenu de chaque location enchaînée (données fichier : df_join disponible)
+    checkin_type = SCOPES[scope]
+    scopes = optimize_scopes(_df, _df_join, checkin_types=[checkin_type] if checkin_type else [], revenue=_revenue,
+                             friction_value=friction_value, max_lost_percent=max_lost_percent)
+    return scopes[checkin_type or 'all']
+
+@st.cache_resource
+def get_render_timer():
+    return RenderTimer()
 
 # --- SIDEBAR NAVIGATION ---
 st.sidebar.title("Navigation")
 page = st.sidebar.radio("Aller vers", ["Aperçu & Problèmes", "Simulation & Seuil"])
 
+# Source des données : fichier (snapshot) ou flux live si GETAROUND_STREAM_SOURCE est défini
+live_source = stream_source()
+data_mode = "Fichier (snapshot)"
+if live_source:
+    data_mode = st.sidebar.radio("Données", ["Flux live", "Fichier (snapshot)"])
+
+if data_mode == "Flux live":
+    # Les pages lisent les agrégats tenus à jour par le flux (mémoire bornée, pas de DataFrame complet)
+    ingestor = get_stream_ingestor(live_source)
+    stream_stats = ingestor.aggregator.stats()
+    st.sidebar.caption(f"{stream_stats['rows_ingested']:,} locations reçues".replace(",", " "))
+    st.sidebar.button("Rafraîchir")
+    if ingestor.error is not None:
+        st.sidebar.error(f"Erreur du flux : {ingestor.error}")
+    if stream_stats['rows_ingested'] == 0:
+        st.info(f"En attente des premières locations sur {live_source}...")
+        st.stop()
+    data_version = f"stream:{stream_stats['rows_ingested']}"
+    aggregates, simulators = get_stream_snapshot(live_source, data_version)
+else:
+    try:
+        df, df_join, aggregates, data_version = load_and_process_data()
+    except Exception as e:
+        st.error(f"Erreur lors du chargement des données : {e}")
+        st.stop()
+    simulators = get_simulators(df, df_join)
+
 # --- PAGE 1 : APERÇU & PROBLÈMES ---
 if page == "Aperçu & Problèmes":
     
@@ -54,9 +125,10 @@ if page == "Aperçu & Problèmes":
     st.markdown("### Aperçu des données")
     st.markdown("---") # Trait fin
 
-    # Métriques Globales
-    total_rentals = len(df)
-    consecutive_rentals = len(df_join)
+    # Métriques Globales (précalculées)
+    kpis = aggregates['all']
+    total_rentals = kpis['total_rentals']
+    consecutive_rentals = kpis['consecutive_rentals']
     percent_consecutive = (consecutive_rentals / total_rentals) * 100
 
     col1, col2, col3 = st.columns([1, 2, 1]) # Centrage visuel
@@ -67,95 +139,28 @@ if page == "Aperçu & Problèmes":
 
     st.markdown("<br>", unsafe_allow_html=True)
 
-    # 3 Donuts sur une ligne
+    # 3 Donuts sur une ligne (figures construites une fois par version des données)
+    figures = get_overview_figures(data_version, kpis)
     col_d1, col_d2, col_d3 = st.columns(3)
-
-    # Donut 1 : Proportion des retards
-    df_delay_clean = df.dropna(subset=['delay_at_checkout'])
-    late_count = df_delay_clean[df_delay_clean['delay_at_checkout'] > 0].shape[0]
-    on_time_count = len(df_delay_clean) - late_count
-    
-    fig_donut1 = px.pie(
-        names=['En retard', "À l'heure"],
-        values=[late_count, on_time_count],
-        color_discrete_sequence=['#ef553b', '#00CC96'],
-        hole=0.5
-    )
-    # Mise à jour : Légende visible en bas
-    fig_donut1.update_layout(
-        title_text="Proportion des retards", title_x=0.3,
-        showlegend=True, 
-        legend=dict(orientation="h", y=-0.1),
-        margin=dict(t=40, b=20, l=0, r=0)
-    )
     # CORRECTION WARNING : width="stretch" au lieu de use_container_width=True
-    col_d1.plotly_chart(fig_donut1, width="stretch")
-
-    # Donut 2 : Check-in Type
-    checkin_counts = df['checkin_type'].value_counts().reset_index()
-    checkin_counts.columns = ['Type', 'Count']
-    fig_donut2 = px.pie(
-        checkin_counts, values='Count', names='Type',
-        color='Type',
-        color_discrete_map={'mobile':'#636EFA', 'connect':'#AB63FA'},
-        hole=0.5
-    )
-    fig_donut2.update_layout(
-        title_text="Type de check-in", title_x=0.35,
-        showlegend=True, 
-        legend=dict(orientation="h", y=-0.1),
-        margin=dict(t=40, b=20, l=0, r=0)
-    )
-    col_d2.plotly_chart(fig_donut2, width="stretch")
-
-    # Donut 3 : État des locations
-    state_counts = df['state'].value_counts().reset_index()
-    state_counts.columns = ['State', 'Count']
-    fig_donut3 = px.pie(
-        state_counts, values='Count', names='State',
-        color='State',
-        color_discrete_map={'ended':'#00CC96', 'canceled':'#ef553b'},
-        hole=0.5
-    )
-    fig_donut3.update_layout(
-        title_text="État des locations", title_x=0.35,
-        showlegend=True, 
-        legend=dict(orientation="h", y=-0.1),
-        margin=dict(t=40, b=20, l=0, r=0)
-    )
-    col_d3.plotly_chart(fig_donut3, width="stretch")
+    col_d1.plotly_chart(figures['late'], width="stretch")
+    col_d2.plotly_chart(figures['checkin'], width="stretch")
+    col_d3.plotly_chart(figures['state'], width="stretch")
 
     # --- SECTION 2 : CAS PROBLÉMATIQUES ---
     st.markdown("### Cas problématiques (frictions)")
     st.markdown("---")
 
-    # Calcul des KPIs Friction
-    prob_count = df_join['is_problematic'].sum()
-    prob_total = len(df_join)
-    median_delay_prob = df_join[df_join['is_problematic']]['delay_at_checkout'].median()
-    cancel_prob = df_join[(df_join['is_problematic']) & (df_join['state'] == 'canceled')].shape[0]
+    # KPIs Friction (précalculés avec la jointure)
+    prob_count = kpis['prob_count']
+    median_delay_prob = kpis['median_delay_prob']
+    cancel_prob = kpis['cancel_prob']
 
     col_fric_1, col_fric_2 = st.columns([1, 1])
 
     with col_fric_1:
         # Donut Friction
-        # IMPORTANT : On passe les valeurs dans l'ordre [Friction, Sans impact]
-        # Et on met sort=False pour que Plotly respecte notre ordre et donc nos couleurs
-        fig_fric = px.pie(
-            names=['Friction', 'Sans impact'],
-            values=[prob_count, prob_total - prob_count],
-            title="Proportion des frictions",
-            color_discrete_sequence=['#ef553b', '#d3d3d3'], # Rouge pour Friction, Gris clair pour le reste
-            hole=0.6
-        )
-        # Annotation au centre
-        fig_fric.add_annotation(text=f"{prob_count/prob_total:.1%}", showarrow=False, font_size=25, font_color="#ef553b", font_weight="bold")
-        
-        # sort=False empêche Plotly de mettre la plus grosse part (gris) en premier (rouge)
-        fig_fric.update_traces(sort=False) 
-        
-        fig_fric.update_layout(showlegend=True, legend=dict(orientation="h", y=0), margin=dict(t=40, b=20, l=0, r=0))
-        st.plotly_chart(fig_fric, width="stretch")
+        st.plotly_chart(figures['friction'], width="stretch")
 
     with col_fric_2:
         # 3 Chiffres alignés verticalement avec un peu de style
@@ -181,7 +186,7 @@ elif page == "Simulation & Seuil":
     with col_control1:
         scope_option = st.radio(
             "Sélectionnez le périmètre :",
-            ('Tous les véhicules', 'Mobile', 'Connect'),
+            tuple(SCOPES),
             horizontal=True
         )
     
@@ -194,107 +199,70 @@ elif page == "Simulation & Seuil":
             value=60
         )
 
-    # --- FILTRAGE DES DONNÉES POUR LA SIMULATION ---
-    
-    # Filtrage du scope (Périmètre)
-    if scope_option == 'Mobile':
-        current_df_join = df_join[df_join['checkin_type'] == 'mobile'].copy()
-        total_rentals_scope = len(df[df['checkin_type'] == 'mobile'])
-    elif scope_option == 'Connect':
-        current_df_join = df_join[df_join['checkin_type'] == 'connect'].copy()
-        total_rentals_scope = len(df[df['checkin_type'] == 'connect'])
-    else:
-        current_df_join = df_join.copy()
-        total_rentals_scope = len(df)
+    # --- SEUIL OPTIMAL ---
+    # Objectif : valeur des frictions évitées - revenu des locations perdues (même unité)
+    # Par défaut, une friction évitée vaut 10 locations : avec 1 pour 1, aucun seuil n'est rentable
+    revenue_file = None
+    with st.expander("Paramètres du seuil optimal"):
+        col_opt1, col_opt2, col_opt3 = st.columns(3)
+        friction_value = col_opt1.number_input("Valeur d'une friction évitée", min_value=0.0, value=10.0, step=0.5,
+                                               help="Dans la même unité que le revenu d'une location")
+        revenue_per_rental = col_opt2.number_input("Revenu moyen d'une location", min_value=0.0, value=1.0, step=0.5,
+                                                   help="Utilisé sans fichier de revenus")
+        max_lost_percent = col_opt3.number_input("Part maximale de locations perdues (%)", min_value=0.0, max_value=100.0, value=100.0, step=1.0)
+        if data_mode == "Flux live":
+            st.caption("Flux live : revenu moyen par location uniquement.")
+        else:
+            # Mêmes revenus par location que `python optimizer.py --revenue ... --revenue-column ...`
+            col_rev1, col_rev2 = st.columns([3, 1])
+            revenue_file = col_rev1.file_uploader("Revenus par location (CSV ou Parquet, colonne rental_id)", type=["csv", "parquet"])
+            revenue_column = col_rev2.text_input("Colonne des revenus", value="revenue")
 
     # --- CALCUL DE LA SIMULATION (COURBES) ---
-    # On calcule pour TOUS les seuils pour tracer les courbes
-    sim_thresholds = range(0, 301, 15) # Step plus fin pour le graph
-    results = []
-
-    for t in sim_thresholds:
-        # Solution : On résout les cas qui étaient problématiques ET qui ont un delta < t
-        # (Car on suppose qu'on aurait refusé la 2eme location, donc plus de problème de retard)
-        solved_count = current_df_join[
-            (current_df_join['is_problematic'] == True) & 
-            (current_df_join['time_delta_with_previous_rental'] < t)
-        ].shape[0]
-        
-        # Coût : On perd TOUTES les locations (enchaînées) qui ont un delta < t
-        lost_count = current_df_join[
-            current_df_join['time_delta_with_previous_rental'] < t
-        ].shape[0]
-        
-        results.append({
-            'threshold': t,
-            'solved': solved_count,
-            'lost': lost_count,
-            'preserved_percent': ((total_rentals_scope - lost_count) / total_rentals_scope) * 100
-        })
-
-    df_sim = pd.DataFrame(results)
+    # Le simulateur du périmètre a déjà trié les délais : chaque seuil est une recherche dichotomique,
+    # ce qui permet une courbe minute par minute. Les courbes sont calculées et tracées une fois
+    # par périmètre et version des données ; déplacer le curseur n'ajoute que la ligne du seuil.
+    simulator = simulators[scope_option]
+    sim_figures = get_simulation_figures(data_version, scope_option, simulator)
+    optimum = None
+    if revenue_file is not None:
+        content = revenue_file.getvalue()
+        try:
+            revenue = get_revenue(revenue_file.name, content, revenue_column)
+            revenue_key = (revenue_file.name, hashlib.sha256(content).hexdigest(), revenue_column)
+            optimum = get_revenue_optimum(data_version, scope_option, revenue_key, friction_value, max_lost_percent,
+                                          df, df_join, revenue)
+        except (KeyError, ValueError) as e:
+            st.error(f"Fichier de revenus inutilisable, revenu moyen utilisé : {e}")
+    if optimum is None:
+        optimum = get_optimum(data_version, scope_option, friction_value, revenue_per_rental, max_lost_percent, simulator)
 
     # --- VISUALISATIONS ---
     col_graph1, col_graph2 = st.columns(2)
 
     with col_graph1:
-        # Graphique 1 : Coût vs Bénéfice
-        fig1 = go.Figure()
-        fig1.add_trace(go.Scatter(x=df_sim['threshold'], y=df_sim['lost'], mode='lines', name='Locations perdues (Coût)', line=dict(color='#ef553b', width=3)))
-        fig1.add_trace(go.Scatter(x=df_sim['threshold'], y=df_sim['solved'], mode='lines', name='Problèmes résolus (Bénéfice)', line=dict(color='#00cc96', width=3)))
-        
-        # Ligne verticale pour le seuil choisi
-        fig1.add_vline(x=threshold, line_width=2, line_dash="dash", line_color="grey")
-        
-        fig1.update_layout(
-            title="Compromis Coût / Bénéfice",
-            xaxis_title="Seuil (min)",
-            yaxis_title="Nombre de locations",
-            legend=dict(x=0.01, y=0.99),
-            height=400
-        )
-        st.plotly_chart(fig1, width="stretch")
+        # Graphique 1 : Coût vs Bénéfice, avec la ligne verticale du seuil choisi
+        st.plotly_chart(with_threshold(sim_figures['tradeoff'], threshold, optimum['threshold']), width="stretch")
 
     with col_graph2:
         # Graphique 2 : Volume préservé
-        fig2 = go.Figure()
-        fig2.add_trace(go.Scatter(x=df_sim['threshold'], y=df_sim['preserved_percent'], mode='lines', name='% Volume préservé', line=dict(color='#636EFA', width=3)))
-        
-        # Ligne verticale pour le seuil choisi
-        fig2.add_vline(x=threshold, line_width=2, line_dash="dash", line_color="grey")
-        
-        fig2.update_layout(
-            title="Impact sur le chiffre d'affaires global",
-            xaxis_title="Seuil (min)",
-            yaxis_title="% Volume Préservé",
-            yaxis_range=[80, 101],
-            height=400
-        )
-        st.plotly_chart(fig2, width="stretch")
+        st.plotly_chart(with_threshold(sim_figures['preserved'], threshold, optimum['threshold']), width="stretch")
+
+    # Seuil optimal du périmètre (exact, indépendant du pas de 30 minutes du curseur)
+    col_o1, col_o2, col_o3, col_o4 = st.columns(4)
+    col_o1.metric("Seuil optimal", f"{optimum['threshold']:.0f} min")
+    col_o2.metric("Problèmes résolus", f"{optimum['solved']}", delta=f"{optimum['solved_percent']:.1f} %", delta_color="off")
+    col_o3.metric("Locations perdues", f"{optimum['lost']}", delta=f"{optimum['lost_percent']:.1f} %", delta_color="off")
+    col_o4.metric("Gain net", f"{optimum['objective']:,.1f}".replace(",", " "))
 
     # --- CHIFFRES CLÉS (ENCADRÉ) ---
     
-    # Récupération des chiffres exacts pour le seuil sélectionné par l'utilisateur
-    # On ne prend pas dans df_sim car le step du slider (30) peut différer du step de simulation (15)
-    # On recalcule à la volée pour être précis
-    
-    metric_solved = current_df_join[
-        (current_df_join['is_problematic'] == True) & 
-        (current_df_join['time_delta_with_previous_rental'] < threshold)
-    ].shape[0]
-    
-    metric_lost = current_df_join[
-        current_df_join['time_delta_with_previous_rental'] < threshold
-    ].shape[0]
-    
-    metric_preserved_pct = ((total_rentals_scope - metric_lost) / total_rentals_scope) * 100
-    
-    # Calcul du pourcentage de problèmes résolus par rapport au total des problèmes du scope
-    total_problems_in_scope = current_df_join['is_problematic'].sum()
-    if total_problems_in_scope > 0:
-        pct_solved_problems = (metric_solved / total_problems_in_scope) * 100
-    else:
-        pct_solved_problems = 0
+    # Chiffres exacts pour le seuil sélectionné par l'utilisateur
+    metrics = simulator.at(threshold)
+    metric_solved = metrics['solved']
+    metric_lost = metrics['lost']
+    metric_preserved_pct = metrics['preserved_percent']
+    pct_solved_problems = metrics['solved_percent']
 
     # Affichage style "Dashboard"
     st.markdown(f"""
@@ -308,7 +276,7 @@ elif page == "Simulation & Seuil":
             <div style="border-left: 1px solid #ccc; margin: 0 15px;"></div>
             <div>
                 <h4 style="color: #ef553b; margin-bottom: 0;">Locations perdues</h4>
-                <p style="font-size: 24px; font-weight: bold; margin: 0;">{metric_lost} <span style="font-size: 16px; font-weight: normal;">({(metric_lost/total_rentals_scope)*100:.1f}%)</span></p>
+                <p style="font-size: 24px; font-weight: bold; margin: 0;">{metric_lost} <span style="font-size: 16px; font-weight: normal;">({metrics['lost_percent']:.1f}%)</span></p>
             </div>
             <div style="border-left: 1px solid #ccc; margin: 0 15px;"></div>
             <div>
@@ -317,4 +285,13 @@ elif page == "Simulation & Seuil":
             </div>
         </div>
     </div>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    """, unsafe_allow_html=True)
+
+# --- TEMPS DE RENDU ---
+render_timer = get_render_timer()
+render_timer.record(page, time.perf_counter() - render_start)
+render_stats = render_timer.stats(page)
+st.sidebar.caption(
+    f"Rendu de la page : {render_stats['last_ms']:.0f} ms "
+    f"(médiane {render_stats['median_ms']:.0f} ms, p95 {render_stats['p95_ms']:.0f} ms sur {render_stats['renders']} rendus)"
+)
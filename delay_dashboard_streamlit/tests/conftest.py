@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Les modules du dashboard sont des scripts à la racine de delay_dashboard_streamlit/
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DASHBOARD_DIR)
+
+
+@pytest.fixture(scope="session")
+def rentals():
+    """
+    Locations du fichier Excel livré, lues sans passer par le cache colonnaire.
+    """
+    from data_loading import BUNDLED_SOURCE, read_source
+
+    return read_source(BUNDLED_SOURCE)
@@ -0,0 +1,54 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import simulation_figures, with_threshold
+from optimizer import optimize_scopes, optimize_simulator, read_revenue
+from rental_store import RentalStore
+from simulation import build_scope_simulators
+
+SCOPES = {"all": None, "mobile": "mobile", "connect": "connect"}
+
+
+@pytest.fixture(scope="module")
+def store(rentals):
+    return RentalStore(rentals)
+
+
+@pytest.fixture(scope="module")
+def simulators(store):
+    return build_scope_simulators(store.rentals, store.joined, SCOPES)
+
+
+def test_flat_revenue_matches_simulator(store, simulators):
+    scopes = optimize_scopes(store.rentals, store.joined, friction_value=10)
+    for scope, simulator in simulators.items():
+        expected = optimize_simulator(simulator, 1.0, friction_value=10)
+        assert scopes[scope]["threshold"] == expected["threshold"]
+        assert scopes[scope]["objective"] == pytest.approx(expected["objective"])
+        # Valeurs par défaut du dashboard : un seuil non nul dans chaque périmètre
+        assert expected["threshold"] > 0
+
+
+def test_revenue_from_uploaded_file(store):
+    prices = np.random.default_rng(0).uniform(50, 150, len(store.rentals))
+    buffer = io.BytesIO()
+    pd.DataFrame({"rental_id": store.rentals["rental_id"], "price": prices}).to_parquet(buffer)
+    buffer.seek(0)
+    buffer.name = "revenus.parquet"
+    revenue = read_revenue(buffer, "price")
+    result = optimize_scopes(store.rentals, store.joined, checkin_types=[], revenue=revenue, friction_value=1000)
+    lost = store.joined["time_delta_with_previous_rental"] < result["all"]["threshold"]
+    expected = revenue.reindex(store.joined["rental_id"][lost]).sum()
+    assert result["all"]["revenue_lost"] == pytest.approx(expected)
+
+
+def test_optimum_outside_axis_is_clamped(simulators):
+    figure = simulation_figures(simulators["all"])["tradeoff"]
+    clamped = with_threshold(figure, 60, 421)
+    assert clamped.layout.shapes[-1].x0 == 300
+    assert "421 min" in clamped.layout.annotations[-1].text
+    inside = with_threshold(figure, 60, 61)
+    assert inside.layout.shapes[-1].x0 == 61
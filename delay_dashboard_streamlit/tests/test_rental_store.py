@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+import data_loading
+import rental_store
+from rental_store import RentalStore, compute_aggregates, histogram_median
+
+
+def assert_same_aggregates(actual, expected):
+    assert actual.keys() == expected.keys()
+    for scope, kpis in expected.items():
+        assert actual[scope].keys() == kpis.keys()
+        for name, value in kpis.items():
+            if isinstance(value, float) and math.isnan(value):
+                assert math.isnan(actual[scope][name]), (scope, name)
+            else:
+                assert actual[scope][name] == value, (scope, name)
+
+
+def sorted_join(joined):
+    return joined.sort_values("rental_id").reset_index(drop=True)
+
+
+def test_append_matches_full_rebuild(rentals):
+    full = RentalStore(rentals)
+
+    # Ordre mélangé : des locations arrivent avant leur location précédente
+    shuffled = rentals.sample(frac=1.0, random_state=0).reset_index(drop=True)
+    parts = np.array_split(np.arange(len(shuffled)), 4)
+    store = RentalStore(shuffled.iloc[parts[0]])
+    for part in parts[1:]:
+        store.append(shuffled.iloc[part])
+
+    assert len(store.rentals) == len(full.rentals)
+    pd.testing.assert_frame_equal(sorted_join(store.joined), sorted_join(full.joined), check_categorical=False)
+    assert_same_aggregates(store.aggregates, full.aggregates)
+    assert_same_aggregates(store.aggregates, compute_aggregates(store.rentals, store.joined))
+
+
+def test_append_after_load_uses_saved_aggregates(rentals):
+    half = len(rentals) // 2
+    first = RentalStore(rentals.iloc[:half])
+    loaded = RentalStore(first.rentals, joined=first.joined, aggregates=first.aggregates)
+    loaded.append(rentals.iloc[half:])
+    assert_same_aggregates(loaded.aggregates, RentalStore(rentals).aggregates)
+
+
+def test_histogram_median():
+    assert histogram_median({1.0: 1, 3.0: 1}) == 2.0
+    assert histogram_median({5.0: 3, 1.0: 1}) == 5.0
+    assert math.isnan(histogram_median({}))
+
+
+def test_load_hashes_source_once_and_reloads_join(rentals, tmp_path, monkeypatch):
+    source = tmp_path / "rentals.csv"
+    rentals.to_csv(source, index=False)
+    monkeypatch.setattr(data_loading, "CACHE_DIR", tmp_path / "cache")
+    hashed = []
+    checksum = data_loading.file_checksum
+    monkeypatch.setattr(data_loading, "file_checksum", lambda path: hashed.append(path) or checksum(path))
+
+    built = rental_store.load_rental_store(str(source))
+    loaded = rental_store.load_rental_store(str(source))
+    assert len(hashed) == 2
+    pd.testing.assert_frame_equal(loaded.joined, built.joined)
+    assert_same_aggregates(loaded.aggregates, built.aggregates)
@@ -0,0 +1,83 @@
+import json
+import time
+import socket
+
+import pandas as pd
+
+from streaming import DelayAggregator, RentalStreamIngestor
+
+
+def rental(rental_id, previous=None, delta=None, delay=0.0):
+    return {
+        "rental_id": rental_id, "car_id": 1, "checkin_type": "mobile", "state": "ended",
+        "delay_at_checkout_in_minutes": delay, "previous_ended_rental_id": previous,
+        "time_delta_with_previous_rental_in_minutes": delta,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def connect(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port))
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_socket_ingestion_survives_idle_periods():
+    port = free_port()
+    ingestor = RentalStreamIngestor(f"tcp://127.0.0.1:{port}").start()
+    aggregator = ingestor.aggregator
+    try:
+        with connect(port) as conn:
+            conn.sendall((json.dumps(rental(1, delay=90.0)) + "\n").encode())
+            assert wait_for(lambda: aggregator.rows_ingested == 1)
+
+            # Pause plus longue que flush_interval (1 s) : la lecture doit reprendre ensuite
+            time.sleep(1.5)
+            second = json.dumps(rental(2, previous=1, delta=60.0)) + "\n"
+            third = json.dumps(rental(3)) + "\n"
+            # Ligne coupée entre deux envois : elle n'est décodée qu'une fois complète
+            conn.sendall((second + third[:10]).encode())
+            time.sleep(0.2)
+            conn.sendall(third[10:].encode())
+
+            assert wait_for(lambda: aggregator.rows_ingested == 3)
+        assert ingestor.error is None
+        kpis = aggregator.kpis()["all"]
+        assert kpis["total_rentals"] == 3
+        assert kpis["consecutive_rentals"] == 1
+        assert kpis["prob_count"] == 1
+    finally:
+        ingestor.stop()
+
+
+def test_pending_rows_are_bounded_across_keys():
+    # Beaucoup de successeurs pour une même location précédente inconnue
+    aggregator = DelayAggregator(max_pending=5)
+    aggregator.add(pd.DataFrame([rental(i, previous=1000, delta=30.0) for i in range(1, 9)]))
+    aggregator.add(pd.DataFrame([rental(20, previous=2000, delta=30.0)]))
+    assert aggregator.stats()["pending_rentals"] == 5
+    assert aggregator.dropped_pending == 4
+
+    # Les lignes gardées sont les plus récentes : elles sont jointes à l'arrivée de leur précédente
+    aggregator.add(pd.DataFrame([rental(1000, delay=60.0), rental(2000, delay=0.0)]))
+    assert aggregator.stats()["pending_rentals"] == 0
+    kpis = aggregator.kpis()["all"]
+    assert kpis["consecutive_rentals"] == 5
+    assert kpis["prob_count"] == 4
@@ -1,9 +1,26 @@
+import os
+import csv
+import collections
+import json
+import math
+import time
+import asyncio
+import threading
+import itertools
 import uvicorn
-import pandas as pd 
-import joblib
-from fastapi import FastAPI
-from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Literal, Optional, Union
+from batching import MicroBatcher, QueueFullError
+from fast_inference import ARTIFACT_MANIFEST, CompiledPipeline, check_parity
+from cache import PredictionCache, RedisBackend
+from schemas import CAR_LIST, CarFeatures
+from model_registry import ModelRegistry, ModelVersion
+from metrics import Registry, MetricsMiddleware, SamplingProfiler
 
 # Description de l'API
 description = """
@@ -14,8 +31,89 @@ API prédictive pour estimer le prix de location journalier d'un véhicule.
 ## Fonctionnalités
 * **Preview** : Route de test pour vérifier que l'API tourne.
 * **Predict** : Envoie les caractéristiques d'une voiture et reçoit une estimation de prix.
+* **Predict batch** : Envoie une liste de voitures (JSON, NDJSON ou CSV) et reçoit les prix dans le même ordre.
+* **Sensitivity** : Fait varier le kilométrage, la puissance ou les options d'une voiture et reçoit la courbe des prix.
 """
 
+# --- CONFIGURATION DU BATCH ---
+# Nombre maximum de voitures acceptées dans une requête JSON /predict/batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+# Nombre de lignes envoyées au pipeline en un seul appel (chunk vectorisé)
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1000"))
+# Nombre maximum de variantes (produit des axes) dans une requête /predict/sensitivity
+MAX_SENSITIVITY_POINTS = int(os.getenv("MAX_SENSITIVITY_POINTS", "10000"))
+
+# --- CONFIGURATION DU MICRO-BATCHING (optionnel) ---
+# Regroupe les appels /predict concurrents en un seul appel au pipeline
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "0") == "1"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+MICRO_BATCH_MAX_QUEUE = int(os.getenv("MICRO_BATCH_MAX_QUEUE", "0"))
+
+# --- CONFIGURATION DU CACHE DES PRÉDICTIONS ---
+# Taille maximum (0 = cache désactivé) et durée de vie des entrées (en secondes)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+# Backend partagé entre workers (optionnel), ex : redis://localhost:6379/0
+PREDICTION_CACHE_REDIS_URL = os.getenv("PREDICTION_CACHE_REDIS_URL")
+
+# --- CONFIGURATION DU PROFILAGE (optionnel) ---
+# Fraction des appels au modèle profilés avec cProfile (0 = désactivé, modifiable via /profiling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# --- CONFIGURATION DU SERVICE (multi-workers : voir gunicorn.conf.py) ---
+# Threads de calcul par worker : les prédictions tournent dans ce pool borné, hors de la boucle asyncio
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "4"))
+# Threads XGBoost par prédiction (0 = réglage du modèle), fixé par gunicorn.conf.py selon le nombre de workers
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0"))
+
+MODEL_PATH = os.getenv("MODEL_PATH", "model.joblib")
+# Artefact léger produit par export_model.py (booster natif + paramètres en JSON) : s'il est
+# indiqué, l'API le charge à la place de model.joblib, sans importer pandas, scikit-learn ni le
+# paquet xgboost (le booster est chargé directement par libxgboost)
+MODEL_ARTIFACT = os.getenv("MODEL_ARTIFACT")
+# "background" : l'API répond tout de suite (/health/live) et charge le modèle en arrière-plan
+# "eager" : chargement à l'import (utilisé par gunicorn pour partager le modèle entre workers)
+MODEL_LOADING = os.getenv("MODEL_LOADING", "background")
+# "1" (fixé par gunicorn.conf.py) : aucune prédiction au chargement (contrôle de parité du mode
+# compilé, préchauffage) dans le processus maître. OpenMP (XGBoost) n'est pas sûr après un fork
+# si ses threads ont déjà tourné : ces contrôles sont faits par chaque worker (`after_fork`).
+MODEL_DEFER_CHECKS = os.getenv("MODEL_DEFER_CHECKS", "0") == "1"
+# Dossier de versions surveillé (optionnel) : rechargement à chaud et routage A/B, voir model_registry.py
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR")
+MODEL_REGISTRY_POLL = float(os.getenv("MODEL_REGISTRY_POLL", "10"))
+# Nombre maximum de paquets en attente de scoring shadow (au-delà, ils sont ignorés)
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "100"))
+
+batcher = None
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Lance le chargement du modèle en arrière-plan, la surveillance du registre des modèles
+    et le micro-batching s'ils sont activés (et les arrête proprement).
+    """
+    global batcher, model_loading
+    if not model_ready.is_set() and model_loading is None:
+        model_loading = asyncio.get_running_loop().run_in_executor(inference_pool, load_model)
+    if MODEL_REGISTRY_DIR:
+        models.start()
+    if MICRO_BATCHING:
+        batcher = MicroBatcher(
+            score_and_cache,
+            max_batch_size=MICRO_BATCH_MAX_SIZE,
+            max_wait_ms=MICRO_BATCH_MAX_WAIT_MS,
+            max_queue_size=MICRO_BATCH_MAX_QUEUE
+        )
+        await batcher.start()
+    yield
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+    if MODEL_REGISTRY_DIR:
+        models.stop()
+
 # Initialisation de l'application
 app = FastAPI(
     title="GetAround Pricing API",
@@ -24,33 +122,510 @@ app = FastAPI(
     contact={
         "name": "SterennG",
         "url": "https://github.com/SterennG/GetAround-Project",
-    }
+    },
+    lifespan=lifespan
 )
 
+# --- MÉTRIQUES (format Prometheus) ---
+registry = Registry()
+REQUESTS = registry.counter("http_requests_total", "Nombre de requêtes HTTP par route et code de réponse.", ["method", "route", "status"])
+REQUEST_LATENCY = registry.histogram("http_request_duration_seconds", "Durée totale des requêtes HTTP.", ["method", "route"])
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requêtes HTTP en cours de traitement.")
+INFERENCE_PENDING = registry.gauge("inference_pool_pending", "Appels au modèle en cours ou en attente d'un thread de calcul.")
+# Étapes : validation (lecture du corps + pydantic), dataframe, preprocessing, model (booster), encode (mode compilé)
+STAGE_LATENCY = registry.histogram("predict_stage_duration_seconds", "Durée de chaque étape de la prédiction.", ["stage"])
+PREDICTED_ROWS = registry.counter("predict_rows_total", "Nombre de voitures passées par le modèle.")
+MODEL_LATENCY = registry.histogram("model_predict_duration_seconds", "Durée des appels au modèle par version.", ["version"])
+registry.gauge(
+    "micro_batch_queue_depth", "Voitures en attente dans la file du micro-batching.",
+    callback=lambda: batcher.stats()["queue_depth"] if batcher is not None else 0
+)
+registry.counter(
+    "micro_batch_batches_total", "Paquets du micro-batching scorés, par résultat.", ["result"],
+    callback=lambda: {
+        ("ok",): batcher.batches_total - batcher.failed_batches_total, ("error",): batcher.failed_batches_total
+    } if batcher is not None else {}
+)
+registry.counter(
+    "micro_batch_rows_total", "Voitures passées par le micro-batching, par résultat du paquet.", ["result"],
+    callback=lambda: {
+        ("ok",): batcher.rows_total - batcher.failed_rows_total, ("error",): batcher.failed_rows_total
+    } if batcher is not None else {}
+)
+registry.counter(
+    "prediction_cache_lookups_total", "Consultations du cache des prédictions par résultat.", ["result"],
+    callback=lambda: {("hit",): cache.hits, ("miss",): cache.misses} if cache is not None else {}
+)
+app.add_middleware(MetricsMiddleware, requests=REQUESTS, latency=REQUEST_LATENCY, in_flight=IN_FLIGHT)
+
+profiler = SamplingProfiler(rate=PROFILE_SAMPLE_RATE, output_dir=PROFILE_DIR)
+
+# --- MODE D'INFÉRENCE ---
+# "pipeline" : pipeline sklearn complet (DataFrame pandas + ColumnTransformer + XGBoost)
+# "compiled" : encodage direct dans une matrice NumPy puis appel du booster XGBoost
+# (toujours le cas avec MODEL_ARTIFACT)
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "pipeline")
+
 # --- CHARGEMENT DU MODÈLE ---
-# Chargement du pipeline complet (Preprocessing + Modèle)
-try:
-    model = joblib.load('model.joblib')
+model_error = None
+model_loading = None
+# Vrai dans le maître gunicorn jusqu'au fork : pas de prédiction avant `after_fork`
+checks_deferred = MODEL_DEFER_CHECKS
+model_ready = threading.Event()
+
+# Voiture de référence pour préchauffer une nouvelle version avant de lui envoyer du trafic
+WARMUP_CAR = {
+    "model_key": "Citroën", "mileage": 140000, "engine_power": 100, "fuel": "diesel",
+    "paint_color": "black", "car_type": "estate", "private_parking_available": True,
+    "has_gps": True, "has_air_conditioning": True, "automatic_car": False,
+    "has_getaround_connect": True, "has_speed_regulator": True, "winter_tires": True
+}
+
+def load_version(path, version=None):
+    """
+    Charge une version du modèle : artefact léger (dossier, voir export_model.py) ou
+    pipeline complet (Preprocessing + Modèle) enregistré avec joblib.
+    """
+    if os.path.isdir(path):
+        compiled = CompiledPipeline.load(path)
+        if MODEL_THREADS > 0:
+            compiled.booster.set_param({"nthread": MODEL_THREADS})
+        print(f"✅ Artefact {compiled.version} chargé avec succès !")
+        return ModelVersion(version or compiled.version, compiled=compiled, source=path)
+
+    import joblib
+
+    pipeline = joblib.load(path)
+    if MODEL_THREADS > 0:
+        pipeline[-1].set_params(n_jobs=MODEL_THREADS)
     print("✅ Modèle chargé avec succès !")
-except Exception as e:
-    print(f"❌ Erreur lors du chargement du modèle : {e}")
-
-# --- DÉFINITION DU FORMAT DES DONNÉES D'ENTRÉE (Pydantic) ---
-# Cela permet de valider automatiquement les données envoyées par l'utilisateur
-class CarFeatures(BaseModel):
-    model_key: str = Field(..., description="Marque du véhicule (ex: Citroën, Renault, BMW)")
-    mileage: int = Field(..., gt=0, description="Kilométrage du véhicule")
-    engine_power: int = Field(..., gt=0, description="Puissance du moteur (en chevaux)")
-    fuel: str = Field(..., description="Type de carburant (diesel, petrol, hybrid, electric)")
-    paint_color: str = Field(..., description="Couleur de la voiture")
-    car_type: str = Field(..., description="Type de carrosserie (convertible, coupe, estate, hatchback, sedan, subcompact, su, van)")
-    private_parking_available: bool = Field(..., description="Disponibilité d'un parking privé")
-    has_gps: bool = Field(..., description="GPS intégré")
-    has_air_conditioning: bool = Field(..., description="Climatisation")
-    automatic_car: bool = Field(..., description="Boîte automatique")
-    has_getaround_connect: bool = Field(..., description="Boitier GetAround Connect installé")
-    has_speed_regulator: bool = Field(..., description="Régulateur de vitesse")
-    winter_tires: bool = Field(..., description="Pneus neige")
+
+    compiled = None
+    if INFERENCE_MODE == "compiled":
+        try:
+            compiled = CompiledPipeline.from_pipeline(pipeline)
+        except Exception as e:
+            print(f"⚠️ Mode compilé indisponible, utilisation du pipeline sklearn : {e}")
+    version = ModelVersion(version or os.path.splitext(os.path.basename(path))[0], pipeline=pipeline, compiled=compiled, source=path)
+    if not checks_deferred:
+        verify_compiled(version)
+    return version
+
+def verify_compiled(version):
+    """
+    Sécurité : on vérifie que le mode compilé donne les mêmes prix que le pipeline avant de basculer.
+    """
+    if version.pipeline is None or version.compiled is None:
+        return
+    try:
+        check_parity(version.pipeline, version.compiled, n=200)
+        print("✅ Mode d'inférence compilé activé")
+    except Exception as e:
+        version.compiled = None
+        print(f"⚠️ Mode compilé indisponible, utilisation du pipeline sklearn : {e}")
+
+def warmup_version(version, n=64):
+    """
+    Premières prédictions d'une nouvelle version, hors trafic : le premier appel au booster
+    (allocations, threads) ne pèse pas sur une vraie requête, et un modèle cassé n'est pas activé.
+    """
+    if checks_deferred:
+        return
+    records = [WARMUP_CAR] * n
+    if version.compiled is not None:
+        predictions = version.compiled.predict(records)
+    else:
+        import pandas as pd
+
+        predictions = version.pipeline.predict(pd.DataFrame.from_records(records))
+    if len(predictions) != n or not all(math.isfinite(float(p)) for p in predictions):
+        raise ValueError(f"Préchauffage de la version {version.version} : prédictions invalides")
+
+def after_fork():
+    """
+    Appelée par gunicorn dans chaque worker, après le fork : contrôles de parité et
+    préchauffage différés (MODEL_DEFER_CHECKS), avec les threads OpenMP du worker.
+    """
+    global checks_deferred
+    checks_deferred = False
+    routing = models.routing
+    if routing is None:
+        return
+    for version in (routing.primary, routing.candidate):
+        if version is None:
+            continue
+        verify_compiled(version)
+        try:
+            warmup_version(version)
+        except Exception as e:
+            print(f"⚠️ Préchauffage de la version {version.version} impossible : {e}")
+
+def on_model_change(previous, routing):
+    """
+    Nouvelle version active : l'API est prête et le cache des anciens prix est vidé.
+    """
+    global model_error
+    model_error = None
+    model_ready.set()
+    # Le cache suit la version réellement chargée (avec ou sans registre), pas le fichier sur disque
+    if cache is not None:
+        cache.set_model_version(f"{routing.primary.version}:{routing.primary.fingerprint}")
+
+models = ModelRegistry(MODEL_REGISTRY_DIR, load_version, warmup_version, MODEL_REGISTRY_POLL, on_change=on_model_change)
+
+def load_model():
+    """
+    Charge la version initiale (registre, artefact léger ou model.joblib), puis signale
+    que l'API est prête (/health/ready).
+    """
+    global model_error
+    try:
+        if MODEL_REGISTRY_DIR:
+            models.refresh()
+            if models.primary is None:
+                raise ValueError(models.last_error or f"Aucune version du modèle dans {MODEL_REGISTRY_DIR}")
+        else:
+            path = MODEL_ARTIFACT or MODEL_PATH
+            # Empreinte du fichier lu au chargement (clé du cache partagé entre workers et déploiements)
+            stat = os.stat(os.path.join(path, ARTIFACT_MANIFEST) if os.path.isdir(path) else path)
+            version = load_version(path)
+            version.fingerprint = (version.version, stat.st_mtime_ns, stat.st_size)
+            models.activate(version)
+    except Exception as e:
+        model_error = str(e)
+        print(f"❌ Erreur lors du chargement du modèle : {e}")
+
+# --- FORMAT DES REQUÊTES DE SENSIBILITÉ (Pydantic) ---
+class SensitivityAxis(BaseModel):
+    feature: str = Field(..., description="Variable à faire varier (ex: mileage, engine_power, has_gps, fuel)")
+    values: Optional[List[Union[bool, int, str]]] = Field(None, max_length=MAX_SENSITIVITY_POINTS, description="Valeurs à tester (par défaut false/true pour une option)")
+    start: Optional[int] = Field(None, description="Début de la plage (variables numériques)")
+    stop: Optional[int] = Field(None, description="Fin de la plage, incluse (variables numériques)")
+    num: int = Field(20, ge=2, le=MAX_SENSITIVITY_POINTS, description="Nombre de points entre start et stop")
+
+    def size(self):
+        """
+        Nombre de valeurs demandées sur l'axe, connu avant de les générer ou de les valider.
+        """
+        if self.values is not None:
+            return len(self.values)
+        if self.start is not None and self.stop is not None:
+            return self.num
+        return 2
+
+class SensitivityRequest(BaseModel):
+    car: CarFeatures = Field(..., description="Voiture de base")
+    axes: List[SensitivityAxis] = Field(..., min_length=1, max_length=3, description="Variables à faire varier (3 au plus)")
+
+# --- CACHE DES PRÉDICTIONS ---
+# Les mêmes configurations de voitures reviennent très souvent : on garde les prix déjà calculés
+cache = None
+if PREDICTION_CACHE_SIZE > 0:
+    backend = None
+    if PREDICTION_CACHE_REDIS_URL:
+        try:
+            backend = RedisBackend(PREDICTION_CACHE_REDIS_URL)
+        except Exception as e:
+            print(f"⚠️ Backend de cache partagé indisponible, cache local uniquement : {e}")
+    cache = PredictionCache(
+        list(CarFeatures.model_fields),
+        maxsize=PREDICTION_CACHE_SIZE,
+        ttl=PREDICTION_CACHE_TTL,
+        backend=backend
+    )
+
+if MODEL_LOADING == "eager":
+    load_model()
+
+# --- FONCTIONS UTILITAIRES ---
+
+# Pool de calcul borné : au-delà de INFERENCE_THREADS appels simultanés, les suivants attendent leur tour
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+# Scoring shadow dans un thread à part : il ne retarde jamais la réponse de la version principale
+shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+
+def require_model():
+    """
+    Refuse la requête (503) tant que le modèle n'est pas chargé.
+    """
+    if not model_ready.is_set():
+        detail = f"Modèle indisponible : {model_error}" if model_error else "Modèle en cours de chargement"
+        raise HTTPException(status_code=503, detail=detail)
+
+async def run_inference(fn, *args):
+    """
+    Exécute un appel au modèle dans le pool de calcul pour ne pas bloquer la boucle asyncio.
+    """
+    INFERENCE_PENDING.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(inference_pool, fn, *args)
+    finally:
+        INFERENCE_PENDING.dec()
+
+def run_model(version, records):
+    """
+    Appel au modèle d'une version donnée. Chaque étape est chronométrée séparément
+    (histogramme `predict_stage_duration_seconds`).
+    """
+    with profiler.maybe_profile():
+        if version.compiled is not None:
+            with STAGE_LATENCY.time(stage="encode"):
+                X = version.compiled.encode(records)
+            with STAGE_LATENCY.time(stage="model"):
+                predictions = version.compiled.predict_matrix(X)
+        else:
+            # Import différé : inutile (et coûteux au démarrage) avec l'artefact léger
+            import pandas as pd
+
+            with STAGE_LATENCY.time(stage="dataframe"):
+                input_data = pd.DataFrame.from_records(records)
+            # Équivalent à model.predict, en séparant le preprocessing du booster
+            with STAGE_LATENCY.time(stage="preprocessing"):
+                X = version.pipeline[:-1].transform(input_data)
+            with STAGE_LATENCY.time(stage="model"):
+                predictions = version.pipeline[-1].predict(X)
+    return predictions
+
+def run_grid(version, base, axes):
+    """
+    Appel au modèle sur toutes les variantes d'une voiture (voir `CompiledPipeline.encode_grid`).
+    Sans version compilée, les variantes passent par le pipeline sous forme de DataFrame.
+    """
+    if version.compiled is None:
+        features = [feature for feature, _ in axes]
+        records = [{**base, **dict(zip(features, combo))} for combo in itertools.product(*[values for _, values in axes])]
+        return run_model(version, records)
+    with profiler.maybe_profile(name="sensitivity"):
+        with STAGE_LATENCY.time(stage="encode"):
+            X = version.compiled.encode_grid(base, axes)
+        with STAGE_LATENCY.time(stage="model"):
+            return version.compiled.predict_matrix(X)
+
+def call_model(version, run, *args):
+    """
+    Appel au modèle chronométré et compté dans les statistiques de la version.
+    """
+    start = time.perf_counter()
+    try:
+        predictions = run(version, *args)
+    except Exception:
+        version.observe_error()
+        raise
+    elapsed = time.perf_counter() - start
+    predictions = [round(float(p), 2) for p in predictions]
+    version.observe(elapsed, predictions)
+    MODEL_LATENCY.observe(elapsed, version=version.version)
+    PREDICTED_ROWS.inc(len(predictions))
+    return predictions
+
+def score_records(records, version=None):
+    """
+    Prédit les prix d'une liste de voitures (dictionnaires) en un seul appel au pipeline,
+    avec la version principale ou la version indiquée.
+    """
+    return call_model(version or models.primary, run_model, records)
+
+def score_grid(base, axes, version=None):
+    """
+    Prédit les prix de toutes les variantes d'une voiture en un seul appel au booster.
+    """
+    return call_model(version or models.primary, run_grid, base, axes)
+
+def sensitivity_values(axis, base):
+    """
+    Valeurs validées d'un axe de /predict/sensitivity (mêmes règles que `CarFeatures`).
+    """
+    field = CarFeatures.model_fields.get(axis.feature)
+    if field is None:
+        raise HTTPException(status_code=422, detail=f"Variable inconnue : {axis.feature}")
+
+    if axis.values is not None:
+        values = axis.values
+    elif axis.start is not None and axis.stop is not None:
+        if field.annotation is not int:
+            raise HTTPException(status_code=422, detail=f"Plage start/stop réservée aux variables numériques ({axis.feature})")
+        values = [round(axis.start + (axis.stop - axis.start) * i / (axis.num - 1)) for i in range(axis.num)]
+    elif field.annotation is bool:
+        values = [False, True]
+    else:
+        raise HTTPException(status_code=422, detail=f"Indiquez `values` (ou `start`/`stop`) pour la variable {axis.feature}")
+
+    # Erreurs au format de pydantic, situées par ["axes", variable, position de la valeur]
+    validated, errors = [], []
+    for i, value in enumerate(values):
+        loc = ["axes", axis.feature, i]
+        # isinstance(True, int) : sans ce contrôle, true/false passeraient pour 1/0 sur une variable numérique
+        if field.annotation is not bool and isinstance(value, bool):
+            errors.append({"type": f"{field.annotation.__name__}_type", "loc": loc,
+                           "msg": f"Booléen refusé pour la variable {axis.feature}", "input": value})
+            continue
+        try:
+            validated.append(CarFeatures.model_validate({**base, axis.feature: value}).model_dump()[axis.feature])
+        except ValidationError as e:
+            errors.extend({**error, "loc": loc} for error in e.errors(include_url=False, include_context=False))
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    # Une plage plus fine que l'unité (ou des valeurs répétées) donne des doublons après arrondi :
+    # on ne garde que la première occurrence, dans l'ordre
+    return list(dict.fromkeys(validated))
+
+def score_shadow(version, records, reference):
+    """
+    Score les mêmes voitures avec la version shadow et compare ses prix à ceux renvoyés.
+    """
+    try:
+        version.observe_shadow(score_records(records, version), reference)
+    except Exception:
+        pass  # Déjà compté dans les erreurs de la version, sans effet sur les réponses
+    finally:
+        shadow_slots.release()
+
+def score_and_cache(records):
+    """
+    Prédit les prix avec la version principale puis les enregistre dans le cache.
+    En mode shadow, la version candidate score aussi ces voitures en arrière-plan.
+    """
+    version = models.primary
+    predictions = score_records(records, version)
+    # Pas d'anciens prix dans le cache si une nouvelle version a été activée pendant le calcul
+    if cache is not None and models.primary is version:
+        cache.set_many(records, predictions)
+    shadow = models.shadow()
+    if shadow is not None and shadow_slots.acquire(blocking=False):
+        shadow_pool.submit(score_shadow, shadow, records, predictions)
+    return predictions
+
+def predict_records(records, version=None):
+    """
+    Prédit les prix d'une liste de voitures : seules les voitures absentes du cache passent par le modèle.
+    La version candidate (mode "split") est toujours interrogée directement, hors cache.
+    """
+    if version is not None and version is not models.primary:
+        return score_records(records, version)
+    if cache is None:
+        return score_and_cache(records)
+
+    predictions = cache.get_many(records)
+    missing = [i for i, prediction in enumerate(predictions) if prediction is None]
+    if missing:
+        scored = score_and_cache([records[i] for i in missing])
+        for i, prediction in zip(missing, scored):
+            predictions[i] = prediction
+    return predictions
+
+async def read_car_list(request: Request):
+    """
+    Corps JSON de /predict/batch : le nombre de voitures est vérifié (413) avant la validation
+    pydantic, pour qu'un batch trop gros ne coûte pas la validation de chaque voiture.
+    Les erreurs ont le même format (422) que la validation automatique de FastAPI.
+    """
+    try:
+        body = json.loads(await request.body())
+    except ValueError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body", 0), "msg": "JSON decode error", "input": {}, "ctx": {"error": str(e)}}])
+    if not isinstance(body, list):
+        raise RequestValidationError([{"type": "list_type", "loc": ("body",), "msg": "Input should be a valid list", "input": body}])
+    if len(body) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Trop de voitures dans le batch ({len(body)} > {MAX_BATCH_SIZE}). Utilisez /predict/batch/stream."
+        )
+    try:
+        return CAR_LIST.validate_python(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)])
+
+def observe_validation(request: Request):
+    """
+    Étape "validation" : temps écoulé depuis l'arrivée de la requête (lecture du corps + pydantic).
+    """
+    started_at = getattr(request.state, "started_at", None)
+    if started_at is not None:
+        STAGE_LATENCY.observe(time.perf_counter() - started_at, stage="validation")
+
+def iter_chunks(items, size):
+    """
+    Découpe une liste en morceaux de taille `size` (le dernier peut être plus petit).
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+async def iter_body_lines(request: Request, keep_ends=False):
+    """
+    Lit le corps de la requête au fil de l'eau et renvoie les lignes non vides une par une.
+    Avec `keep_ends`, toutes les lignes sont renvoyées, avec leur fin de ligne (lecture CSV).
+    """
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if keep_ends:
+                yield line.decode("utf-8", errors="replace") + "\n"
+            elif line.strip():
+                yield line.decode("utf-8", errors="replace")
+    if buffer.strip():
+        yield buffer.decode("utf-8", errors="replace")
+
+async def iter_csv_rows(request: Request):
+    """
+    Lignes CSV du corps, lues au fil de l'eau par un seul `csv.reader` : un champ entre
+    guillemets peut contenir des retours à la ligne.
+
+    Les lignes de texte sont mises en attente jusqu'à ce que le nombre de guillemets soit pair
+    (fin d'enregistrement, un guillemet échappé "" compte double) : le lecteur ne manque donc
+    jamais de texte au milieu d'un enregistrement.
+    """
+    pending = collections.deque()
+
+    def pending_lines():
+        while pending:
+            yield pending.popleft()
+
+    reader = csv.reader(pending_lines())
+    quotes = 0
+    async for line in iter_body_lines(request, keep_ends=True):
+        pending.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            quotes = 0
+            row = next(reader, None)
+            if row and any(field.strip() for field in row):
+                yield row
+    # Fin du corps : enregistrement éventuellement mal fermé
+    for row in reader:
+        if row and any(field.strip() for field in row):
+            yield row
+
+async def iter_body_records(request: Request):
+    """
+    Découpe un corps NDJSON (une voiture JSON par ligne) ou CSV (avec en-tête) en enregistrements.
+    Les lignes NDJSON sont renvoyées brutes (str) et les lignes CSV sous forme de dictionnaires.
+    """
+    if "csv" not in request.headers.get("content-type", ""):
+        async for line in iter_body_lines(request):
+            yield line
+        return
+    header = None
+    async for row in iter_csv_rows(request):
+        if header is None:
+            header = row
+        else:
+            yield dict(zip(header, row))
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse qui peut lire le corps de la requête pendant l'envoi de la réponse.
+
+    Par défaut, Starlette écoute la déconnexion du client en parallèle du flux et consomme
+    ainsi les messages du corps. Ici, c'est `request.stream()` qui détecte la déconnexion.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        # Comme StreamingResponse : les tâches d'arrière-plan tournent une fois le corps envoyé
+        if self.background is not None:
+            await self.background()
 
 # --- ROUTES ---
 
@@ -61,21 +636,240 @@ async def index():
     """
     return {"message": "Hello ! Bienvenue sur l'API de prédiction de prix GetAround 🚗. Allez sur /docs pour tester !"}
 
+@app.get("/health/live", tags=["Monitoring"])
+async def health_live():
+    """
+    Liveness : le processus répond (même si le modèle est encore en cours de chargement).
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Monitoring"])
+async def health_ready():
+    """
+    Readiness : le modèle est chargé et l'API peut recevoir du trafic (503 sinon).
+    """
+    if not model_ready.is_set():
+        status = "error" if model_error else "loading"
+        raise HTTPException(status_code=503, detail={"status": status, "error": model_error})
+    primary = models.primary
+    return {
+        "status": "ready",
+        "source": primary.source,
+        "inference_mode": "compiled" if primary.compiled is not None else "pipeline",
+        "model_version": primary.version,
+    }
+
 @app.post("/predict", tags=["Machine Learning"])
-async def predict(car: CarFeatures):
+async def predict(car: CarFeatures, request: Request):
     """
     Prédiction du prix de location journalier.
     """
+    observe_validation(request)
+    require_model()
+    record = car.model_dump()
+
+    # Part du trafic envoyée à la version candidate (mode "split") : hors cache et hors micro-batching
+    version = models.choose()
+    if version is not models.primary:
+        predictions = await run_inference(score_records, [record], version)
+        return {"prediction": predictions[0]}
+
+    # Voiture déjà vue : réponse directe depuis le cache
+    if cache is not None:
+        cached = cache.get_many([record])[0]
+        if cached is not None:
+            return {"prediction": cached}
+
+    # Micro-batching activé : la voiture est scorée avec les autres requêtes concurrentes
+    if batcher is not None:
+        try:
+            return {"prediction": await batcher.submit(record)}
+        except QueueFullError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
     # 1. Conversion des données reçues en DataFrame pandas
-    input_data = pd.DataFrame([car.model_dump()])
-    
-    # 2. Prédiction via le Pipeline (qui gère le OneHotEncoding et le Scaling tout seul)
-    prediction = model.predict(input_data)
+    # 2. Prédiction via le Pipeline (qui gère le OneHotEncoding et le Scaling tout seul),
+    #    dans le pool de calcul pour ne pas bloquer la boucle asyncio
+    predictions = await run_inference(score_and_cache, [record])
     
     # 3. Renvoyer la réponse au format JSON
     return {
-        "prediction": round(float(prediction[0]), 2)
+        "prediction": predictions[0]
+    }
+
+@app.post(
+    "/predict/batch", tags=["Machine Learning"],
+    # Corps lu par read_car_list (taille vérifiée avant la validation) : schéma indiqué pour /docs
+    openapi_extra={"requestBody": {"required": True, "content": {"application/json": {
+        "schema": {"type": "array", "items": CarFeatures.model_json_schema()}
+    }}}}
+)
+async def predict_batch(request: Request):
+    """
+    Prédiction du prix de location journalier pour une liste de voitures.
+
+    Les voitures sont traitées par paquets de `BATCH_CHUNK_SIZE` lignes et les prix
+    sont renvoyés dans le même ordre que la liste reçue.
+    """
+    require_model()
+    cars = await read_car_list(request)
+    observe_validation(request)
+
+    # Tout le batch est scoré par la même version du modèle
+    version = models.choose()
+    predictions = []
+    for chunk in iter_chunks([car.model_dump() for car in cars], BATCH_CHUNK_SIZE):
+        # Le pipeline tourne dans le pool de calcul pour ne pas bloquer la boucle asyncio
+        predictions.extend(await run_inference(predict_records, chunk, version))
+
+    return {"predictions": predictions}
+
+@app.post("/predict/sensitivity", tags=["Machine Learning"])
+async def predict_sensitivity(query: SensitivityRequest, request: Request):
+    """
+    Sensibilité du prix : fait varier une à trois variables d'une voiture de base.
+
+    Chaque axe donne ses `values`, une plage `start`/`stop`/`num` (kilométrage, puissance)
+    ou, pour une option (has_gps, automatic_car...), false et true par défaut. Toutes les
+    combinaisons sont encodées dans une seule matrice et scorées en un seul appel au modèle.
+    `predictions` est une liste à plat de forme `shape` : le dernier axe varie le plus vite.
+    """
+    require_model()
+    # Taille de la grille vérifiée avant de générer ou de valider la moindre valeur
+    requested = math.prod(axis.size() for axis in query.axes)
+    if requested > MAX_SENSITIVITY_POINTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Trop de variantes ({requested} > {MAX_SENSITIVITY_POINTS}). Réduisez le nombre de valeurs par axe."
+        )
+    base = query.car.model_dump()
+    axes = [(axis.feature, sensitivity_values(axis, base)) for axis in query.axes]
+    observe_validation(request)
+    # Les doublons retirés ne peuvent que réduire la grille
+    shape = [len(values) for _, values in axes]
+
+    predictions = await run_inference(score_grid, base, axes, models.choose())
+    return {
+        "axes": [{"feature": feature, "values": values} for feature, values in axes],
+        "shape": shape,
+        "predictions": predictions,
     }
 
+@app.post("/predict/batch/stream", tags=["Machine Learning"])
+async def predict_batch_stream(request: Request):
+    """
+    Prédiction en flux pour les très gros volumes (flotte complète).
+
+    Le corps est lu au fil de l'eau, au format NDJSON (`application/x-ndjson`, une voiture
+    par ligne) ou CSV (`text/csv`, avec une ligne d'en-tête). Les résultats sont renvoyés
+    en NDJSON, dans l'ordre d'entrée, un paquet de `BATCH_CHUNK_SIZE` lignes à la fois.
+    Une ligne invalide produit un objet `{"index": ..., "error": ...}` à sa position.
+    """
+    require_model()
+    version = models.choose()
+
+    async def score_stream():
+        index = 0
+        chunk = []
+
+        async def flush(chunk, validation_seconds):
+            # Étape "validation" : analyse et validation pydantic des lignes du paquet (le corps
+            # est lu au fil de l'eau, son temps de réception n'est pas compté)
+            STAGE_LATENCY.observe(validation_seconds, stage="validation")
+            # Seules les lignes valides passent par le pipeline, les erreurs gardent leur place
+            valid = [record["car"] for record in chunk if "error" not in record]
+            predictions = iter(await run_inference(predict_records, valid, version)) if valid else iter([])
+            lines = []
+            for record in chunk:
+                if "error" in record:
+                    lines.append(json.dumps({"index": record["index"], "error": record["error"]}))
+                else:
+                    lines.append(json.dumps({"index": record["index"], "prediction": next(predictions)}))
+            return "\n".join(lines) + "\n"
+
+        validation_seconds = 0.0
+
+        async for raw in iter_body_records(request):
+            started = time.perf_counter()
+            try:
+                if isinstance(raw, str):
+                    car = CarFeatures.model_validate_json(raw)
+                else:
+                    car = CarFeatures.model_validate(raw)
+                chunk.append({"index": index, "car": car.model_dump()})
+            except ValidationError as e:
+                chunk.append({"index": index, "error": e.errors(include_url=False, include_context=False)})
+            validation_seconds += time.perf_counter() - started
+            index += 1
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                yield await flush(chunk, validation_seconds)
+                chunk = []
+                validation_seconds = 0.0
+
+        if chunk:
+            yield await flush(chunk, validation_seconds)
+
+    return DuplexStreamingResponse(score_stream(), media_type="application/x-ndjson")
+
+@app.get("/batching/stats", tags=["Monitoring"])
+async def batching_stats():
+    """
+    Réglages et métriques du micro-batching (profondeur de file, taille des paquets, temps d'attente).
+    """
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+@app.get("/cache/stats", tags=["Monitoring"])
+async def cache_stats():
+    """
+    Compteurs du cache des prédictions (hits, misses, évictions, invalidations).
+    """
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/models", tags=["Monitoring"])
+async def models_stats():
+    """
+    Versions actives du modèle, routage (principale, candidate, mode, part du trafic) et
+    statistiques par version (appels, latence moyenne, prix moyen, écart en mode shadow).
+    """
+    return {"registry": bool(MODEL_REGISTRY_DIR), **models.stats()}
+
+@app.post("/models/refresh", tags=["Monitoring"])
+async def models_refresh():
+    """
+    Relit immédiatement le dossier du registre (sans attendre `MODEL_REGISTRY_POLL` secondes).
+    """
+    if not MODEL_REGISTRY_DIR:
+        raise HTTPException(status_code=404, detail="Registre des modèles désactivé (MODEL_REGISTRY_DIR)")
+    changed = await run_inference(models.refresh)
+    return {"changed": changed, **models.stats()}
+
+@app.get("/metrics", tags=["Monitoring"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Métriques au format texte Prometheus (requêtes, latences par étape, file d'attente, cache).
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/profiling", tags=["Monitoring"])
+async def profiling_stats(limit: int = 20):
+    """
+    État du profilage échantillonné et fonctions les plus coûteuses sur les profils collectés.
+    """
+    return {**profiler.stats(), "top": profiler.top(limit)}
+
+@app.post("/profiling", tags=["Monitoring"])
+async def set_profiling(rate: float = Query(..., ge=0, le=1), reset: bool = False):
+    """
+    Active (ou coupe avec `rate=0`) le profilage d'une fraction des appels au modèle, sans redémarrage.
+    """
+    if reset:
+        profiler.reset()
+    profiler.rate = rate
+    return profiler.stats()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=4000)
\ No newline at end of file
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """
+    Levée quand la file d'attente du micro-batching est pleine (contre-pression).
+    """
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes /predict unitaires concurrentes en un seul appel au pipeline.
+
+    Chaque requête est mise en file d'attente. Un worker asyncio attend au plus
+    `max_wait_ms` millisecondes (ou `max_batch_size` lignes) après la première requête,
+    puis envoie tout le paquet à `predict_fn` dans un thread dédié. Chaque appelant
+    récupère ensuite sa propre prédiction via un Future.
+
+    Réglages :
+    * `max_batch_size` : plus grand = meilleur débit, mais latence plus élevée par paquet.
+    * `max_wait_ms` : temps d'attente maximum ajouté à la latence (p99) d'une requête.
+    * `max_queue_size` : au-delà, les nouvelles requêtes sont refusées (0 = illimité).
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0, max_queue_size=0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+
+        self._queue = None
+        self._worker = None
+        # Un seul thread : les paquets sont scorés l'un après l'autre, le booster gère son propre parallélisme
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+
+        # Compteurs exposés par stats()
+        self.requests_total = 0
+        self.rejected_total = 0
+        # Paquets et lignes traités, en échec compris (comptés aussi dans failed_*)
+        self.batches_total = 0
+        self.rows_total = 0
+        self.failed_batches_total = 0
+        self.failed_rows_total = 0
+        self.max_batch_seen = 0
+        self.max_queue_depth_seen = 0
+        self.wait_seconds_total = 0.0
+        self.predict_seconds_total = 0.0
+
+    async def start(self):
+        """
+        Démarre le worker (à appeler au démarrage de l'application, dans la boucle asyncio).
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Arrête le worker et le thread de calcul.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, record):
+        """
+        Ajoute une voiture (dictionnaire) à la file et attend sa prédiction.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((record, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected_total += 1
+            raise QueueFullError(f"File de micro-batching pleine ({self.max_queue_size} requêtes en attente)")
+
+        self.requests_total += 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self._queue.qsize())
+        return await future
+
+    async def _collect(self):
+        """
+        Attend la première requête puis complète le paquet jusqu'à `max_batch_size`
+        lignes ou jusqu'à l'expiration du délai `max_wait_ms`.
+        """
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            # On vide d'abord ce qui est déjà en file, sans attendre
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            records = [record for record, _, _ in batch]
+
+            start = time.perf_counter()
+            self.wait_seconds_total += sum(start - enqueued_at for _, _, enqueued_at in batch)
+            self.batches_total += 1
+            self.rows_total += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            try:
+                predictions = await loop.run_in_executor(self._executor, self.predict_fn, records)
+            except Exception as e:
+                # Paquet en échec : la charge reste comptée, et l'erreur à part
+                self.failed_batches_total += 1
+                self.failed_rows_total += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.predict_seconds_total += time.perf_counter() - start
+
+            for (_, future, _), prediction in zip(batch, predictions):
+                # Le client a pu abandonner la requête entre-temps
+                if not future.done():
+                    future.set_result(prediction)
+
+    def stats(self):
+        """
+        Réglages et métriques courantes (profondeur de file, taille moyenne des paquets, temps).
+        """
+        batches = max(self.batches_total, 1)
+        rows = max(self.rows_total, 1)
+        return {
+            "config": {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "max_queue_size": self.max_queue_size,
+            },
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "requests_total": self.requests_total,
+            "rejected_total": self.rejected_total,
+            "batches_total": self.batches_total,
+            "rows_total": self.rows_total,
+            "failed_batches_total": self.failed_batches_total,
+            "failed_rows_total": self.failed_rows_total,
+            "avg_batch_size": round(self.rows_total / batches, 2),
+            "max_batch_size_seen": self.max_batch_seen,
+            "avg_queue_wait_ms": round(1000 * self.wait_seconds_total / rows, 3),
+            "avg_batch_predict_ms": round(1000 * self.predict_seconds_total / batches, 3),
+        }
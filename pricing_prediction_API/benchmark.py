@@ -0,0 +1,317 @@
+"""
+Benchmark local de l'API de prédiction (latence, débit, batch, démarrage à froid).
+
+Usage :
+    python benchmark.py                                # app en mémoire (ASGI, sans réseau)
+    python benchmark.py --url http://localhost:4000    # API déjà lancée (uvicorn app:app --port 4000)
+    python benchmark.py --baseline ancien.json         # compare avec un précédent résultat
+
+Les voitures envoyées sont tirées au hasard parmi les catégories connues du modèle
+(graine fixe, donc reproductible). Le cache des prédictions est désactivé par défaut
+en mode mémoire pour mesurer le vrai chemin d'inférence (option --cache pour le garder).
+Les résultats sont écrits en JSON (--output) avec les versions du code et du modèle.
+Le démarrage à froid compare model.joblib et l'artefact léger (--artifact, voir export_model.py).
+
+Nécessite httpx (pip install httpx).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+import joblib
+import numpy as np
+
+from fast_inference import CompiledPipeline, random_records
+
+MODEL_PATH = os.getenv("MODEL_PATH", "model.joblib")
+
+
+# --- DONNÉES DE TEST ---
+
+def make_payloads(n, seed=0):
+    """
+    Voitures aléatoires réalistes (catégories connues du modèle), au format JSON de `CarFeatures`.
+    """
+    compiled = CompiledPipeline.from_pipeline(joblib.load(MODEL_PATH))
+    return random_records(dict(zip(compiled.categorical_features, compiled.categories)), n, seed=seed)
+
+
+def summarize(latencies):
+    """
+    Percentiles de latence (en millisecondes).
+    """
+    ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+# --- MESURES ---
+
+def bench_cold_start(runs=3, artifact=None):
+    """
+    Démarrage à froid, dans un nouveau processus : import de l'app jusqu'au modèle prêt,
+    avec model.joblib puis (si indiqué) avec l'artefact léger de export_model.py.
+    """
+    code = (
+        "import sys, time; t = time.perf_counter(); import app; t1 = time.perf_counter(); "
+        "assert app.model_ready.is_set(), app.model_error; "
+        "print(t1 - t, int('pandas' in sys.modules), int('sklearn' in sys.modules))"
+    )
+    sources = {"pipeline": None}
+    if artifact:
+        sources["artifact"] = artifact
+
+    results = {"runs": runs}
+    for name, path in sources.items():
+        env = {k: v for k, v in os.environ.items() if k != "MODEL_ARTIFACT"}
+        env["MODEL_LOADING"] = "eager"
+        if path:
+            env["MODEL_ARTIFACT"] = path
+        ready, totals = [], []
+        for _ in range(runs):
+            t = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env).stdout
+            totals.append(time.perf_counter() - t)
+            fields = out.strip().splitlines()[-1].split()
+            ready.append(float(fields[0]))
+        results[name] = {
+            "ready_s": round(statistics.median(ready), 4),
+            "process_total_s": round(statistics.median(totals), 4),
+            "pandas_imported": fields[1] == "1",
+            "sklearn_imported": fields[2] == "1",
+        }
+        # L'artefact doit être servi sans pandas ni scikit-learn : sinon le gain mesuré n'a pas de sens
+        if path and (results[name]["pandas_imported"] or results[name]["sklearn_imported"]):
+            raise RuntimeError(f"Démarrage avec l'artefact : pandas ou scikit-learn importé ({results[name]})")
+    if "artifact" in results:
+        results["speedup"] = round(results["pipeline"]["ready_s"] / results["artifact"]["ready_s"], 2)
+    return results
+
+
+async def wait_ready(client, timeout=120):
+    """
+    Attend que l'API ait fini de charger le modèle (/health/ready).
+    """
+    deadline = time.perf_counter() + timeout
+    while (await client.get("/health/ready")).status_code != 200:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Le modèle n'est pas chargé")
+        await asyncio.sleep(0.05)
+
+
+async def bench_latency(client, payloads, warmup=20):
+    """
+    Latence d'une requête /predict isolée (requêtes envoyées une par une).
+    """
+    for car in payloads[:warmup]:
+        (await client.post("/predict", json=car)).raise_for_status()
+    latencies = []
+    for car in payloads:
+        t = time.perf_counter()
+        (await client.post("/predict", json=car)).raise_for_status()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies)
+
+
+async def bench_concurrency(client, payloads, concurrency):
+    """
+    Débit de /predict avec `concurrency` clients simultanés se partageant les mêmes voitures.
+    """
+    queue = iter(payloads)
+    latencies = []
+
+    async def worker():
+        for car in queue:
+            t = time.perf_counter()
+            (await client.post("/predict", json=car)).raise_for_status()
+            latencies.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t
+    return {
+        "concurrency": concurrency,
+        "requests_per_s": round(len(payloads) / elapsed, 1),
+        **summarize(latencies),
+    }
+
+
+async def bench_batch(client, payloads, size, repeats=3):
+    """
+    Débit de /predict/batch (lignes par seconde) pour des paquets de `size` voitures.
+    """
+    batch = payloads[:size]
+    timings = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        response = await client.post("/predict/batch", json=batch)
+        response.raise_for_status()
+        timings.append(time.perf_counter() - t)
+    best = min(timings)
+    return {
+        "batch_size": len(batch),
+        "best_s": round(best, 4),
+        "median_s": round(statistics.median(timings), 4),
+        "rows_per_s": round(len(batch) / best, 1),
+    }
+
+
+# --- MÉTADONNÉES ---
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def environment_info(url):
+    """
+    Versions du code, du modèle et des bibliothèques, pour comparer les résultats entre deux runs.
+    """
+    import fastapi
+    import pandas
+    import sklearn
+    import xgboost
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": url or "in-process",
+        "git_commit": commit or None,
+        "model_sha256": file_sha256(MODEL_PATH)[:16],
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {
+            "fastapi": fastapi.__version__,
+            "numpy": np.__version__,
+            "pandas": pandas.__version__,
+            "scikit-learn": sklearn.__version__,
+            "xgboost": xgboost.__version__,
+        },
+        "config": {key: os.getenv(key) for key in (
+            "INFERENCE_MODE", "MODEL_ARTIFACT", "MICRO_BATCHING", "PREDICTION_CACHE_SIZE", "BATCH_CHUNK_SIZE"
+        )},
+    }
+
+
+def compare(results, baseline_path):
+    """
+    Affiche l'évolution des principaux indicateurs par rapport à un précédent fichier de résultats.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def metrics(res):
+        values = {}
+        for name in ("pipeline", "artifact"):
+            if name in res.get("cold_start", {}):
+                values[f"cold_start.{name}.ready_s"] = res["cold_start"][name]["ready_s"]
+        if "latency" in res:
+            values["latency.p50_ms"] = res["latency"]["p50_ms"]
+            values["latency.p99_ms"] = res["latency"]["p99_ms"]
+        for row in res.get("concurrency", []):
+            values[f"concurrency[{row['concurrency']}].requests_per_s"] = row["requests_per_s"]
+        for row in res.get("batch", []):
+            values[f"batch[{row['batch_size']}].rows_per_s"] = row["rows_per_s"]
+        return values
+
+    old, new = metrics(baseline), metrics(results)
+    print(f"\nComparaison avec {baseline_path} :")
+    for name, value in new.items():
+        if name in old and old[name]:
+            print(f"  {name:<40} {old[name]:>12} -> {value:>12}  ({(value - old[name]) / old[name] * 100:+.1f} %)")
+
+
+# --- EXÉCUTION ---
+
+async def run_http(args, payloads):
+    results = {}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        lifespan = None
+    else:
+        import app as app_module
+
+        lifespan = app_module.app.router.lifespan_context(app_module.app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://bench", timeout=120)
+
+    try:
+        async with client:
+            await wait_ready(client)
+            print(f"Latence /predict ({args.requests} requêtes)...")
+            results["latency"] = await bench_latency(client, payloads[:args.requests])
+            results["concurrency"] = []
+            for level in args.concurrency:
+                print(f"Débit /predict, {level} clients simultanés...")
+                results["concurrency"].append(await bench_concurrency(client, payloads[:args.requests], level))
+            results["batch"] = []
+            for size in args.batch_sizes:
+                print(f"Débit /predict/batch, paquets de {size} voitures...")
+                results["batch"].append(await bench_batch(client, payloads, size))
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'API de prédiction GetAround")
+    parser.add_argument("--url", help="URL d'une API déjà lancée (par défaut : app en mémoire)")
+    parser.add_argument("--requests", type=int, default=500, help="Nombre de requêtes /predict par mesure")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Niveaux de concurrence")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Tailles de batch")
+    parser.add_argument("--cold-start-runs", type=int, default=3, help="Nombre de démarrages à froid (0 pour ignorer)")
+    parser.add_argument("--artifact", default="model_artifact", help="Artefact léger à comparer au démarrage (export_model.py)")
+    parser.add_argument("--cache", action="store_true", help="Garde le cache des prédictions (mode mémoire)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Fichier de résultats précédent à comparer")
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")
+
+    results = {"environment": environment_info(args.url)}
+    if args.cold_start_runs and not args.url:
+        print("Démarrage à froid...")
+        artifact = args.artifact if os.path.isdir(args.artifact) else None
+        if artifact is None:
+            print(f"(pas d'artefact dans {args.artifact}/ : lancer export_model.py pour comparer)")
+        results["cold_start"] = bench_cold_start(args.cold_start_runs, artifact)
+
+    payloads = make_payloads(max(args.requests, *args.batch_sizes), seed=args.seed)
+    results.update(asyncio.run(run_http(args, payloads)))
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(json.dumps({k: v for k, v in results.items() if k != "environment"}, indent=2, ensure_ascii=False))
+    print(f"✅ Résultats enregistrés dans {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Scoring hors ligne d'un catalogue complet de voitures (CSV, Parquet ou Arrow/Feather).
+
+Usage :
+    python bulk_score.py catalogue.parquet predictions/
+    python bulk_score.py catalogue.csv predictions/ --workers 8 --chunk-size 100000 --keep car_id
+    python bulk_score.py catalogue.parquet predictions/ --artifact model_artifact   # artefact léger
+
+Le fichier est lu par morceaux (Parquet et Arrow en memory-map), chaque morceau est validé
+par le même modèle pydantic que l'API (`CarFeatures`, mêmes conversions) puis scoré dans un pool de processus qui chargent le modèle
+une seule fois. Les résultats sont écrits dans l'ordre, un fichier Parquet par morceau
+(`part-000000.parquet`, ...), lisible d'un bloc avec `pd.read_parquet("predictions/")`.
+Colonnes : `row_id` (numéro de ligne dans l'entrée), `prediction` (vide si la ligne est
+invalide), `error` (champ invalide) et les colonnes demandées avec `--keep`.
+
+Seuls `2 x workers` morceaux sont en mémoire à la fois. Si le scoring est interrompu,
+relancer la même commande reprend après le dernier morceau écrit. Chaque morceau garde ses
+statistiques dans ses métadonnées Parquet : `_SUCCESS` compte les lignes (et les lignes
+invalides) de tous les morceaux, y compris ceux des runs précédents.
+
+Nécessite pyarrow (pip install pyarrow).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from pydantic import ValidationError
+
+from schemas import CAR_LIST, CarFeatures
+
+MANIFEST = "_manifest.json"
+SUCCESS = "_SUCCESS"
+# Clé des statistiques d'un morceau dans les métadonnées de son fichier Parquet
+PART_STATS_KEY = b"bulk_score"
+
+
+
+# --- LECTURE PAR MORCEAUX ---
+
+def iter_chunks(path, chunk_size, columns=None):
+    """
+    Morceaux successifs du fichier d'entrée (DataFrames de `chunk_size` lignes au plus).
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".csv":
+        # Variables de la voiture lues comme du texte brut, comme les lignes CSV de l'API
+        # (/predict/batch/stream) : pydantic fait les mêmes conversions ("" reste une chaîne)
+        text = {name: str for name in CarFeatures.model_fields}
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=columns, dtype=text, keep_default_na=False)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if suffix == ".parquet":
+        parquet = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        # Arrow IPC / Feather : lu en memory-map, batch par batch. Les batches sont regroupés
+        # (sans copie) jusqu'à `chunk_size` lignes : seules les lignes du morceau sont copiées
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            buffered, rows = [], 0
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns:
+                    batch = batch.select(columns)
+                buffered.append(batch)
+                rows += batch.num_rows
+                while rows >= chunk_size:
+                    table = pa.Table.from_batches(buffered)
+                    yield table.slice(0, chunk_size).to_pandas()
+                    rest = table.slice(chunk_size)
+                    buffered, rows = rest.to_batches(), rest.num_rows
+            if rows:
+                yield pa.Table.from_batches(buffered).to_pandas()
+
+
+def count_rows(path):
+    """
+    Nombre de lignes quand il est connu sans tout lire (Parquet, Arrow), sinon None.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".csv":
+        return None
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if suffix == ".parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+# --- VALIDATION (modèle pydantic de l'API) ---
+
+def validate(df):
+    """
+    Valide les lignes avec `CarFeatures` (un seul appel pydantic par morceau) et renvoie
+    (voitures valides converties, masque des lignes valides, nom du premier champ invalide par ligne).
+    """
+    records = df[list(CarFeatures.model_fields)].to_dict("records")
+    error = pd.Series(None, index=df.index, dtype=object)
+    try:
+        cars = CAR_LIST.validate_python(records)
+    except ValidationError as e:
+        # loc = (position dans le morceau, champ) ; les erreurs d'une ligne suivent l'ordre du schéma
+        first = {}
+        for item in e.errors(include_url=False):
+            first.setdefault(item["loc"][0], item["loc"][1] if len(item["loc"]) > 1 else "__root__")
+        error.iloc[list(first)] = list(first.values())
+        cars = CAR_LIST.validate_python([record for i, record in enumerate(records) if i not in first])
+    valid = error.isna().to_numpy()
+    return pd.DataFrame(CAR_LIST.dump_python(cars), columns=list(CarFeatures.model_fields)), valid, error
+
+
+# --- SCORING (processus du pool) ---
+
+_model = None
+_compiled = None
+
+
+def init_worker(model_path, artifact):
+    """
+    Chargement du modèle une seule fois par processus.
+    """
+    global _model, _compiled
+    if artifact:
+        from fast_inference import CompiledPipeline
+
+        _compiled = CompiledPipeline.load(artifact)
+    else:
+        import joblib
+
+        _model = joblib.load(model_path)
+
+
+def score_chunk(index, first_row, df, keep):
+    """
+    Valide et score un morceau ; renvoie le tableau de résultats à écrire et sa durée de scoring.
+    """
+    start = time.perf_counter()
+    cars, valid, error = validate(df)
+    predictions = np.full(len(df), np.nan)
+    if valid.any():
+        if _compiled is not None:
+            scored = _compiled.predict(cars.to_dict("records"))
+        else:
+            scored = _model.predict(cars)
+        predictions[valid] = np.round(scored, 2)
+
+    result = pd.DataFrame({
+        "row_id": np.arange(first_row, first_row + len(df), dtype=np.int64),
+        # Lignes invalides : valeur manquante (null en Parquet) plutôt que NaN
+        "prediction": pd.array(predictions, dtype="Float64"),
+        "error": error.to_numpy(),
+    })
+    for col in keep:
+        result[col] = df[col].to_numpy()
+    return index, result, time.perf_counter() - start
+
+
+# --- ÉCRITURE ET REPRISE ---
+
+def part_path(output, index):
+    return os.path.join(output, f"part-{index:06d}.parquet")
+
+
+def input_signature(path, chunk_size, keep, model):
+    stat = os.stat(path)
+    return {"input": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "chunk_size": chunk_size, "keep": keep, "model": model}
+
+
+def prepare_output(output, signature, overwrite):
+    """
+    Crée le dossier de sortie, ou vérifie qu'une reprise porte bien sur la même entrée.
+    """
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, MANIFEST)
+    if os.path.exists(path) and not overwrite:
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous != signature:
+            raise SystemExit(f"❌ {output} contient le scoring d'une autre entrée ou d'autres réglages (--overwrite pour recommencer)")
+    else:
+        for name in os.listdir(output):
+            if name.startswith("part-") or name == SUCCESS:
+                os.remove(os.path.join(output, name))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(signature, f, indent=2)
+
+
+def write_part(output, index, result, stats):
+    """
+    Écriture atomique d'un morceau : un fichier présent est toujours complet. Ses statistiques
+    (`part_stats`) sont enregistrées dans les métadonnées du fichier, pour les cumuler à la reprise.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(result, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), PART_STATS_KEY: json.dumps(stats).encode()})
+    # Fichier temporaire préfixé par "_" : ignoré par pd.read_parquet sur le dossier
+    tmp = os.path.join(output, f"_part-{index:06d}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, part_path(output, index))
+
+
+def part_stats(result, seconds):
+    return {"rows": len(result), "invalid_rows": int(result["prediction"].isna().sum()), "seconds": round(seconds, 4)}
+
+
+def read_part_stats(path):
+    """
+    Statistiques d'un morceau déjà écrit (lors d'un précédent run).
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    if PART_STATS_KEY in metadata:
+        return json.loads(metadata[PART_STATS_KEY])
+    # Morceau sans statistiques enregistrées : on relit la seule colonne des prix
+    predictions = pq.read_table(path, columns=["prediction"]).column("prediction")
+    return {"rows": len(predictions), "invalid_rows": predictions.null_count, "seconds": None}
+
+
+def run(args):
+    model = os.path.abspath(args.artifact or args.model)
+    signature = input_signature(args.input, args.chunk_size, args.keep, model)
+    prepare_output(args.output, signature, args.overwrite)
+    if os.path.exists(os.path.join(args.output, SUCCESS)):
+        print(f"✅ Scoring déjà terminé dans {args.output}")
+        return
+
+    total = count_rows(args.input)
+    columns = list(dict.fromkeys([*CarFeatures.model_fields, *args.keep]))
+    max_pending = 2 * args.workers
+    pending = set()
+    done_rows = skipped_rows = 0
+    # Statistiques de tous les morceaux, écrits par ce run ou par un run précédent
+    parts = []
+    start = time.perf_counter()
+
+    def write_done(futures):
+        nonlocal done_rows
+        for future in futures:
+            index, result, seconds = future.result()
+            stats = part_stats(result, seconds)
+            write_part(args.output, index, result, stats)
+            parts.append(stats)
+            done_rows += len(result)
+            pending.discard(future)
+            progress = f"{done_rows + skipped_rows}/{total}" if total else f"{done_rows + skipped_rows}"
+            print(f"  {progress} lignes, {done_rows / (time.perf_counter() - start):,.0f} lignes/s", file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.model, args.artifact)) as pool:
+        first_row = 0
+        for index, chunk in enumerate(iter_chunks(args.input, args.chunk_size, columns)):
+            if os.path.exists(part_path(args.output, index)):
+                # Reprise : morceau déjà écrit lors d'un précédent run
+                skipped_rows += len(chunk)
+                parts.append(read_part_stats(part_path(args.output, index)))
+            else:
+                # Mémoire bornée : on attend qu'un morceau soit écrit avant d'en lire d'autres
+                while len(pending) >= max_pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    write_done(finished)
+                pending.add(pool.submit(score_chunk, index, first_row, chunk, args.keep))
+            first_row += len(chunk)
+        write_done(list(wait(pending)[0]))
+
+    elapsed = time.perf_counter() - start
+    invalid_rows = sum(part["invalid_rows"] for part in parts)
+    scoring_seconds = [part["seconds"] for part in parts]
+    # Lignes et lignes invalides : tous les morceaux ; durée et débit : ce run seulement
+    stats = {"rows": first_row, "invalid_rows": invalid_rows, "parts": len(parts),
+             "scored_rows": done_rows, "resumed_rows": skipped_rows,
+             "scoring_seconds": round(sum(scoring_seconds), 2) if None not in scoring_seconds else None,
+             "seconds": round(elapsed, 2),
+             "rows_per_s": round(done_rows / elapsed, 1) if elapsed else None}
+    with open(os.path.join(args.output, SUCCESS), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    print(f"✅ {first_row} lignes scorées dans {args.output} ({stats['rows_per_s']} lignes/s, {invalid_rows} invalides)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoring hors ligne d'un catalogue de voitures")
+    parser.add_argument("input", help="Fichier d'entrée (.csv, .parquet, .arrow / .feather)")
+    parser.add_argument("output", help="Dossier de sortie (un fichier Parquet par morceau)")
+    parser.add_argument("--model", default=os.getenv("MODEL_PATH", "model.joblib"), help="Pipeline entraîné")
+    parser.add_argument("--artifact", default=os.getenv("MODEL_ARTIFACT"), help="Artefact léger (export_model.py) à la place du pipeline")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processus de scoring")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Lignes par morceau")
+    parser.add_argument("--keep", nargs="*", default=[], help="Colonnes d'entrée recopiées dans la sortie (ex : car_id)")
+    parser.add_argument("--overwrite", action="store_true", help="Recommence au lieu de reprendre")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
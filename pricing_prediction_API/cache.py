@@ -0,0 +1,182 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class RedisBackend:
+    """
+    Backend partagé optionnel (Redis) : plusieurs workers uvicorn profitent des mêmes entrées.
+    Nécessite le paquet `redis` (pip install redis).
+    """
+
+    def __init__(self, url, prefix="getaround:prediction:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [float(v) if v is not None else None for v in values]
+
+    def set_many(self, items, ttl):
+        pipe = self.client.pipeline()
+        for key, value in items.items():
+            # px (millisecondes) : un TTL de moins d'une seconde ne devient pas 0
+            pipe.set(self.prefix + key, value, px=max(1, int(ttl * 1000)) if ttl else None)
+        pipe.execute()
+
+
+class PredictionCache:
+    """
+    Cache LRU + TTL des prédictions, placé devant le modèle.
+
+    La clé est la voiture canonisée : les valeurs des champs de `CarFeatures`, dans l'ordre
+    du schéma, après validation pydantic (un "true" CSV et un true JSON donnent la même clé).
+    Les chaînes ne sont pas modifiées car l'encodeur du modèle est sensible à la casse.
+
+    Le cache suit la version du modèle réellement chargée (`set_model_version`, appelée à
+    chaque activation d'une version) : il est vidé quand elle change, et elle fait partie
+    des clés du backend partagé.
+    """
+
+    def __init__(self, fields, maxsize=10000, ttl=3600, backend=None, model_version=None):
+        self.fields = list(fields)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+
+        self._entries = OrderedDict()
+        # Les prédictions tournent dans le threadpool : entrées et compteurs protégés par un verrou
+        self._lock = threading.Lock()
+        self._model_version = model_version
+
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.backend_errors = 0
+
+    def key(self, record):
+        """
+        Clé canonique d'une voiture (tuple des valeurs dans l'ordre du schéma).
+        """
+        return tuple(record[field] for field in self.fields)
+
+    def _shared_key(self, key, model_version):
+        raw = json.dumps([model_version, *key], ensure_ascii=False)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, records):
+        """
+        Renvoie la liste des prédictions en cache (None pour les voitures absentes).
+        """
+        keys = [self.key(record) for record in records]
+        results = [None] * len(keys)
+        now = time.monotonic()
+        missing = []
+
+        with self._lock:
+            model_version = self._model_version
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    results[i] = entry[0]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    missing.append(i)
+
+        found = {}
+        backend_error = False
+        if missing and self.backend is not None:
+            # Appel réseau hors du verrou
+            try:
+                shared = self.backend.get_many([self._shared_key(keys[i], model_version) for i in missing])
+            except Exception:
+                backend_error = True
+                shared = [None] * len(missing)
+            still_missing = []
+            for i, value in zip(missing, shared):
+                if value is None:
+                    still_missing.append(i)
+                else:
+                    results[i] = value
+                    found[keys[i]] = value
+            missing = still_missing
+
+        with self._lock:
+            self.backend_errors += backend_error
+            self.shared_hits += len(found)
+            self.hits += len(found)
+            self.misses += len(missing)
+            # Pas d'entrées d'une ancienne version si le modèle a changé pendant l'appel au backend
+            if model_version == self._model_version:
+                self._store_locked(found)
+        return results
+
+    def set_many(self, records, predictions):
+        """
+        Ajoute des prédictions au cache local (et au backend partagé s'il existe).
+        """
+        items = {self.key(record): prediction for record, prediction in zip(records, predictions)}
+        with self._lock:
+            model_version = self._model_version
+            self._store_locked(items)
+        if self.backend is not None:
+            try:
+                self.backend.set_many({self._shared_key(key, model_version): value for key, value in items.items()}, self.ttl)
+            except Exception:
+                with self._lock:
+                    self.backend_errors += 1
+
+    def _store_locked(self, items):
+        # Appelée avec self._lock déjà acquis
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        for key, value in items.items():
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set_model_version(self, version):
+        """
+        Version du modèle activée (chargement initial ou registre) : si elle change, les prix en cache sont oubliés.
+        """
+        with self._lock:
+            if version != self._model_version:
+                if self._model_version is not None:
+                    self.invalidations += 1
+                self._model_version = version
+                self._entries.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Compteurs du cache (hits, misses, évictions...).
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "model_version": self._model_version,
+                "shared_backend": type(self.backend).__name__ if self.backend is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_hits": self.shared_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "backend_errors": self.backend_errors,
+            }
@@ -0,0 +1,62 @@
+"""
+Export du pipeline entraîné (model.joblib) en artefact d'inférence léger.
+
+Usage :
+    python export_model.py                                  # model.joblib -> model_artifact/
+    python export_model.py --model model.joblib --output model_artifact
+
+L'artefact contient le booster XGBoost au format natif (booster.ubj) et les paramètres de
+l'encodage en JSON (manifest.json). L'API le charge avec MODEL_ARTIFACT=model_artifact,
+sans importer pandas, scikit-learn ni le paquet xgboost (le booster est chargé par la
+bibliothèque native libxgboost) et sans désérialiser le pipeline. La version de l'artefact
+est l'empreinte SHA-256 de model.joblib : elle change à chaque nouveau modèle.
+"""
+import argparse
+import hashlib
+
+import numpy as np
+
+from fast_inference import CompiledPipeline, check_parity, random_records
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export(model_path, output, n_check=2000):
+    """
+    Exporte le pipeline puis vérifie que l'artefact rechargé donne les mêmes prix que le pipeline.
+    """
+    import joblib
+
+    pipeline = joblib.load(model_path)
+    compiled = CompiledPipeline.from_pipeline(pipeline)
+    check_parity(pipeline, compiled, n=n_check)
+
+    manifest = compiled.save(output, version=file_sha256(model_path)[:12])
+
+    reloaded = CompiledPipeline.load(output)
+    max_diff = check_parity(pipeline, reloaded, n=n_check, seed=1)
+    # L'artefact doit reproduire exactement le mode compilé d'origine
+    records = random_records(dict(zip(compiled.categorical_features, compiled.categories)), n_check, seed=2)
+    assert np.array_equal(compiled.predict(records), reloaded.predict(records)), "Artefact rechargé différent du pipeline compilé"
+    return manifest, max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export de model.joblib en artefact d'inférence léger")
+    parser.add_argument("--model", default="model.joblib", help="Pipeline sklearn entraîné")
+    parser.add_argument("--output", default="model_artifact", help="Dossier de l'artefact")
+    args = parser.parse_args()
+
+    manifest, max_diff = export(args.model, args.output)
+    print(f"✅ Artefact {manifest['version']} écrit dans {args.output}/ "
+          f"({manifest['n_features_out']} colonnes encodées, écart maximum avec le pipeline : {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
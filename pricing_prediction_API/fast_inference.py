@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import ctypes
+import importlib.util
+import numpy as np
+
+# Version du format de l'artefact d'inférence (export_model.py), vérifiée au chargement
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_MANIFEST = "manifest.json"
+ARTIFACT_BOOSTER = "booster.ubj"
+
+
+class NativeBooster:
+    """
+    Booster XGBoost chargé directement depuis la bibliothèque native (libxgboost) avec ctypes.
+
+    Le paquet Python `xgboost` n'est pas importé : son import charge scikit-learn (et donc
+    pandas) dès qu'ils sont installés, ainsi que SciPy. Seules les fonctions utiles au service
+    sont exposées, avec la même interface que `xgboost.Booster` (set_param, inplace_predict,
+    save_model). La prédiction appelle la même fonction C que `Booster.inplace_predict`.
+    """
+
+    _lib = None
+
+    @classmethod
+    def library(cls):
+        """
+        libxgboost du paquet xgboost installé (trouvée sans importer le paquet).
+        """
+        if cls._lib is None:
+            spec = importlib.util.find_spec("xgboost")
+            if spec is None or not spec.submodule_search_locations:
+                raise ImportError("XGBoost n'est pas installé (pip install xgboost)")
+            name = {"win32": "xgboost.dll", "darwin": "libxgboost.dylib"}.get(sys.platform, "libxgboost.so")
+            package_dir = spec.submodule_search_locations[0]
+            candidates = [os.path.join(package_dir, "lib", name), os.path.join(sys.base_prefix, "lib", name)]
+            path = next((c for c in candidates if os.path.isfile(c)), None)
+            if path is None:
+                raise ImportError(f"Bibliothèque XGBoost introuvable : {candidates}")
+            lib = ctypes.cdll.LoadLibrary(path)
+            lib.XGBGetLastError.restype = ctypes.c_char_p
+            cls._lib = lib
+        return cls._lib
+
+    @classmethod
+    def _check(cls, ret):
+        if ret != 0:
+            raise RuntimeError(f"Erreur XGBoost : {cls.library().XGBGetLastError().decode('utf-8')}")
+
+    def __init__(self, model_file):
+        lib = self.library()
+        self.handle = ctypes.c_void_p()
+        self._check(lib.XGBoosterCreate(None, ctypes.c_uint64(0), ctypes.byref(self.handle)))
+        self._check(lib.XGBoosterLoadModel(self.handle, os.fspath(model_file).encode("utf-8")))
+
+    def __del__(self):
+        if getattr(self, "handle", None) and self._lib is not None:
+            self._lib.XGBoosterFree(self.handle)
+            self.handle = None
+
+    def set_param(self, params):
+        for key, value in params.items():
+            self._check(self.library().XGBoosterSetParam(self.handle, key.encode("utf-8"), str(value).encode("utf-8")))
+
+    def save_model(self, fname):
+        self._check(self.library().XGBoosterSaveModel(self.handle, os.fspath(fname).encode("utf-8")))
+
+    def inplace_predict(self, X, iteration_range=(0, 0), missing=np.nan):
+        """
+        Prédiction sur une matrice NumPy dense (équivalent de `xgboost.Booster.inplace_predict`).
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64 if X.dtype != np.float32 else np.float32)
+        interface = json.dumps({key: X.__array_interface__[key] for key in ("data", "shape", "typestr", "version")})
+        config = json.dumps({
+            "type": 0, "training": False,
+            "iteration_begin": int(iteration_range[0]), "iteration_end": int(iteration_range[1]),
+            "missing": missing, "strict_shape": False, "cache_id": 0,
+        })
+        shape = ctypes.POINTER(ctypes.c_uint64)()
+        dims = ctypes.c_uint64()
+        preds = ctypes.POINTER(ctypes.c_float)()
+        self._check(self.library().XGBoosterPredictFromDense(
+            self.handle, interface.encode("utf-8"), config.encode("utf-8"), None,
+            ctypes.byref(shape), ctypes.byref(dims), ctypes.byref(preds)
+        ))
+        size = int(np.prod([shape[i] for i in range(dims.value)]))
+        # Le tampon de sortie appartient à XGBoost (réutilisé à l'appel suivant) : on le copie
+        return np.ctypeslib.as_array(preds, shape=(size,)).copy()
+
+
+class CompiledPipeline:
+    """
+    Version "compilée" du pipeline sklearn (ColumnTransformer + XGBoost) pour l'inférence.
+
+    Au chargement, on extrait du pipeline les paramètres utiles (moyennes et écarts-types du
+    StandardScaler, catégories du OneHotEncoder, booster XGBoost). Les voitures sont ensuite
+    encodées directement dans une matrice NumPy préallouée, sans passer par pandas ni par
+    le ColumnTransformer, puis envoyées au booster en un seul appel.
+    """
+
+    def __init__(self, numeric_features, mean, scale, categorical_features, categories,
+                 drop_idx, handle_unknown, sparse_output, booster, iteration_range=(0, 0)):
+        self.numeric_features = list(numeric_features)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.categorical_features = list(categorical_features)
+        # Types Python natifs (str, bool) : les recherches dans les dictionnaires sont bien plus rapides
+        self.categories = [[v.item() if hasattr(v, "item") else v for v in c] for c in categories]
+        self.drop_idx = list(drop_idx)
+        self.handle_unknown = handle_unknown
+        self.sparse_output = sparse_output
+        self.booster = booster
+        self.iteration_range = tuple(iteration_range)
+        # Version de l'artefact chargé (None quand le pipeline vient directement de model.joblib)
+        self.version = None
+
+        # Colonnes de sortie : d'abord les variables numériques, puis le one-hot de chaque
+        # variable catégorielle (sans la catégorie supprimée par drop='first')
+        self.n_features_out = len(self.numeric_features)
+        self.lookups = []
+        for cats, drop in zip(self.categories, self.drop_idx):
+            lookup = {}
+            for i, value in enumerate(cats):
+                if drop is not None and i == drop:
+                    lookup[value] = -1
+                else:
+                    lookup[value] = self.n_features_out
+                    self.n_features_out += 1
+            self.lookups.append(lookup)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """
+        Construit la version compilée à partir du Pipeline chargé depuis model.joblib.
+        Lève une ValueError si la structure du pipeline n'est pas prise en charge.
+        """
+        preprocessor, regressor = pipeline[0], pipeline[-1]
+        if len(pipeline.steps) != 2 or not hasattr(preprocessor, "transformers_"):
+            raise ValueError("Pipeline attendu : ColumnTransformer suivi d'un régresseur XGBoost")
+
+        scaler, encoder = None, None
+        numeric_features, categorical_features = [], []
+        for name, transformer, columns in preprocessor.transformers_:
+            if transformer == "drop" or len(columns) == 0:
+                continue
+            # Les transformers sont eux-mêmes des Pipelines à une seule étape dans le notebook
+            if hasattr(transformer, "steps"):
+                if len(transformer.steps) != 1:
+                    raise ValueError(f"Transformer '{name}' non pris en charge ({len(transformer.steps)} étapes)")
+                transformer = transformer.steps[0][1]
+
+            kind = type(transformer).__name__
+            if kind == "StandardScaler" and scaler is None and not categorical_features:
+                scaler, numeric_features = transformer, list(columns)
+            elif kind == "OneHotEncoder" and encoder is None:
+                encoder, categorical_features = transformer, list(columns)
+            else:
+                raise ValueError(f"Transformer '{name}' ({kind}) non pris en charge")
+
+        if encoder is not None and encoder.handle_unknown not in ("ignore", "error"):
+            raise ValueError(f"handle_unknown='{encoder.handle_unknown}' non pris en charge")
+        if encoder is not None and getattr(encoder, "_infrequent_enabled", False):
+            raise ValueError("Les catégories 'infrequent' ne sont pas prises en charge")
+
+        n_num = len(numeric_features)
+        mean = scaler.mean_ if scaler is not None and scaler.mean_ is not None else np.zeros(n_num)
+        scale = scaler.scale_ if scaler is not None and scaler.scale_ is not None else np.ones(n_num)
+
+        if encoder is not None:
+            categories = encoder.categories_
+            drop_idx = encoder.drop_idx_ if encoder.drop_idx_ is not None else [None] * len(categories)
+            handle_unknown = encoder.handle_unknown
+        else:
+            categories, drop_idx, handle_unknown = [], [], "ignore"
+
+        try:
+            iteration_range = (0, regressor.best_iteration + 1)
+        except AttributeError:
+            iteration_range = (0, 0)
+
+        return cls(
+            numeric_features, mean, scale,
+            categorical_features, categories, drop_idx, handle_unknown,
+            # Sortie creuse : XGBoost considère alors les zéros absents comme des valeurs manquantes
+            sparse_output=bool(getattr(preprocessor, "sparse_output_", False)),
+            booster=regressor.get_booster(),
+            iteration_range=iteration_range
+        )
+
+    def save(self, directory, version=None):
+        """
+        Enregistre un artefact d'inférence léger dans `directory` : le booster XGBoost au format
+        natif (UBJ) et les paramètres de l'encodage (moyennes, écarts-types, catégories) en JSON.
+        Il se recharge avec `CompiledPipeline.load`, sans pandas, scikit-learn ni le paquet xgboost.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.booster.save_model(os.path.join(directory, ARTIFACT_BOOSTER))
+        manifest = {
+            "format_version": ARTIFACT_FORMAT_VERSION,
+            "version": version,
+            "numeric_features": self.numeric_features,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "categorical_features": self.categorical_features,
+            "categories": self.categories,
+            "drop_idx": [int(d) if d is not None else None for d in self.drop_idx],
+            "handle_unknown": self.handle_unknown,
+            "sparse_output": self.sparse_output,
+            "iteration_range": list(self.iteration_range),
+            "n_features_out": self.n_features_out,
+        }
+        # Le manifeste est écrit en dernier : sa présence signale un artefact complet
+        path = os.path.join(directory, ARTIFACT_MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+        return manifest
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Recharge un artefact écrit par `save` : seul NumPy est importé, le booster est chargé
+        par la bibliothèque native d'XGBoost (voir `NativeBooster`).
+        """
+        with open(os.path.join(directory, ARTIFACT_MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(f"Format d'artefact non pris en charge : {manifest.get('format_version')}")
+
+        booster = NativeBooster(os.path.join(directory, ARTIFACT_BOOSTER))
+        compiled = cls(
+            manifest["numeric_features"], manifest["mean"], manifest["scale"],
+            manifest["categorical_features"], manifest["categories"], manifest["drop_idx"],
+            manifest["handle_unknown"], manifest["sparse_output"], booster, manifest["iteration_range"]
+        )
+        if compiled.n_features_out != manifest["n_features_out"]:
+            raise ValueError("Artefact incohérent : nombre de colonnes encodées différent du manifeste")
+        compiled.version = manifest.get("version")
+        return compiled
+
+    def encode(self, records, out=None):
+        """
+        Encode une liste de voitures (dictionnaires) en matrice (n_voitures, n_features_out).
+        `out` permet de réutiliser une matrice déjà allouée (float32).
+        """
+        n = len(records)
+        if out is None:
+            out = np.empty((n, self.n_features_out), dtype=np.float32)
+        X = out[:n]
+        X[:] = 0.0
+
+        for j, feature in enumerate(self.numeric_features):
+            values = np.fromiter((record[feature] for record in records), dtype=np.float64, count=n)
+            X[:, j] = (values - self.mean[j]) / self.scale[j]
+
+        # Colonne du one-hot pour chaque voiture : -1 = catégorie supprimée (drop), -2 = inconnue
+        for feature, lookup in zip(self.categorical_features, self.lookups):
+            cols = np.fromiter((lookup.get(record[feature], -2) for record in records), dtype=np.intp, count=n)
+            if self.handle_unknown == "error" and (cols == -2).any():
+                value = records[int(np.argmax(cols == -2))][feature]
+                raise ValueError(f"Catégorie inconnue {value!r} pour la variable '{feature}'")
+            rows = np.flatnonzero(cols >= 0)
+            X[rows, cols[rows]] = 1.0
+
+        if self.sparse_output:
+            # Le pipeline sklearn envoie une matrice creuse à XGBoost : les zéros y sont "manquants"
+            X[X == 0.0] = np.nan
+        return X
+
+    def encode_grid(self, base, axes):
+        """
+        Encode la grille de variantes d'une voiture `base` (dictionnaire) : `axes` est une liste
+        de (variable, valeurs). La voiture de base n'est encodée qu'une fois, puis seules les
+        colonnes des variables qui varient sont remplies, pour toutes les combinaisons à la fois.
+        Les lignes suivent l'ordre de itertools.product (le dernier axe varie le plus vite).
+        """
+        shape = [len(values) for _, values in axes]
+        n = int(np.prod(shape))
+        X = np.repeat(self.encode([base]), n, axis=0)
+        if self.sparse_output:
+            # Zéros "manquants" remis à 0 le temps du remplissage, reconvertis à la fin
+            X[np.isnan(X)] = 0.0
+        # Indice de la valeur de chaque axe pour chaque ligne de la grille
+        grid = np.indices(shape).reshape(len(axes), n)
+
+        for (feature, values), idx in zip(axes, grid):
+            if feature in self.numeric_features:
+                j = self.numeric_features.index(feature)
+                column = (np.asarray(values, dtype=np.float64) - self.mean[j]) / self.scale[j]
+                X[:, j] = column[idx]
+            elif feature in self.categorical_features:
+                lookup = self.lookups[self.categorical_features.index(feature)]
+                cols = np.array([lookup.get(value, -2) for value in values], dtype=np.intp)
+                if self.handle_unknown == "error" and (cols == -2).any():
+                    value = values[int(np.argmax(cols == -2))]
+                    raise ValueError(f"Catégorie inconnue {value!r} pour la variable '{feature}'")
+                # On efface le one-hot de la voiture de base avant de placer celui de chaque variante
+                X[:, [c for c in lookup.values() if c >= 0]] = 0.0
+                cols = cols[idx]
+                rows = np.flatnonzero(cols >= 0)
+                X[rows, cols[rows]] = 1.0
+
+        if self.sparse_output:
+            X[X == 0.0] = np.nan
+        return X
+
+    def predict_matrix(self, X):
+        """
+        Prédiction du booster sur une matrice déjà encodée.
+        """
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range, missing=np.nan)
+
+    def predict(self, records):
+        """
+        Encode puis prédit une liste de voitures en un seul appel au booster.
+        """
+        return self.predict_matrix(self.encode(records))
+
+
+def random_records(categories_by_feature, n, seed=0, unknown_rate=0.0):
+    """
+    Génère `n` voitures aléatoires réalistes à partir des catégories connues du modèle.
+    `unknown_rate` injecte une proportion de catégories inconnues (ignorées par l'encodeur).
+    """
+    rng = np.random.default_rng(seed)
+    records = []
+    for _ in range(n):
+        record = {
+            "mileage": int(rng.integers(1000, 400000)),
+            "engine_power": int(rng.integers(60, 350)),
+        }
+        for feature, cats in categories_by_feature.items():
+            if rng.random() < unknown_rate and isinstance(cats[0], str):
+                record[feature] = "inconnu"
+            else:
+                record[feature] = cats[rng.integers(len(cats))]
+        records.append(record)
+    return records
+
+
+def check_parity(pipeline, compiled, n=1000, seed=0, atol=1e-4):
+    """
+    Compare les prédictions du mode compilé avec `pipeline.predict` sur `n` voitures aléatoires.
+    Renvoie l'écart absolu maximum ; lève une AssertionError au-delà de `atol`.
+    """
+    import pandas as pd
+
+    records = random_records(dict(zip(compiled.categorical_features, compiled.categories)), n, seed=seed, unknown_rate=0.05)
+    expected = pipeline.predict(pd.DataFrame.from_records(records))
+    actual = compiled.predict(records)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    assert max_diff <= atol, f"Écart de prédiction trop important entre les deux modes : {max_diff}"
+    return max_diff
+
+
+if __name__ == "__main__":
+    # Vérification manuelle : python fast_inference.py
+    import joblib
+
+    pipeline = joblib.load("model.joblib")
+    compiled = CompiledPipeline.from_pipeline(pipeline)
+    print(f"{compiled.n_features_out} colonnes encodées, sortie creuse : {compiled.sparse_output}")
+    print(f"✅ Parité OK, écart maximum : {check_parity(pipeline, compiled, n=5000):.2e}")
+
+    # La grille encodée d'un bloc doit être identique à l'encodage ligne à ligne de ses variantes
+    from itertools import product
+
+    base = random_records(dict(zip(compiled.categorical_features, compiled.categories)), 1)[0]
+    axes = [("mileage", [10000, 80000, 200000])]
+    axes += [(feature, cats[:4]) for feature, cats in zip(compiled.categorical_features[:2], compiled.categories[:2])]
+    variants = [{**base, **dict(zip([f for f, _ in axes], combo))} for combo in product(*[v for _, v in axes])]
+    assert np.array_equal(compiled.encode_grid(base, axes), compiled.encode(variants), equal_nan=True)
+    print(f"✅ Grille OK ({len(variants)} variantes)")
@@ -0,0 +1,44 @@
+import gc
+import os
+
+# Configuration du serveur de production : gunicorn -c gunicorn.conf.py app:app
+#
+# Le processus maître importe app.py (et charge model.joblib) une seule fois, puis crée les
+# workers par fork : le modèle est partagé en copie sur écriture au lieu d'être rechargé
+# dans chaque processus. La mémoire reste donc stable quand on ajoute des workers.
+
+# --- CONFIGURATION DES WORKERS ---
+# Nombre de processus (un par cœur par défaut) et adresse d'écoute
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '7860')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Chargement de l'application (et du modèle) dans le maître, avant le fork
+preload_app = True
+os.environ.setdefault("MODEL_LOADING", "eager")
+
+# Le maître ne fait aucune prédiction : XGBoost utilise OpenMP, dont le pool de threads n'est
+# pas sûr après un fork s'il a déjà servi (blocage possible des workers). Le contrôle de parité
+# du mode compilé et le préchauffage des versions sont faits par chaque worker (post_fork).
+os.environ.setdefault("MODEL_DEFER_CHECKS", "1")
+
+# Threads XGBoost par worker : les cœurs sont répartis entre les workers au lieu d'être
+# tous demandés par chaque processus (sursouscription). Lu par app.py au chargement du modèle.
+os.environ.setdefault("MODEL_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+
+def pre_fork(server, worker):
+    # Les objets déjà chargés (modèle, encodeurs) sont sortis du suivi du ramasse-miettes :
+    # sinon ses passages modifient leurs en-têtes et recopient les pages partagées dans chaque worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+
+    # Premières prédictions dans le worker : OpenMP y démarre ses propres threads
+    app.after_fork()
+    server.log.info(f"Worker {worker.pid} démarré (modèle partagé avec le processus maître)")
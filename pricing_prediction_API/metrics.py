@@ -0,0 +1,285 @@
+import os
+import io
+import time
+import random
+import pstats
+import cProfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Bornes par défaut des histogrammes de durée (en secondes), de 0,1 ms à 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # `callback` : valeurs lues au moment de l'export, {tuple de labels: valeur} ou une valeur seule
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Labels attendus pour {self.name} : {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+            with self._lock:
+                self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """
+    Compteur croissant (ex : nombre de requêtes par route et code HTTP).
+    """
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Valeur instantanée (ex : requêtes en cours).
+    """
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Histogramme cumulatif (format Prometheus) : effectif par borne, somme et nombre d'observations.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            # Effectif de la première borne >= valeur, cumulé à l'export
+            state["counts"][bisect_left(self.buckets, value)] += 1
+            state["sum"] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Mesure la durée du bloc `with` (en secondes).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), state["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Registre minimal de métriques, exporté au format texte Prometheus (sans dépendance externe).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrique déjà enregistrée : {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Counter(name, documentation, labelnames, callback))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : requêtes en cours, compteur et durée des requêtes par route et code HTTP.
+
+    L'heure d'arrivée est gardée dans `request.state.started_at`, ce qui permet aux routes de
+    mesurer la lecture du corps et la validation pydantic faites avant leur appel. Écrit en
+    ASGI pur (pas BaseHTTPMiddleware) pour ne pas perturber les réponses en flux.
+    """
+
+    def __init__(self, app, requests, latency, in_flight):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+        self.in_flight = in_flight
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        scope.setdefault("state", {})["started_at"] = start
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.in_flight.dec()
+            # Chemin "modèle" de la route (ex : /predict) : pas d'explosion du nombre de séries
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            self.requests.inc(method=scope["method"], route=path, status=status)
+            self.latency.observe(time.perf_counter() - start, method=scope["method"], route=path)
+
+
+class SamplingProfiler:
+    """
+    Profilage cProfile d'une fraction des appels au modèle, activable à chaud.
+
+    Avec `rate=0.01`, environ 1 appel sur 100 est profilé ; chaque profil est écrit dans
+    `output_dir` (fichier .prof, lisible avec `python -m pstats` ou snakeviz) et cumulé
+    pour afficher les fonctions les plus coûteuses. Un seul appel est profilé à la fois.
+    """
+
+    def __init__(self, rate=0.0, output_dir="profiles", max_files=100):
+        self.rate = rate
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.samples = 0
+        self.last_file = None
+        self._stats = None
+        self._busy = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @contextmanager
+    def maybe_profile(self, name="predict"):
+        """
+        Profile le bloc `with` avec une probabilité `rate`.
+        """
+        if self.rate <= 0 or random.random() >= self.rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            self._record(profiler, name)
+        finally:
+            self._busy.release()
+
+    def _record(self, profiler, name):
+        with self._stats_lock:
+            self.samples += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+            if self.output_dir and self.samples <= self.max_files:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self.last_file = os.path.join(self.output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{self.samples}.prof")
+                profiler.dump_stats(self.last_file)
+
+    def top(self, limit=20, sort="cumulative"):
+        """
+        Fonctions les plus coûteuses sur l'ensemble des profils (texte pstats).
+        """
+        with self._stats_lock:
+            if self._stats is None:
+                return ""
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def reset(self):
+        with self._stats_lock:
+            self._stats = None
+            self.samples = 0
+            self.last_file = None
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "samples": self.samples,
+            "output_dir": self.output_dir,
+            "last_file": self.last_file,
+        }
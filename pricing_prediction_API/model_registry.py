@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import random
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+ROUTING_FILE = "routing.json"
+
+# Routage courant, remplacé d'un bloc (jamais modifié en place) : une requête en cours garde
+# la référence qu'elle a lue, même si un nouveau modèle est activé entre-temps.
+# `mode` : "single" (primary seul), "split" (une part `weight` du trafic sur candidate)
+# ou "shadow" (candidate score en parallèle sans que sa réponse soit renvoyée).
+Routing = namedtuple("Routing", ["primary", "candidate", "mode", "weight"])
+
+
+class ModelVersion:
+    """
+    Une version du modèle chargée en mémoire, avec ses compteurs de latence et de prédictions.
+
+    `pipeline` est le pipeline sklearn (model.joblib) et `compiled` sa version compilée ou
+    l'artefact léger (export_model.py) ; au moins l'un des deux est renseigné.
+    """
+
+    def __init__(self, version, pipeline=None, compiled=None, source=None):
+        self.version = version
+        self.pipeline = pipeline
+        self.compiled = compiled
+        self.source = source
+        self.loaded_at = time.time()
+        # Empreinte du fichier chargé (nom, date, taille) : la version n'est rechargée que s'il change
+        self.fingerprint = None
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.seconds_total = 0.0
+        self.prediction_sum = 0.0
+        # Mode shadow : écart absolu avec les prix renvoyés par la version principale
+        self.shadow_rows = 0
+        self.shadow_abs_diff_sum = 0.0
+        self.shadow_abs_diff_max = 0.0
+
+    def observe(self, seconds, predictions):
+        with self._lock:
+            self.calls += 1
+            self.rows += len(predictions)
+            self.seconds_total += seconds
+            self.prediction_sum += float(np.sum(predictions))
+
+    def observe_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def observe_shadow(self, predictions, reference):
+        diff = np.abs(np.asarray(predictions, dtype=np.float64) - np.asarray(reference, dtype=np.float64))
+        with self._lock:
+            self.shadow_rows += len(diff)
+            self.shadow_abs_diff_sum += float(diff.sum())
+            self.shadow_abs_diff_max = max(self.shadow_abs_diff_max, float(diff.max(initial=0.0)))
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "version": self.version,
+                "source": self.source,
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+                "inference_mode": "compiled" if self.compiled is not None else "pipeline",
+                "calls": self.calls,
+                "rows": self.rows,
+                "errors": self.errors,
+                "avg_call_ms": round(1000 * self.seconds_total / self.calls, 3) if self.calls else 0.0,
+                "avg_prediction": round(self.prediction_sum / self.rows, 2) if self.rows else None,
+            }
+            if self.shadow_rows:
+                stats["shadow_rows"] = self.shadow_rows
+                stats["shadow_mean_abs_diff"] = round(self.shadow_abs_diff_sum / self.shadow_rows, 4)
+                stats["shadow_max_abs_diff"] = round(self.shadow_abs_diff_max, 4)
+            return stats
+
+
+class ModelRegistry:
+    """
+    Registre des versions du modèle : surveille un dossier d'artefacts versionnés et active les
+    nouvelles versions à chaud, sans redémarrer l'API ni interrompre les requêtes en cours.
+
+    Chaque entrée du dossier est une version : un artefact léger (sous-dossier contenant un
+    manifest.json, voir export_model.py) ou un pipeline `<version>.joblib`. Sans fichier
+    `routing.json`, la version principale est celle dont le nom est le plus grand (ex : une date).
+    `routing.json` permet de répartir le trafic entre deux versions :
+
+        {"primary": "2026-10-01", "candidate": "2026-10-17", "mode": "split", "weight": 0.1}
+
+    Une nouvelle version est chargée puis préchauffée (`warmup_fn`) dans le thread de
+    surveillance, et le routage n'est remplacé qu'ensuite. En cas d'erreur, les versions
+    actives restent en place. `on_change` est appelée après chaque changement de routage.
+    """
+
+    def __init__(self, directory, load_fn, warmup_fn=None, poll_interval=10.0, on_change=None):
+        self.directory = directory
+        self.load_fn = load_fn
+        self.warmup_fn = warmup_fn
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+
+        self.routing = None
+        self.last_error = None
+        self.swaps = 0
+        self._signature = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Lecture du routage (appelée à chaque requête) ---
+
+    @property
+    def primary(self):
+        routing = self.routing
+        return routing.primary if routing is not None else None
+
+    def choose(self):
+        """
+        Version qui doit répondre à une requête (tirage pondéré en mode "split").
+        """
+        routing = self.routing
+        if routing is None:
+            return None
+        if routing.mode == "split" and routing.candidate is not None and random.random() < routing.weight:
+            return routing.candidate
+        return routing.primary
+
+    def shadow(self):
+        """
+        Version scorée en parallèle de la principale (mode "shadow"), sinon None.
+        """
+        routing = self.routing
+        if routing is None or routing.mode != "shadow":
+            return None
+        return routing.candidate
+
+    def activate(self, primary, candidate=None, mode="single", weight=0.0):
+        """
+        Remplace le routage d'un seul coup (affectation atomique).
+        """
+        previous = self.routing
+        self.routing = Routing(primary, candidate, mode if candidate is not None else "single", weight)
+        self.swaps += 1
+        if self.on_change is not None:
+            self.on_change(previous, self.routing)
+
+    # --- Surveillance du dossier ---
+
+    def _entries(self):
+        """
+        Versions disponibles dans le dossier : {nom de version: chemin}.
+        """
+        entries = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".joblib") and os.path.isfile(path):
+                entries[name[:-len(".joblib")]] = path
+            # Un artefact n'est complet qu'une fois son manifeste écrit
+            elif os.path.isfile(os.path.join(path, "manifest.json")):
+                entries[name] = path
+        return entries
+
+    def _read_signature(self, entries):
+        signature = []
+        for name, path in sorted(entries.items()):
+            target = os.path.join(path, "manifest.json") if os.path.isdir(path) else path
+            stat = os.stat(target)
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        routing_path = os.path.join(self.directory, ROUTING_FILE)
+        if os.path.exists(routing_path):
+            signature.append((ROUTING_FILE, os.stat(routing_path).st_mtime_ns, 0))
+        return tuple(signature)
+
+    def _read_routing(self, entries):
+        routing_path = os.path.join(self.directory, ROUTING_FILE)
+        if os.path.exists(routing_path):
+            with open(routing_path, encoding="utf-8") as f:
+                config = json.load(f)
+        else:
+            config = {}
+        primary = config.get("primary") or (max(entries) if entries else None)
+        candidate = config.get("candidate")
+        mode = config.get("mode", "split" if candidate else "single")
+        weight = float(config.get("weight", 0.0))
+        if primary not in entries:
+            raise ValueError(f"Version principale introuvable dans {self.directory} : {primary}")
+        if candidate is not None and candidate not in entries:
+            raise ValueError(f"Version candidate introuvable dans {self.directory} : {candidate}")
+        if mode not in ("single", "split", "shadow"):
+            raise ValueError(f"Mode de routage inconnu : {mode}")
+        if not 0.0 <= weight <= 1.0:
+            raise ValueError(f"Part de trafic invalide : {weight}")
+        return primary, candidate, mode, weight
+
+    def _load(self, name, path, signature):
+        """
+        Réutilise une version déjà active si son fichier n'a pas changé, sinon la charge et la préchauffe.
+        """
+        fingerprint = next(item for item in signature if item[0] == name)
+        routing = self.routing
+        if routing is not None:
+            for current in (routing.primary, routing.candidate):
+                if current is not None and current.version == name and current.fingerprint == fingerprint:
+                    return current
+        version = self.load_fn(path, name)
+        version.fingerprint = fingerprint
+        if self.warmup_fn is not None:
+            self.warmup_fn(version)
+        return version
+
+    def refresh(self):
+        """
+        Relit le dossier et active les versions demandées si quelque chose a changé.
+        Renvoie True si le routage a été remplacé.
+        """
+        with self._refresh_lock:
+            entries = self._entries()
+            signature = self._read_signature(entries)
+            if signature == self._signature:
+                return False
+            try:
+                primary, candidate, mode, weight = self._read_routing(entries)
+                primary_version = self._load(primary, entries[primary], signature)
+                candidate_version = self._load(candidate, entries[candidate], signature) if candidate else None
+            except Exception as e:
+                # Pas de nouvel essai tant que le dossier ne change pas ; les versions actives restent en place
+                self._signature = signature
+                self.last_error = str(e)
+                print(f"❌ Registre des modèles, versions actives conservées : {e}")
+                return False
+            self._signature = signature
+            self.last_error = None
+            self.activate(primary_version, candidate_version, mode, weight)
+            print(f"✅ Modèle {primary} actif" + (f", {candidate} en {mode} ({weight:.0%})" if candidate else ""))
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+
+    def start(self):
+        """
+        Démarre la surveillance du dossier dans un thread (un par worker).
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def stats(self):
+        routing = self.routing
+        if routing is None:
+            return {"routing": None, "last_error": self.last_error}
+        return {
+            "directory": self.directory,
+            "routing": {
+                "primary": routing.primary.version,
+                "candidate": routing.candidate.version if routing.candidate is not None else None,
+                "mode": routing.mode,
+                "weight": routing.weight,
+            },
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+            "versions": [v.stats() for v in (routing.primary, routing.candidate) if v is not None],
+        }
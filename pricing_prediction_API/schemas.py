@@ -0,0 +1,23 @@
+from typing import List
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+# --- DÉFINITION DU FORMAT DES DONNÉES D'ENTRÉE (Pydantic) ---
+# Cela permet de valider automatiquement les données envoyées par l'utilisateur
+class CarFeatures(BaseModel):
+    model_key: str = Field(..., description="Marque du véhicule (ex: Citroën, Renault, BMW)")
+    mileage: int = Field(..., gt=0, description="Kilométrage du véhicule")
+    engine_power: int = Field(..., gt=0, description="Puissance du moteur (en chevaux)")
+    fuel: str = Field(..., description="Type de carburant (diesel, petrol, hybrid, electric)")
+    paint_color: str = Field(..., description="Couleur de la voiture")
+    car_type: str = Field(..., description="Type de carrosserie (convertible, coupe, estate, hatchback, sedan, subcompact, su, van)")
+    private_parking_available: bool = Field(..., description="Disponibilité d'un parking privé")
+    has_gps: bool = Field(..., description="GPS intégré")
+    has_air_conditioning: bool = Field(..., description="Climatisation")
+    automatic_car: bool = Field(..., description="Boîte automatique")
+    has_getaround_connect: bool = Field(..., description="Boitier GetAround Connect installé")
+    has_speed_regulator: bool = Field(..., description="Régulateur de vitesse")
+    winter_tires: bool = Field(..., description="Pneus neige")
+
+# Liste de voitures validée en un seul appel (corps JSON de /predict/batch, morceaux de bulk_score.py)
+CAR_LIST = TypeAdapter(List[CarFeatures])
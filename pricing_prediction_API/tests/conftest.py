@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Les modules de l'API sont des scripts à la racine de pricing_prediction_API/
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
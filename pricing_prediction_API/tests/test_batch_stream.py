@@ -0,0 +1,58 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.background import BackgroundTask
+
+import app as api
+
+HEADER = ",".join(api.CarFeatures.model_fields)
+
+
+def csv_row(car):
+    return ",".join(f'"{value}"' if isinstance(value, str) else str(value).lower() for value in car.values())
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(api.app) as client:
+        deadline = time.monotonic() + 60
+        while client.get("/health/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        yield client
+
+
+def test_csv_quoted_field_with_newlines(client):
+    multiline = {**api.WARMUP_CAR, "paint_color": "black\nmat\n\n\"edition\" speciale"}
+    escaped = csv_row(multiline).replace('"edition"', '""edition""')
+    body = "\n".join([HEADER, csv_row(api.WARMUP_CAR), escaped, csv_row({**api.WARMUP_CAR, "mileage": -1}), ""])
+    response = client.post("/predict/batch/stream", content=body, headers={"content-type": "text/csv"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert "prediction" in lines[0] and "prediction" in lines[1]
+    assert lines[2]["error"][0]["loc"] == ["mileage"]
+
+
+def test_duplex_response_runs_background_task():
+    ran = []
+
+    async def body():
+        yield "ok\n"
+
+    async def run():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        response = api.DuplexStreamingResponse(body(), background=BackgroundTask(ran.append, "done"))
+        await response({"type": "http"}, receive, send)
+        return sent
+
+    sent = asyncio.run(run())
+    assert sent[-1]["type"] == "http.response.body" and ran == ["done"]
@@ -0,0 +1,26 @@
+import asyncio
+
+from batching import MicroBatcher
+
+
+def test_failed_batches_are_counted():
+    def predict(records):
+        if any(record["fail"] for record in records):
+            raise RuntimeError("modèle en panne")
+        return [1.0] * len(records)
+
+    async def run():
+        batcher = MicroBatcher(predict, max_batch_size=3, max_wait_ms=50)
+        await batcher.start()
+        try:
+            results = await asyncio.gather(*(batcher.submit({"fail": True}) for _ in range(3)), return_exceptions=True)
+            assert all(isinstance(result, RuntimeError) for result in results)
+            assert await batcher.submit({"fail": False}) == 1.0
+            return batcher.stats()
+        finally:
+            await batcher.stop()
+
+    stats = asyncio.run(run())
+    assert stats["batches_total"] == 2 and stats["rows_total"] == 4
+    assert stats["failed_batches_total"] == 1 and stats["failed_rows_total"] == 3
+    assert stats["max_batch_size_seen"] == 3
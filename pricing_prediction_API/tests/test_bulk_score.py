@@ -0,0 +1,109 @@
+import json
+import os
+from argparse import Namespace
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from pydantic import ValidationError
+
+from conftest import API_DIR
+from bulk_score import SUCCESS, iter_chunks, part_path, run, validate
+from schemas import CarFeatures
+
+CAR = {
+    "model_key": "Citroën", "mileage": 150000, "engine_power": 120, "fuel": "diesel",
+    "paint_color": "black", "car_type": "estate", "private_parking_available": True,
+    "has_gps": True, "has_air_conditioning": False, "automatic_car": False,
+    "has_getaround_connect": True, "has_speed_regulator": True, "winter_tires": True,
+}
+
+
+def write_arrow(path, df, batch_size):
+    # Plusieurs record batches de taille différente de chunk_size
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_size):
+            writer.write_batch(batch)
+
+
+@pytest.fixture
+def catalogue():
+    df = pd.DataFrame([{**CAR, "mileage": 1000 * (i + 1), "car_id": i} for i in range(23)])
+    df.loc[[2, 9, 17], "mileage"] = -1  # Lignes invalides
+    return df
+
+
+def test_arrow_chunks_rechunk_batches(catalogue, tmp_path):
+    path = tmp_path / "catalogue.arrow"
+    write_arrow(path, catalogue, batch_size=3)
+    chunks = list(iter_chunks(str(path), 5, columns=["car_id", "mileage"]))
+    assert [len(c) for c in chunks] == [5, 5, 5, 5, 3]
+    assert list(chunks[0].columns) == ["car_id", "mileage"]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), catalogue[["car_id", "mileage"]])
+
+
+def test_resume_merges_stats_of_previous_parts(catalogue, tmp_path):
+    path = tmp_path / "catalogue.arrow"
+    write_arrow(path, catalogue, batch_size=4)
+    output = tmp_path / "predictions"
+    args = Namespace(input=str(path), output=str(output), model=os.path.join(API_DIR, "model.joblib"),
+                     artifact=None, workers=1, chunk_size=5, keep=["car_id"], overwrite=False)
+    run(args)
+
+    # Run interrompu : deux morceaux à refaire, les autres sont repris
+    os.remove(output / SUCCESS)
+    for index in (1, 4):
+        os.remove(part_path(str(output), index))
+    run(args)
+
+    with open(output / SUCCESS, encoding="utf-8") as f:
+        stats = json.load(f)
+    assert stats["rows"] == 23
+    assert stats["parts"] == 5
+    assert stats["scored_rows"] == 5 + 3
+    assert stats["resumed_rows"] == 23 - 8
+    assert stats["invalid_rows"] == 3
+    predictions = pd.read_parquet(output).sort_values("row_id")
+    assert predictions["car_id"].tolist() == list(range(23))
+
+
+def api_valid(record):
+    try:
+        CarFeatures.model_validate(record)
+        return True
+    except ValidationError:
+        return False
+
+
+TRICKY = [
+    {"has_gps": 1.0}, {"has_gps": 0}, {"has_gps": "yes"}, {"has_gps": "1.0"}, {"has_gps": 2},
+    {"mileage": 1000.0}, {"mileage": 1000.5}, {"mileage": "1000"}, {"mileage": "1.0"}, {"mileage": 0},
+    {"fuel": 1}, {"fuel": ""}, {"fuel": None}, {"engine_power": None},
+]
+
+
+def test_typed_input_follows_api_validation(tmp_path):
+    # Valeurs typées (Parquet / Arrow) : mêmes conversions que le corps JSON de l'API
+    rows = [{**CAR, **change} for change in TRICKY]
+    cars, valid, error = validate(pd.DataFrame(rows, dtype=object))
+    assert valid.tolist() == [api_valid(row) for row in rows]
+    assert error[~valid].tolist() == [next(iter(change)) for change, ok in zip(TRICKY, valid) if not ok]
+    assert len(cars) == valid.sum()
+
+
+def test_csv_input_follows_api_csv_validation(tmp_path):
+    # CSV : chaque champ est du texte, comme les lignes CSV de /predict/batch/stream
+    path = tmp_path / "catalogue.csv"
+    lines = [",".join(CAR)]
+    for value in ["true", "yes", "1", "1.0", "", "maybe"]:
+        lines.append(",".join(value if name == "has_gps" else str(v) for name, v in CAR.items()))
+    for value in ["1000", "1000.0", "1000.5", "", "-3"]:
+        lines.append(",".join(value if name == "mileage" else str(v) for name, v in CAR.items()))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    df = next(iter_chunks(str(path), 100, columns=list(CAR)))
+    _, valid, _ = validate(df)
+    expected = [api_valid(dict(zip(CAR, line.split(",")))) for line in lines[1:]]
+    assert valid.tolist() == expected
+    assert expected == [True, True, True, False, False, False, True, True, False, False, False]
@@ -0,0 +1,60 @@
+import threading
+
+from cache import PredictionCache, RedisBackend
+
+FIELDS = ["model_key", "mileage"]
+CARS = [{"model_key": "Citroën", "mileage": 1000 * i} for i in range(10)]
+
+
+def test_cache_follows_loaded_model_version():
+    cache = PredictionCache(FIELDS)
+    cache.set_model_version("model:1")
+    cache.set_many(CARS, list(range(10)))
+    assert cache.get_many(CARS[:2]) == [0, 1]
+
+    # Même version réactivée : les entrées restent
+    cache.set_model_version("model:1")
+    assert cache.get_many(CARS[:1]) == [0]
+    cache.set_model_version("model:2")
+    assert cache.get_many(CARS[:1]) == [None]
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_counters_are_exact_under_concurrency():
+    cache = PredictionCache(FIELDS)
+    cache.set_many(CARS[:5], list(range(5)))
+    threads = [threading.Thread(target=lambda: [cache.get_many(CARS) for _ in range(200)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["hits"] == 8 * 200 * 5
+    assert stats["misses"] == 8 * 200 * 5
+
+
+class FakePipeline:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def set(self, key, value, **options):
+        self.calls.append(options)
+
+    def execute(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.calls = []
+
+    def pipeline(self):
+        return FakePipeline(self.calls)
+
+
+def test_redis_ttl_below_one_second_is_kept():
+    backend = RedisBackend.__new__(RedisBackend)
+    backend.client, backend.prefix = FakeRedis(), "test:"
+    backend.set_many({"a": 1.0}, 0.25)
+    backend.set_many({"b": 2.0}, 0)
+    assert backend.client.calls == [{"px": 250}, {"px": None}]
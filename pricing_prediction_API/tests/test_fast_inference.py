@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import API_DIR
+from fast_inference import CompiledPipeline, check_parity, random_records
+
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    return joblib.load(os.path.join(API_DIR, "model.joblib"))
+
+
+@pytest.fixture(scope="module")
+def compiled(pipeline):
+    return CompiledPipeline.from_pipeline(pipeline)
+
+
+def max_abs_diff(pipeline, compiled, records):
+    expected = pipeline.predict(pd.DataFrame.from_records(records))
+    return float(np.max(np.abs(expected - compiled.predict(records))))
+
+
+def test_parity_random_records(pipeline, compiled):
+    assert check_parity(pipeline, compiled, n=2000, seed=42, atol=ATOL) <= ATOL
+
+
+def test_parity_unseen_categories(pipeline, compiled):
+    categories = dict(zip(compiled.categorical_features, compiled.categories))
+    records = random_records(categories, 200, seed=1, unknown_rate=1.0)
+    assert all(records[0][f] == "inconnu" for f, cats in categories.items() if isinstance(cats[0], str))
+    assert max_abs_diff(pipeline, compiled, records) <= ATOL
+
+
+def test_parity_edge_values(pipeline, compiled):
+    categories = dict(zip(compiled.categorical_features, compiled.categories))
+    base = random_records(categories, 1, seed=2)[0]
+    records = [
+        {**base, "mileage": 0, "engine_power": 0},
+        {**base, "mileage": 0},
+        {**base, "engine_power": 0},
+        {**base, "mileage": 10_000_000, "engine_power": 1000},
+    ]
+    # Première et dernière catégorie connue de chaque variable (dont la catégorie supprimée par drop='first')
+    for feature, cats in categories.items():
+        records += [{**base, feature: cats[0]}, {**base, feature: cats[-1]}]
+    assert max_abs_diff(pipeline, compiled, records) <= ATOL
+
+
+def test_parity_single_record(pipeline, compiled):
+    records = random_records(dict(zip(compiled.categorical_features, compiled.categories)), 1, seed=3)
+    assert max_abs_diff(pipeline, compiled, records) <= ATOL
+
+
+def test_artifact_parity(pipeline, compiled, tmp_path):
+    compiled.save(tmp_path)
+    reloaded = CompiledPipeline.load(tmp_path)
+    assert check_parity(pipeline, reloaded, n=500, seed=4, atol=ATOL) <= ATOL
+
+
+def test_artifact_load_without_pandas_or_sklearn(compiled, tmp_path):
+    compiled.save(tmp_path)
+    # Processus neuf : l'artefact doit se charger et prédire sans importer pandas ni scikit-learn
+    code = (
+        "import sys; from fast_inference import CompiledPipeline, random_records; "
+        f"c = CompiledPipeline.load({str(tmp_path)!r}); "
+        "c.predict(random_records(dict(zip(c.categorical_features, c.categories)), 10)); "
+        "print(sorted({'pandas', 'sklearn', 'xgboost'} & set(sys.modules)))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,26 @@
+import app as api
+from model_registry import ModelVersion, Routing
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        return [0.0] * len(X)
+
+
+def test_no_prediction_before_after_fork(monkeypatch):
+    # Maître gunicorn (MODEL_DEFER_CHECKS=1) : aucune prédiction avant le fork
+    model = CountingModel()
+    version = ModelVersion("fork", pipeline=model, source="memory")
+    monkeypatch.setattr(api, "checks_deferred", True)
+    monkeypatch.setattr(api.models, "routing", Routing(version, None, "single", 0.0))
+    api.warmup_version(version)
+    assert model.calls == 0
+
+    # Worker : préchauffage fait après le fork
+    api.after_fork()
+    assert model.calls == 1
+    assert api.checks_deferred is False
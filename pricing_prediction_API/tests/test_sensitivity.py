@@ -0,0 +1,48 @@
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app import MAX_SENSITIVITY_POINTS, SensitivityAxis, sensitivity_values
+
+BASE = {
+    "model_key": "Citroën", "mileage": 150000, "engine_power": 120, "fuel": "diesel",
+    "paint_color": "black", "car_type": "estate", "private_parking_available": True,
+    "has_gps": True, "has_air_conditioning": False, "automatic_car": False,
+    "has_getaround_connect": True, "has_speed_regulator": True, "winter_tires": True,
+}
+
+
+def test_range_finer_than_unit_is_deduplicated():
+    values = sensitivity_values(SensitivityAxis(feature="engine_power", start=100, stop=103, num=10), BASE)
+    assert values == [100, 101, 102, 103]
+
+
+def test_repeated_values_keep_first_occurrence_order():
+    values = sensitivity_values(SensitivityAxis(feature="mileage", values=[30000, 10000, 30000, 20000, 10000]), BASE)
+    assert values == [30000, 10000, 20000]
+
+
+@pytest.mark.parametrize("value", [True, False])
+def test_bool_rejected_for_int_feature(value):
+    with pytest.raises(HTTPException) as exc:
+        sensitivity_values(SensitivityAxis(feature="engine_power", values=[120, value]), BASE)
+    assert exc.value.status_code == 422
+    assert exc.value.detail[0]["loc"] == ["axes", "engine_power", 1]
+
+
+def test_bool_feature_defaults_to_false_true():
+    assert sensitivity_values(SensitivityAxis(feature="has_gps"), BASE) == [False, True]
+
+
+def test_num_is_bounded_before_generating_values():
+    with pytest.raises(ValidationError):
+        SensitivityAxis(feature="mileage", start=1, stop=10**9, num=10**9)
+    axis = SensitivityAxis(feature="mileage", start=1, stop=10**9, num=MAX_SENSITIVITY_POINTS)
+    assert axis.size() == MAX_SENSITIVITY_POINTS
+    assert SensitivityAxis(feature="has_gps").size() == 2
+
+
+def test_pydantic_errors_use_axis_location():
+    with pytest.raises(HTTPException) as exc:
+        sensitivity_values(SensitivityAxis(feature="mileage", values=[1000, -5, 2000, 0]), BASE)
+    assert [error["loc"] for error in exc.value.detail] == [["axes", "mileage", 1], ["axes", "mileage", 3]]
@@ -0,0 +1,314 @@
+"""
+Entraînement scripté du modèle de prix (remplace l'exécution à la main de getaround_pricing_ML.ipynb).
+
+Usage :
+    python train.py                                  # données -> model.joblib + model_metrics.json
+    python train.py --data get_around_pricing_project.csv --n-iter 100
+    python train.py --export model_artifact          # exporte aussi l'artefact léger (export_model.py)
+    python train.py --benchmark                      # compare avec le GridSearchCV du notebook
+
+Même nettoyage, même découpage train/test (80/20, random_state=42) et même pipeline
+(StandardScaler + OneHotEncoder + XGBRegressor) que le notebook, mais :
+* le CSV est lu par morceaux avec des types compacts (entiers 32 bits, catégories) ;
+* le preprocessing est ajusté une seule fois sur le train et ses sorties sont gardées en
+  cache dans `.train_cache/` (clé : empreinte des données + versions des bibliothèques) ;
+* la recherche d'hyperparamètres tourne en parallèle sur tous les cœurs (un candidat par cœur),
+  avec arrêt anticipé (early stopping) sur un jeu de validation au lieu d'une grille sur
+  n_estimators ; les scores déjà calculés sont réutilisés au run suivant.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from itertools import product
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.compose import ColumnTransformer
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import ParameterSampler, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from xgboost import XGBRegressor
+
+REMOTE_SOURCE = "https://full-stack-assets.s3.eu-west-3.amazonaws.com/Deployment/get_around_pricing_project.csv"
+LOCAL_SOURCES = ("get_around_pricing_project.csv", os.path.join("..", "get_around_pricing_project.csv"))
+CACHE_DIR = os.getenv("GETAROUND_TRAIN_CACHE_DIR", ".train_cache")
+
+TARGET = "rental_price_per_day"
+NUMERIC_FEATURES = ["mileage", "engine_power"]
+CATEGORICAL_FEATURES = [
+    "model_key", "fuel", "paint_color", "car_type", "private_parking_available", "has_gps",
+    "has_air_conditioning", "automatic_car", "has_getaround_connect", "has_speed_regulator", "winter_tires",
+]
+
+# Types compacts à la lecture (les chaînes deviennent des catégories une fois les morceaux réunis)
+DTYPES = {"mileage": "int32", "engine_power": "int32", TARGET: "int32"}
+
+# Grille XGBoost du notebook, sans n_estimators (choisi par early stopping jusqu'à MAX_ESTIMATORS)
+PARAM_GRID = {
+    "learning_rate": [0.01, 0.05, 0.1],
+    "max_depth": [4, 5, 6],
+    "subsample": [0.7, 0.8, 0.9],
+    "colsample_bytree": [0.5, 0.6, 0.7],
+    "gamma": [0, 1],
+    "min_child_weight": [2, 3],
+}
+MAX_ESTIMATORS = 2000
+EARLY_STOPPING_ROUNDS = 50
+# Configuration exacte du notebook, pour le benchmark
+NOTEBOOK_GRID = {"regressor__n_estimators": [400, 500, 600], **{f"regressor__{k}": v for k, v in PARAM_GRID.items()}}
+
+
+# --- DONNÉES ---
+
+def resolve_source(source=None):
+    """
+    Source des données : argument, variable GETAROUND_PRICING_SOURCE, CSV local ou, à défaut, l'URL S3.
+    """
+    source = source or os.getenv("GETAROUND_PRICING_SOURCE")
+    if source:
+        return source
+    return next((path for path in LOCAL_SOURCES if os.path.exists(path)), REMOTE_SOURCE)
+
+
+def clean_chunk(df):
+    """
+    Nettoyage du notebook : colonne d'index inutile, valeurs impossibles et outliers.
+    """
+    df = df.drop(columns=["Unnamed: 0"], errors="ignore")
+    return df[(df["mileage"] >= 0) & (df["mileage"] < 600000) & (df["engine_power"] > 0) & (df[TARGET] < 300)]
+
+
+def load_data(source, chunksize=50000):
+    """
+    Lecture du CSV par morceaux (nettoyés au fil de l'eau) avec des types compacts.
+    """
+    chunks = [clean_chunk(chunk) for chunk in pd.read_csv(source, dtype=DTYPES, chunksize=chunksize)]
+    df = pd.concat(chunks, ignore_index=True)
+    for col in CATEGORICAL_FEATURES:
+        if df[col].dtype == object:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def data_fingerprint(df):
+    """
+    Empreinte des données nettoyées (clé du cache de preprocessing et des scores).
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    for name in ("sklearn", "xgboost", "pandas"):
+        digest.update(sys.modules[name].__version__.encode() if name in sys.modules else b"")
+    digest.update(json.dumps([NUMERIC_FEATURES, CATEGORICAL_FEATURES]).encode())
+    return digest.hexdigest()[:16]
+
+
+def split(df):
+    """
+    Découpage train/test du notebook.
+    """
+    X, y = df.drop(columns=[TARGET]), df[TARGET].astype("float32")
+    # Catégories -> objets : le pipeline enregistré reçoit les mêmes types que ceux envoyés par l'API
+    X = X.astype({col: object for col in CATEGORICAL_FEATURES if str(X[col].dtype) == "category"})
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
+# --- PREPROCESSING ---
+
+def make_preprocessor():
+    """
+    ColumnTransformer du notebook (transformers en Pipelines à une étape, comme attendu par fast_inference.py).
+    """
+    return ColumnTransformer(transformers=[
+        ("num", Pipeline(steps=[("scaler", StandardScaler())]), NUMERIC_FEATURES),
+        ("cat", Pipeline(steps=[("encoder", OneHotEncoder(drop="first", handle_unknown="ignore"))]), CATEGORICAL_FEATURES),
+    ])
+
+
+def preprocess(X_train, X_test, key, use_cache=True):
+    """
+    Ajuste le preprocessing sur le train et transforme train et test, avec cache disque.
+    """
+    path = os.path.join(CACHE_DIR, f"preprocessed-{key}.joblib")
+    if use_cache and os.path.exists(path):
+        return joblib.load(path)
+    preprocessor = make_preprocessor()
+    result = {
+        "preprocessor": preprocessor,
+        "X_train": preprocessor.fit_transform(X_train),
+        "X_test": preprocessor.transform(X_test),
+    }
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        joblib.dump(result, path)
+    return result
+
+
+# --- RECHERCHE D'HYPERPARAMÈTRES ---
+
+def candidates(n_iter=None, seed=42):
+    """
+    Combinaisons à tester : toute la grille, ou `n_iter` tirées au hasard.
+    """
+    if n_iter:
+        return list(ParameterSampler(PARAM_GRID, n_iter=n_iter, random_state=seed))
+    keys = list(PARAM_GRID)
+    return [dict(zip(keys, values)) for values in product(*PARAM_GRID.values())]
+
+
+def evaluate(params, X_fit, y_fit, X_val, y_val):
+    """
+    Entraîne un candidat (un seul thread XGBoost) avec arrêt anticipé sur la validation.
+    """
+    model = XGBRegressor(
+        objective="reg:squarederror", random_state=42, n_jobs=1, n_estimators=MAX_ESTIMATORS,
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS, eval_metric="rmse", **params
+    )
+    model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+    rmse = float(np.sqrt(mean_squared_error(y_val, model.predict(X_val, iteration_range=(0, model.best_iteration + 1)))))
+    return {"params": params, "val_rmse": rmse, "n_estimators": int(model.best_iteration + 1)}
+
+
+def search(X_train, y_train, key, n_iter=None, n_jobs=-1, use_cache=True):
+    """
+    Évalue les candidats en parallèle ; les scores déjà connus (même données) ne sont pas recalculés.
+    """
+    path = os.path.join(CACHE_DIR, f"search-{key}.json")
+    known = {}
+    if use_cache and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            known = {json.dumps(r["params"], sort_keys=True): r for r in json.load(f)}
+
+    # Validation interne au train : le test reste réservé à l'évaluation finale
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=0)
+    todo = [p for p in candidates(n_iter) if json.dumps(p, sort_keys=True) not in known]
+    print(f"{len(todo)} candidats à évaluer ({len(known)} déjà en cache)...")
+    results = Parallel(n_jobs=n_jobs)(delayed(evaluate)(p, X_fit, y_fit, X_val, y_val) for p in todo)
+    for result in results:
+        known[json.dumps(result["params"], sort_keys=True)] = result
+
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(list(known.values()), f)
+    wanted = {json.dumps(p, sort_keys=True) for p in candidates(n_iter)}
+    return sorted((r for k, r in known.items() if k in wanted), key=lambda r: r["val_rmse"])
+
+
+# --- ENTRAÎNEMENT FINAL ---
+
+def scores(model, X, y):
+    pred = model.predict(X)
+    return {"rmse": round(float(np.sqrt(mean_squared_error(y, pred))), 4), "r2": round(float(r2_score(y, pred)), 4)}
+
+
+def fit_final(best, prep, y_train, n_jobs=-1):
+    """
+    Pipeline complet (preprocessing + XGBoost) : XGBoost est réentraîné sur tout le train avec les
+    meilleurs réglages, à partir de la matrice déjà transformée. Le preprocessing ajusté (et gardé
+    en cache) par `preprocess` est repris tel quel : le réajuster sur le même train donnerait
+    exactement les mêmes paramètres.
+    """
+    regressor = XGBRegressor(
+        objective="reg:squarederror", random_state=42, n_jobs=n_jobs,
+        n_estimators=best["n_estimators"], **best["params"]
+    )
+    regressor.fit(prep["X_train"], y_train)
+    return Pipeline(steps=[("preprocessor", prep["preprocessor"]), ("regressor", regressor)])
+
+
+def benchmark_notebook(X_train, y_train, X_test, y_test):
+    """
+    Configuration du notebook : GridSearchCV (cv=5, n_jobs=-1) sur la grille XGBoost complète.
+    """
+    from sklearn.model_selection import GridSearchCV
+
+    pipe = Pipeline(steps=[
+        ("preprocessor", make_preprocessor()),
+        ("regressor", XGBRegressor(objective="reg:squarederror", random_state=42, n_jobs=-1)),
+    ])
+    start = time.perf_counter()
+    grid = GridSearchCV(pipe, NOTEBOOK_GRID, cv=5, scoring="r2", n_jobs=-1).fit(X_train, y_train)
+    return {"wall_clock_s": round(time.perf_counter() - start, 2), "test": scores(grid.best_estimator_, X_test, y_test),
+            "best_params": {k.replace("regressor__", ""): v for k, v in grid.best_params_.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entraînement du modèle de prix GetAround")
+    parser.add_argument("--data", help="CSV des prix (par défaut : fichier local ou URL S3)")
+    parser.add_argument("--output", default=os.getenv("MODEL_PATH", "model.joblib"), help="Pipeline entraîné")
+    parser.add_argument("--metrics", default="model_metrics.json", help="Métriques et réglages retenus")
+    parser.add_argument("--n-iter", type=int, help="Nombre de candidats tirés au hasard (par défaut : toute la grille)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Processus pour la recherche (-1 = tous les cœurs)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore le cache de preprocessing et de scores")
+    parser.add_argument("--export", help="Dossier de l'artefact léger à exporter (voir export_model.py)")
+    parser.add_argument("--benchmark", action="store_true", help="Compare avec le GridSearchCV du notebook (long)")
+    args = parser.parse_args()
+    use_cache = not args.no_cache
+
+    t0 = time.perf_counter()
+    source = resolve_source(args.data)
+    df = load_data(source)
+    key = data_fingerprint(df)
+    X_train, X_test, y_train, y_test = split(df)
+    print(f"Données : {len(df)} voitures ({source}), empreinte {key}")
+
+    t1 = time.perf_counter()
+    prep = preprocess(X_train, X_test, key, use_cache)
+    t2 = time.perf_counter()
+    ranking = search(prep["X_train"], y_train.to_numpy(), key, args.n_iter, args.n_jobs, use_cache)
+    best = ranking[0]
+    t3 = time.perf_counter()
+    print(f"Meilleur candidat : {best['params']}, {best['n_estimators']} arbres, RMSE validation {best['val_rmse']:.2f} €")
+
+    model = fit_final(best, prep, y_train)
+    t4 = time.perf_counter()
+    joblib.dump(model, args.output)
+
+    metrics = {
+        "source": source,
+        "data_fingerprint": key,
+        "rows": {"train": len(X_train), "test": len(X_test)},
+        "best_params": {**best["params"], "n_estimators": best["n_estimators"]},
+        "validation_rmse": round(best["val_rmse"], 4),
+        # Matrices déjà transformées : le preprocessing n'est pas recalculé pour les scores
+        "train": scores(model[-1], prep["X_train"], y_train),
+        "test": scores(model[-1], prep["X_test"], y_test),
+        "candidates": len(ranking),
+        "timings_s": {
+            "load": round(t1 - t0, 2), "preprocess": round(t2 - t1, 2),
+            "search": round(t3 - t2, 2), "final_fit": round(t4 - t3, 2), "total": round(t4 - t0, 2),
+        },
+        "versions": {name: sys.modules[name].__version__ for name in ("sklearn", "xgboost", "pandas", "numpy")},
+    }
+    if args.benchmark:
+        print("Benchmark : GridSearchCV du notebook...")
+        notebook = benchmark_notebook(X_train, y_train, X_test, y_test)
+        metrics["benchmark"] = {
+            "notebook": notebook,
+            "script": {"wall_clock_s": metrics["timings_s"]["total"], "test": metrics["test"]},
+            "speedup": round(notebook["wall_clock_s"] / metrics["timings_s"]["total"], 2),
+        }
+
+    with open(args.metrics, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, ensure_ascii=False)
+    print(json.dumps({k: metrics[k] for k in ("test", "timings_s")}, indent=2))
+    if "benchmark" in metrics:
+        b = metrics["benchmark"]
+        print(f"Notebook : {b['notebook']['wall_clock_s']} s, RMSE test {b['notebook']['test']['rmse']} € | "
+              f"Script : {b['script']['wall_clock_s']} s, RMSE test {b['script']['test']['rmse']} € (x{b['speedup']})")
+    print(f"✅ Modèle enregistré dans {args.output}, métriques dans {args.metrics}")
+
+    if args.export:
+        from export_model import export
+
+        manifest, _ = export(args.output, args.export)
+        print(f"✅ Artefact {manifest['version']} écrit dans {args.export}/")
+
+
+if __name__ == "__main__":
+    main()
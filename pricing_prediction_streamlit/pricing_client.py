@@ -0,0 +1,292 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = "https://sterenn-getaround-api.hf.space"
+# Codes renvoyés par une API en cours de réveil ou surchargée : un nouvel essai a un sens
+RETRY_STATUSES = frozenset({502, 503, 504})
+DEFAULT_LOCAL_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pricing_prediction_API", "model.joblib")
+
+
+class PricingAPIError(Exception):
+    """
+    Réponse d'erreur de l'API (ex : 422 si une caractéristique est invalide), sans nouvel essai.
+    """
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"Erreur API {status_code} : {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class PricingClient:
+    """
+    Client de l'API de prédiction pour l'interface Streamlit.
+
+    * Une seule session HTTP partagée (keep-alive, pool de connexions) : pas de nouvelle
+      poignée de main TLS à chaque estimation.
+    * Délais de connexion et de lecture, et durée totale bornée par `total_timeout` (essais
+      et attentes compris) : une API bloquée ne fige plus la page.
+    * Nouveaux essais avec attente exponentielle sur les erreurs de connexion et les codes
+      502/503/504 (l'API Hugging Face peut être en cours de réveil). Un délai de lecture
+      dépassé n'est pas réessayé : l'API a reçu la requête mais ne répond pas.
+    * Cache local LRU + TTL des prix déjà demandés pour une même voiture.
+    * Secours optionnel (désactivé par défaut) : si l'API reste injoignable, le pipeline
+      `model.joblib` est chargé dans le processus Streamlit (nécessite joblib, scikit-learn,
+      xgboost et pandas, absents de requirements.txt). Son erreur éventuelle est journalisée.
+    * Coupe-circuit : après `failure_threshold` échecs consécutifs, l'API n'est plus appelée
+      pendant `circuit_cooldown` secondes (secours local direct, sans délais ni nouveaux
+      essais). Un seul appel teste ensuite l'API : s'il échoue, le circuit se rouvre.
+    """
+
+    def __init__(self, base_url=DEFAULT_API_URL, connect_timeout=3.05, read_timeout=10.0, retries=3,
+                 backoff_factor=0.5, total_timeout=12.0, pool_size=10, cache_size=1000, cache_ttl=3600,
+                 local_model_path=None, failure_threshold=3, circuit_cooldown=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.total_timeout = total_timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.local_model_path = local_model_path
+        self.failure_threshold = failure_threshold
+        self.circuit_cooldown = circuit_cooldown
+
+        # Nouveaux essais faits par `_post`, sous la limite de durée totale (pas par urllib3)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local_model = None
+        self._local_lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._circuit_lock = threading.Lock()
+
+        self.api_calls = 0
+        self.cache_hits = 0
+        self.local_calls = 0
+        self.local_error = None
+        self.circuit_opens = 0
+        self.short_circuits = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Client configuré par variables d'environnement (PRICING_API_URL, PRICING_API_TIMEOUT...).
+        """
+        local = os.getenv("PRICING_LOCAL_FALLBACK", "0") == "1"
+        return cls(
+            base_url=os.getenv("PRICING_API_URL", DEFAULT_API_URL),
+            connect_timeout=float(os.getenv("PRICING_API_CONNECT_TIMEOUT", "3.05")),
+            read_timeout=float(os.getenv("PRICING_API_TIMEOUT", "10")),
+            retries=int(os.getenv("PRICING_API_RETRIES", "3")),
+            total_timeout=float(os.getenv("PRICING_API_TOTAL_TIMEOUT", "12")),
+            cache_size=int(os.getenv("PRICING_CACHE_SIZE", "1000")),
+            cache_ttl=float(os.getenv("PRICING_CACHE_TTL", "3600")),
+            local_model_path=os.getenv("PRICING_LOCAL_MODEL", DEFAULT_LOCAL_MODEL) if local else None,
+            failure_threshold=int(os.getenv("PRICING_CIRCUIT_FAILURES", "3")),
+            circuit_cooldown=float(os.getenv("PRICING_CIRCUIT_COOLDOWN", "30")),
+        )
+
+    # --- Cache local ---
+
+    @staticmethod
+    def _key(car):
+        return tuple(sorted(car.items()))
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def _cache_set(self, key, value):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = (value, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- Coupe-circuit ---
+
+    def _circuit_allows(self):
+        """
+        Vrai si l'API peut être appelée : circuit fermé, ou fin du temps de pause (un seul essai,
+        les autres appels restent sur le secours jusqu'à sa réponse).
+        """
+        if self.failure_threshold <= 0:
+            return True
+        with self._circuit_lock:
+            if self._failures < self.failure_threshold:
+                return True
+            now = time.monotonic()
+            if now < self._open_until:
+                return False
+            self._open_until = now + self.circuit_cooldown
+            return True
+
+    def _record_success(self):
+        with self._circuit_lock:
+            self._failures = 0
+
+    def _record_failure(self):
+        with self._circuit_lock:
+            self._failures += 1
+            if self.failure_threshold > 0 and self._failures >= self.failure_threshold:
+                if self._failures == self.failure_threshold:
+                    self.circuit_opens += 1
+                self._open_until = time.monotonic() + self.circuit_cooldown
+
+    def circuit_open(self):
+        with self._circuit_lock:
+            return 0 < self.failure_threshold <= self._failures and time.monotonic() < self._open_until
+
+    # --- Modèle local (secours) ---
+
+    def _predict_local(self, car, error):
+        """
+        Prix calculé par le modèle local ; sans modèle local utilisable, l'erreur de l'API est relevée.
+        """
+        if not self.local_model_path:
+            raise error
+        try:
+            return self._predict_local_model(car)
+        except Exception as e:
+            message = f"{type(e).__name__} : {e}"
+            if message != self.local_error:
+                print(f"⚠️ Secours local indisponible ({self.local_model_path}) : {message}")
+            self.local_error = message
+            raise error from e
+
+    def _predict_local_model(self, car):
+        with self._local_lock:
+            if self._local_model is None:
+                import joblib
+
+                self._local_model = joblib.load(self.local_model_path)
+        import pandas as pd
+
+        self.local_calls += 1
+        return round(float(self._local_model.predict(pd.DataFrame.from_records([car]))[0]), 2)
+
+    # --- Prédiction ---
+
+    def _retry_wait(self, attempt, deadline):
+        """
+        Attente avant le nouvel essai `attempt + 1` ; faux s'il n'en reste plus ou si la durée totale serait dépassée.
+        """
+        delay = self.backoff_factor * 2 ** attempt
+        if attempt >= self.retries or time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    def _post(self, car):
+        """
+        POST /predict avec nouveaux essais, le tout en `total_timeout` secondes au plus.
+        Renvoie la dernière réponse (éventuellement 5xx) ou relève la dernière erreur réseau.
+        """
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            remaining = max(deadline - time.monotonic(), 0.01)
+            timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+            try:
+                response = self.session.post(f"{self.base_url}/predict", json=car, timeout=timeout)
+            except requests.exceptions.ConnectionError:
+                # Connexion refusée, coupée ou trop lente (ConnectTimeout). Un ReadTimeout n'est
+                # pas une ConnectionError : il remonte tout de suite, sans nouvel essai.
+                if not self._retry_wait(attempt, deadline):
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or not self._retry_wait(attempt, deadline):
+                    return response
+            attempt += 1
+
+    def predict(self, car):
+        """
+        Prix journalier d'une voiture (dictionnaire au format `CarFeatures` de l'API).
+        Renvoie {"prediction": prix, "source": "cache" | "api" | "local"}.
+        """
+        key = self._key(car)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return {"prediction": cached, "source": "cache"}
+
+        if not self._circuit_allows():
+            # API en panne récente : secours local immédiat, sans payer délais et nouveaux essais
+            self.short_circuits += 1
+            error = PricingAPIError(503, "API indisponible (coupe-circuit ouvert)")
+            return {"prediction": self._predict_local(car, error), "source": "local"}
+
+        try:
+            response = self._post(car)
+            self.api_calls += 1
+        except requests.exceptions.RequestException as e:
+            # Connexion impossible, délai dépassé ou trop d'essais : secours local s'il est configuré
+            self._record_failure()
+            prediction, source = self._predict_local(car, e), "local"
+        else:
+            if response.status_code >= 500:
+                self._record_failure()
+                error = PricingAPIError(response.status_code, response.text)
+                prediction, source = self._predict_local(car, error), "local"
+            else:
+                # Une réponse 4xx montre que l'API fonctionne : seule la voiture est en cause
+                self._record_success()
+                if response.status_code != 200:
+                    raise PricingAPIError(response.status_code, response.text)
+                prediction, source = response.json()["prediction"], "api"
+
+        # Les prix du modèle local ne sont pas gardés : l'API reprend la main dès qu'elle répond
+        if source == "api":
+            self._cache_set(key, prediction)
+        return {"prediction": prediction, "source": source}
+
+    async def apredict(self, car):
+        """
+        Version asynchrone de `predict` (exécutée dans un thread, sur la même session).
+        """
+        return await asyncio.to_thread(self.predict, car)
+
+    def predict_many(self, cars, max_workers=8):
+        """
+        Prix de plusieurs voitures, demandés en parallèle sur les connexions du pool.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.predict, cars))
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "api_calls": self.api_calls,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "local_calls": self.local_calls,
+            "local_error": self.local_error,
+            "circuit_open": self.circuit_open(),
+            "circuit_opens": self.circuit_opens,
+            "short_circuits": self.short_circuits,
+        }
+
+    def close(self):
+        self.session.close()
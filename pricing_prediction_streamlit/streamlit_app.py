@@ -1,6 +1,6 @@
 import streamlit as st
 import requests
-import json
+from pricing_client import PricingAPIError, PricingClient
 
 # Configuration de la page
 st.set_page_config(
@@ -9,6 +9,13 @@ st.set_page_config(
     layout="centered"
 )
 
+# Client HTTP partagé entre les sessions et les reruns (pool de connexions + cache)
+@st.cache_resource
+def get_client():
+    return PricingClient.from_env()
+
+client = get_client()
+
 st.title("💸 Estimez le prix de location de votre voiture")
 
 st.markdown("""
@@ -57,20 +64,22 @@ if submit_btn:
         "winter_tires": winter
     }
     
-    # 2. Envoi à l'API
-    api_url = "https://sterenn-getaround-api.hf.space/predict"
-
+    # 2. Envoi à l'API (adresse : variable d'environnement PRICING_API_URL)
     with st.spinner("Calcul du prix en cours..."):
         try:
-            response = requests.post(api_url, json=data)
-            
-            if response.status_code == 200:
-                prediction = response.json()["prediction"]
-                st.success(f"💰 Prix estimé : **{prediction} € / jour**")
-                st.balloons()
-            else:
-                st.error(f"Erreur API : {response.status_code}")
-                st.write(response.text)
-                
-        except requests.exceptions.ConnectionError:
-            st.error("🚨 Impossible de contacter l'API. Vérifiez que votre conteneur Docker tourne bien sur le port 4000 !")
\ No newline at end of file
+            result = client.predict(data)
+            st.success(f"💰 Prix estimé : **{result['prediction']} € / jour**")
+            if result["source"] == "local":
+                st.caption("⚠️ API injoignable : estimation calculée avec le modèle local.")
+            st.balloons()
+
+        except PricingAPIError as e:
+            st.error(f"Erreur API : {e.status_code}")
+            st.write(e.detail)
+
+        except requests.exceptions.RequestException:
+            st.error(f"🚨 Impossible de contacter l'API ({client.base_url}). Vérifiez que votre conteneur Docker tourne bien !")
+
+        # Secours local activé mais inutilisable (dépendances ou model.joblib manquants)
+        if client.local_error:
+            st.caption(f"Secours local indisponible : {client.local_error}")
\ No newline at end of file